@@ -0,0 +1,184 @@
+import argparse
+import copy
+import datetime
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from syntheticGame import generateGame
+from gameIndex import indexResources
+from parseCache import newParseCache
+from rankingIndex import buildRankingIndex, getTopStates
+from readFromGameFiles import getGuaranteedResourcesFromCompanies, getGuaranteedResourcesFromHistory, getInfoFromStateRegions
+from services import backUpStateRegions, getResourcesFromConfig, getStateCountAndNames, loadGameDatabase, previewShuffle, recordGameStateRegions, rewriteStateRegions, selectShuffledResources, shuffleAndGetChangedStates
+from versionStore import exportVersion, storeVersionFolder
+from globalProperties import BEST_STATES_COUNT
+
+# Times each phase of the shuffler on synthetic games, and writes the results into benchmarks/results, one file per run
+# Every phase starts without a parse cache, so that it pays for the files it reads; 'load' is the concurrent load of the app
+# Run it from anywhere: python benchmarks/runBenchmarks.py --scales 1,10 --compare benchmarks/results/<previous run>.json
+
+PATH_RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+def timeRuns(function, repeat):
+    """Run a phase 'repeat' times; returns the durations in seconds and the result of the last run"""
+    durations = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start)
+    return durations, result
+
+def benchmarkGame(pathGame, repeat, logger):
+    """Time every phase on the synthetic game in 'pathGame'; the current folder must be 'pathGame', for its resources.ini
+    Returns the durations of each phase"""
+    pathStateRegions = os.path.join(pathGame, "game", "map_data", "state_regions")
+    pathHistoryBuildings = os.path.join(pathGame, "game", "common", "history", "buildings")
+    pathCompanies = os.path.join(pathGame, "game", "common", "company_types")
+    pathOriginal = os.path.join(pathGame, "original")
+    pathVersions = os.path.join(pathGame, "versions")
+    backUpStateRegions(pathStateRegions, pathOriginal, logger)
+    phases = {}
+
+    phases['count'], (stateCount, stateInfo, gameIndex) = timeRuns(lambda: getStateCountAndNames(pathOriginal, logger), repeat)
+    def parse():
+        resources = getResourcesFromConfig(stateCount, logger)
+        return getInfoFromStateRegions(pathOriginal, copy.deepcopy(stateInfo), indexResources(gameIndex, resources), resources, logger)
+    phases['parse'], (resources, stateInfo) = timeRuns(parse, repeat)
+    phases['history'], _ = timeRuns(lambda: getGuaranteedResourcesFromHistory(pathHistoryBuildings, gameIndex, copy.deepcopy(resources), logger), repeat)
+    phases['companies'], _ = timeRuns(lambda: getGuaranteedResourcesFromCompanies(gameIndex, copy.deepcopy(resources), pathCompanies, logger), repeat)
+    phases['load'], database = timeRuns(lambda: loadGameDatabase(pathOriginal, pathHistoryBuildings, pathCompanies, logger), repeat)
+
+    selectShuffledResources(database['resources'], "All")
+    def shuffle():
+        return shuffleAndGetChangedStates(copy.deepcopy(database['resources']), logger, gameIndex['stateIDToName'], 1)
+    phases['shuffle'], (shuffled, changedStates) = timeRuns(shuffle, repeat)
+    # The app rewrites the files it has just parsed: their states are already in the parse cache
+    parseCache = newParseCache()
+    getStateCountAndNames(pathOriginal, logger, parseCache)
+    phases['rewrite'], _ = timeRuns(lambda: rewriteStateRegions(pathOriginal, pathStateRegions, database['stateInfo'], shuffled, logger, database['gameIndex'], changedStates, parseCache), repeat)
+    # As the app does after it writes the game's files, so that the restore tells them from a patch of the game
+    recordGameStateRegions(pathStateRegions, pathOriginal)
+    # Only the first restore after the rewrite copies files; the next ones find the game's files unchanged
+    phases['restore'], _ = timeRuns(lambda: backUpStateRegions(pathStateRegions, pathOriginal, logger), 1)
+    phases['restore unchanged'], _ = timeRuns(lambda: backUpStateRegions(pathStateRegions, pathOriginal, logger), repeat)
+    # Trying a shuffle out, as the preview does: load through the parse cache, shuffle, diff and rank, without writing anything
+    def preview():
+        resources = getResourcesFromConfig(0, logger)
+        selectShuffledResources(resources, "All")
+        return previewShuffle(pathOriginal, pathHistoryBuildings, pathCompanies, resources, logger, 1, parseCache)
+    phases['preview'], _ = timeRuns(preview, repeat)
+
+    def bestStates():
+        index = buildRankingIndex(shuffled)
+        for resKey in shuffled:
+            getTopStates(index, resKey, BEST_STATES_COUNT)
+    phases['best states'], _ = timeRuns(bestStates, repeat)
+
+    def storeVersion():
+        index = {'versions': {}, 'blobs': {}}
+        storeVersionFolder(pathVersions, index, "benchmark", pathStateRegions, [resKey for resKey, resource in shuffled.items() if resource['isShuffled']])
+        return index
+    phases['version store'], versionIndex = timeRuns(storeVersion, repeat)
+    phases['version copy'], _ = timeRuns(lambda: exportVersion(pathVersions, versionIndex, "benchmark", pathStateRegions), repeat)
+    return phases
+
+def summarize(durations):
+    """Minimum and median of the durations of a phase, in milliseconds"""
+    return {'min': round(min(durations) * 1000, 3), 'median': round(statistics.median(durations) * 1000, 3), 'runs': len(durations)}
+
+def getCommit() -> str:
+    """Short hash of the checked out commit, with a '+' if the tree has changes; 'unknown' outside of git"""
+    pathRepository = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=pathRepository, capture_output=True, text=True, check=True).stdout.strip()
+        isDirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=pathRepository, capture_output=True, text=True, check=True).stdout.strip() != ""
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("+" if isDirty else "")
+
+def compareResults(previous, current):
+    """Print the median of every phase next to the one of a previous run"""
+    print(f"Compared with {previous['commit']} ({previous['date']})")
+    for scenario, result in current['scenarios'].items():
+        previousPhases = previous['scenarios'].get(scenario, {}).get('phases', {})
+        print(scenario)
+        for phase, summary in result['phases'].items():
+            if phase in previousPhases:
+                ratio = summary['median'] / previousPhases[phase]['median'] if previousPhases[phase]['median'] else float('inf')
+                print(f"  {phase:<18}{previousPhases[phase]['median']:>12.1f} ms {summary['median']:>12.1f} ms  x{ratio:.2f}")
+            else:
+                print(f"  {phase:<18}{'-':>15} {summary['median']:>12.1f} ms")
+
+def runBenchmarks(scales, resourceScales, repeat, pathWork, logger):
+    """Generate a synthetic game for every scale and time its phases
+    Returns the results, with the environment they were measured in"""
+    results = {
+        'commit': getCommit(),
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpuCount': os.cpu_count(),
+        'repeat': repeat,
+        'scenarios': {},
+        }
+    pathCurrent = os.getcwd()
+    for scale in scales:
+        for resourceScale in resourceScales:
+            scenario = f"states x{scale}, resources x{resourceScale}"
+            pathGame = os.path.join(pathWork, f"game_{scale}_{resourceScale}")
+            shutil.rmtree(pathGame, ignore_errors=True)
+            stateCount = generateGame(pathGame, scale, resourceScale)
+            print(f"{scenario}: {stateCount} states")
+            os.chdir(pathGame)
+            try:
+                phases = benchmarkGame(pathGame, repeat, logger)
+            finally:
+                os.chdir(pathCurrent)
+            results['scenarios'][scenario] = {'states': stateCount, 'phases': {phase: summarize(durations) for phase, durations in phases.items()}}
+            for phase, summary in results['scenarios'][scenario]['phases'].items():
+                print(f"  {phase:<18}{summary['median']:>12.1f} ms (min {summary['min']:.1f} ms)")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the phases of the shuffler on synthetic games and record the results")
+    parser.add_argument("--scales", default="1,10", help="Comma-separated numbers of states, as multiples of the vanilla game, e.g. 1,10,100")
+    parser.add_argument("--resource-scales", default="1", help="Comma-separated numbers of resources, as multiples of the vanilla game")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each phase; the median and the minimum are recorded")
+    parser.add_argument("--output", default=None, help="File of the results; by default benchmarks/results/<date>_<commit>.json")
+    parser.add_argument("--compare", default=None, help="Results of a previous run, to compare with")
+    parser.add_argument("--work", default=None, help="Folder for the synthetic games, kept after the run; by default a temporary one")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    logger = logging.getLogger("V3RS.benchmark")
+    scales = [int(scale) for scale in args.scales.split(",")]
+    resourceScales = [int(scale) for scale in args.resource_scales.split(",")]
+
+    if args.work:
+        os.makedirs(args.work, exist_ok=True)
+        results = runBenchmarks(scales, resourceScales, args.repeat, os.path.abspath(args.work), logger)
+    else:
+        with tempfile.TemporaryDirectory() as pathWork:
+            results = runBenchmarks(scales, resourceScales, args.repeat, pathWork, logger)
+
+    pathOutput = args.output
+    if pathOutput is None:
+        os.makedirs(PATH_RESULTS, exist_ok=True)
+        pathOutput = os.path.join(PATH_RESULTS, f"{datetime.datetime.now():%Y%m%d_%H%M%S}_{results['commit'].rstrip('+')}.json")
+    with open(pathOutput, "w") as f:
+        json.dump(results, f, indent=4)
+    print(f"Results written into {pathOutput}")
+    if args.compare:
+        with open(args.compare) as f:
+            compareResults(json.load(f), results)
@@ -0,0 +1,150 @@
+import argparse
+import os
+import random
+
+# A synthetic Victoria 3 folder, so that the shuffler can be measured without a game install
+# It has the folders the app reads (state_regions, history/buildings, company_types, strategic_regions) and a resources.ini next to them
+# Sizes are close to the vanilla game at scale 1; the resources are the ones of the app's resources.ini, and copies of them at a higher resource scale
+
+VANILLA_STATE_COUNT = 700
+STATES_PER_FILE = 50
+STATES_PER_COMPANIES_FILE = 100
+STATES_PER_STRATEGIC_REGION = 20
+# name, color, building group, building, flags; as in resources.ini
+VANILLA_RESOURCES = [
+    ('gold', 'ffd700', 'bg_gold_mining', 'building_gold_mine', 'dynamic'),
+    ('coal', '000000', 'bg_coal_mining', 'building_coal_mine', ''),
+    ('iron', 'a19d94', 'bg_iron_mining', 'building_iron_mine', ''),
+    ('lead', '6c6c6a', 'bg_lead_mining', 'building_lead_mine', ''),
+    ('sulfur', 'f1dd38', 'bg_sulfur_mining', 'building_sulfur_mine', ''),
+    ('wood', '966f33', 'bg_logging', 'building_logging_camp', ''),
+    ('fish', '00ffb5', 'bg_fishing', 'building_fishing_wharf', ''),
+    ('whale', '342d7e', 'bg_whaling', 'building_whaling_station', ''),
+    ('rubber', '815b37', 'bg_rubber', 'building_rubber_plantation', 'dynamic noInitialBuildings'),
+    ('oil', '3b3131', 'bg_oil_extraction', 'building_oil_rig', 'dynamic noInitialBuildings'),
+    ]
+
+def getSyntheticResources(resourceScale):
+    """Get the resources of a synthetic game: the vanilla ones, then 'resourceScale' - 1 copies of each with their own building group and building"""
+    resources = list(VANILLA_RESOURCES)
+    for copy in range(1, resourceScale):
+        for name, color, buildingGroup, building, flags in VANILLA_RESOURCES:
+            resources.append((f"{name}{copy}", color, f"{buildingGroup}_{copy}", f"{building}_{copy}", flags))
+    return resources
+
+def getStateName(state) -> str:
+    """Name of a synthetic state: STATE_ followed by letters, as in the game"""
+    letters = ""
+    while True:
+        state, digit = divmod(state, 26)
+        letters = chr(ord('A') + digit) + letters
+        if state == 0:
+            return "STATE_" + letters
+
+def writeResourcesConfig(filePath, resources):
+    """Write the resources in the format of resources.ini"""
+    with open(filePath, "w") as f:
+        for name, color, buildingGroup, building, flags in resources:
+            f.write(f"{name}\t{color}\t{buildingGroup}\t{building}\t{flags}".rstrip() + "\n")
+        f.write("monument\taa98a9\tbg_monuments\tNA\n")
+
+def writeState(f, state, resources, rng, buildings):
+    """Write one state into a state_regions file; the initial buildings it can run are added to 'buildings'"""
+    f.write(f"{getStateName(state)} = {{\n")
+    f.write(f"    id = {state + 1}\n")
+    f.write('    subsistence_building = "building_subsistence_farms"\n')
+    f.write("    provinces = { " + " ".join(f'"x{rng.getrandbits(24):06X}"' for _ in range(rng.randint(3, 12))) + " }\n")
+    f.write(f"    arable_land = {rng.randint(5, 80)}\n")
+    f.write('    arable_resources = { "bg_wheat_farms" "bg_livestock_ranches" }\n')
+    f.write("    capped_resources = {\n")
+    for name, _, buildingGroup, building, flags in resources:
+        if "dynamic" not in flags and rng.random() < 0.3:
+            amount = rng.randint(5, 60)
+            f.write(f"        {buildingGroup} = {amount}\n")
+            if rng.random() < 0.2:
+                buildings.append((state, building, rng.randint(1, min(amount, 10))))
+    f.write("    }\n")
+    for name, _, buildingGroup, building, flags in resources:
+        if "dynamic" in flags and rng.random() < 0.1:
+            f.write("    resource = {\n")
+            f.write(f'        type = "{buildingGroup}"\n')
+            if name == "gold":
+                f.write('        depleted_type = "bg_gold_mining"\n')
+            if "noInitialBuildings" not in flags and rng.random() < 0.5:
+                f.write(f"        discovered_amount = {rng.randint(1, 20)}\n")
+            f.write(f"        undiscovered_amount = {rng.randint(1, 20)}\n")
+            f.write("    }\n")
+    if rng.random() < 0.4:
+        f.write(f"    naval_exit_id = {3000 + state}\n")
+    f.write("}\n\n")
+
+def writeHistoryBuildings(filePath, buildings):
+    """Write the initial buildings of some states, in the format of game/common/history/buildings"""
+    with open(filePath, "w", encoding="utf-8-sig") as f:
+        f.write("BUILDINGS = {\n")
+        for state, building, level in buildings:
+            f.write(f"\ts:{getStateName(state)} = {{\n\t\tregion_state:SWE = {{\n")
+            f.write(f'\t\t\tcreate_building = {{\n\t\t\t\tbuilding = "{building}"\n\t\t\t\tlevel = {level}\n\t\t\t\treserves = 1\n\t\t\t}}\n')
+            f.write('\t\t\tcreate_building = {\n\t\t\t\tbuilding = "building_textile_mills"\n\t\t\t\tlevel = 2\n\t\t\t}\n')
+            f.write("\t\t}\n\t}\n")
+        f.write("}\n")
+
+def writeCompanies(filePath, firstState, stateCount, resources, rng):
+    """Write companies which require a building in one of two states, in the format of game/common/company_types"""
+    with open(filePath, "w", encoding="utf-8-sig") as f:
+        for state in range(firstState, firstState + stateCount - 1, 10):
+            _, _, _, building, _ = rng.choice(resources)
+            f.write(f"company_synthetic_{state} = {{\n")
+            f.write(f"\tbuilding_types = {{ {building} }}\n")
+            f.write("\tpossible = {\n\t\tany_scope_state = {\n\t\t\tOR = {\n")
+            f.write(f"\t\t\t\tstate_region = s:{getStateName(state)}\n\t\t\t\tstate_region = s:{getStateName(state + 1)}\n")
+            f.write("\t\t\t}\n\t\t\tany_scope_building = {\n")
+            f.write(f"\t\t\t\tis_building_type = {building}\n\t\t\t\tlevel >= {rng.randint(1, 3)}\n")
+            f.write("\t\t\t}\n\t\t}\n\t}\n}\n")
+
+def writeStrategicRegions(filePath, stateCount):
+    """Write strategic regions of consecutive states, in the format of game/common/strategic_regions"""
+    with open(filePath, "w", encoding="utf-8-sig") as f:
+        for firstState in range(0, stateCount, STATES_PER_STRATEGIC_REGION):
+            states = " ".join(getStateName(state) for state in range(firstState, min(stateCount, firstState + STATES_PER_STRATEGIC_REGION)))
+            f.write(f"sr_synthetic_{firstState // STATES_PER_STRATEGIC_REGION} = {{\n\tcapital_province = x000001\n\tstates = {{ {states} }}\n}}\n")
+
+def generateGame(pathGame, scale=1, resourceScale=1, seed=0):
+    """Write a synthetic game into 'pathGame', with 'scale' times the states of the vanilla game and 'resourceScale' times its resources
+    The same arguments always write the same files
+    Returns the number of states"""
+    rng = random.Random(seed)
+    resources = getSyntheticResources(resourceScale)
+    pathStateRegions = os.path.join(pathGame, "game", "map_data", "state_regions")
+    pathHistoryBuildings = os.path.join(pathGame, "game", "common", "history", "buildings")
+    pathCompanies = os.path.join(pathGame, "game", "common", "company_types")
+    pathStrategicRegions = os.path.join(pathGame, "game", "common", "strategic_regions")
+    for folder in (pathStateRegions, pathHistoryBuildings, pathCompanies, pathStrategicRegions):
+        os.makedirs(folder, exist_ok=True)
+    writeResourcesConfig(os.path.join(pathGame, "resources.ini"), resources)
+
+    stateCount = VANILLA_STATE_COUNT * scale
+    for firstState in range(0, stateCount, STATES_PER_FILE):
+        buildings = []
+        fileIndex = firstState // STATES_PER_FILE
+        with open(os.path.join(pathStateRegions, f"{fileIndex:02d}_synthetic.txt"), "w", encoding="utf-8-sig") as f:
+            for state in range(firstState, min(stateCount, firstState + STATES_PER_FILE)):
+                writeState(f, state, resources, rng, buildings)
+        writeHistoryBuildings(os.path.join(pathHistoryBuildings, f"{fileIndex:02d}_synthetic.txt"), buildings)
+    with open(os.path.join(pathStateRegions, "99_seas.txt"), "w", encoding="utf-8-sig") as f:
+        for sea in range(max(1, stateCount // 10)):
+            f.write(f"STATE_SEA_{sea} = {{\n    id = {stateCount + sea + 1}\n    provinces = {{ \"x{rng.getrandbits(24):06X}\" }}\n}}\n\n")
+    for firstState in range(0, stateCount, STATES_PER_COMPANIES_FILE):
+        writeCompanies(os.path.join(pathCompanies, f"00_companies_{firstState // STATES_PER_COMPANIES_FILE:02d}.txt"), firstState, min(STATES_PER_COMPANIES_FILE, stateCount - firstState), resources, rng)
+    writeStrategicRegions(os.path.join(pathStrategicRegions, "00_synthetic.txt"), stateCount)
+    return stateCount
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic Victoria 3 folder, with a resources.ini, for benchmarks")
+    parser.add_argument("path", help="Folder to write the game into")
+    parser.add_argument("--scale", type=int, default=1, help="Number of states, as a multiple of the vanilla game")
+    parser.add_argument("--resource-scale", type=int, default=1, help="Number of resources, as a multiple of the vanilla game")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random contents")
+    args = parser.parse_args()
+    stateCount = generateGame(args.path, args.scale, args.resource_scale, args.seed)
+    print(f"Wrote {stateCount} states into {args.path}")
@@ -1,4 +1,5 @@
 import os
+import re
 
 def configureAppData(logger):
     """_summary_
@@ -9,11 +10,12 @@ def configureAppData(logger):
     Returns:
         _type_: _description_
     """
-    pathAppdata = os.path.join(os.getenv('APPDATA'), "Victoria 3 Resource Shuffler")
+    pathAppdata = getAppdataFolder()
     pathAppdataVersions = os.path.join(pathAppdata, "versions")
     pathAppdataStateRegionsOriginal = os.path.join(pathAppdataVersions, "original", "state_regions")
 
     pathAppdataConfig = os.path.join(pathAppdata, "config.txt")
+    pathAppdataCache = os.path.join(pathAppdata, "parseCache.bin")
     if not os.path.exists(pathAppdataVersions):
         os.makedirs(pathAppdataVersions)
 
@@ -21,4 +23,23 @@ def configureAppData(logger):
         with open(pathAppdataConfig, "a+") as f:
             f.write("path=")
         logger.info("Config does not exist in %appdata%. It has been created now. Please input the path to the game")
-    return pathAppdataVersions, pathAppdataConfig, pathAppdataStateRegionsOriginal
\ No newline at end of file
+    return pathAppdataVersions, pathAppdataConfig, pathAppdataStateRegionsOriginal, pathAppdataCache
+
+def getAppdataRoot():
+    """%appdata% on Windows; elsewhere, e.g. on a headless box, the user's config folder"""
+    if os.getenv('APPDATA'):
+        return os.getenv('APPDATA')
+    return os.getenv('XDG_CONFIG_HOME') or os.path.join(os.path.expanduser("~"), ".config")
+
+def getAppdataFolder():
+    """The app's own folder in the app data"""
+    return os.path.join(getAppdataRoot(), "Victoria 3 Resource Shuffler")
+
+def readGamePath(pathAppdataConfig):
+    """Get the path to the game saved by the app"""
+    with open(pathAppdataConfig, "r") as f:
+        for line in f:
+            pathGame = re.search("path=(.*)", line)
+            if pathGame:
+                return pathGame.groups()[0]
+    return ""
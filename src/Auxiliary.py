@@ -1,4 +1,7 @@
-import os, shutil
+import importlib.util
+import os, shutil, sys, tempfile
+
+from instrumentation import addCounts
 
 def copyTree(src, dst, symlinks=False, ignore=None):
     """ Copy all files from one to another directory
@@ -16,4 +19,191 @@ def copyTree(src, dst, symlinks=False, ignore=None):
         if os.path.isdir(s):
             shutil.copytree(s, d, symlinks, ignore)
         else:
-            shutil.copy2(s, d)
\ No newline at end of file
+            shutil.copy2(s, d)
+            addCounts(filesCopied=1, bytesCopied=os.path.getsize(d))
+
+def writeFileAtomically(filePath, content):
+    """ Write a file through a temporary file in the same folder, which then replaces it
+    Readers of the file (e.g. the game) see either the old or the new content, never a partial one
+
+    Args:
+        filePath (str): File to be written
+        content (str | bytes): New content of the file; a text is written in text mode, bytes as they are
+    """
+    fileDescriptor, pathTemp = tempfile.mkstemp(dir=os.path.dirname(filePath), prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fileDescriptor, "w" if isinstance(content, str) else "wb") as f:
+            f.write(content)
+        if os.path.exists(filePath):
+            shutil.copymode(filePath, pathTemp)
+        os.replace(pathTemp, filePath)
+        addCounts(filesWritten=1, bytesWritten=len(content))
+    except BaseException:
+        if os.path.exists(pathTemp):
+            os.remove(pathTemp)
+        raise
+
+def hasContent(filePath, content) -> bool:
+    """ Whether a file exists with exactly these bytes; the sizes are compared first, so that most files which differ are not read
+
+    Args:
+        filePath (str): File to be compared
+        content (bytes-like): Bytes it should hold, e.g. a memory-mapped file
+
+    Returns:
+        bool: Whether the file holds these bytes
+    """
+    try:
+        if os.path.getsize(filePath) != len(content):
+            return False
+        with open(filePath, "rb") as f:
+            current = f.read()
+    except OSError:
+        return False
+    addCounts(filesRead=1, bytesRead=len(current))
+    return memoryview(content) == current
+
+def linkOrCopyFile(src, dst) -> bool:
+    """ Put the content of a file at a new path: as a hard link when both are on the same drive, which costs no copy, otherwise as a copy with the same modification time
+    A linked file shares its content with 'src': it must only ever be replaced (as writeFileAtomically does), never written into
+
+    Args:
+        src (str): File to be linked or copied
+        dst (str): New file, which must not exist yet
+
+    Returns:
+        bool: Whether the file was linked
+    """
+    try:
+        os.link(src, dst)
+        addCounts(filesLinked=1)
+        return True
+    except OSError:
+        shutil.copy2(src, dst)
+        addCounts(filesCopied=1, bytesCopied=os.path.getsize(dst))
+        return False
+
+def getAsidePath(path, suffix) -> str:
+    """ Path of a hidden folder next to a folder, e.g. .state_regions.staged; on the same drive, so that either can be renamed into the other
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(path)), f".{os.path.basename(os.path.normpath(path))}.{suffix}")
+
+def newStagedFolder(pathTarget) -> str:
+    """ Create an empty folder next to a folder, to be filled with its new files and then put in its place by replaceFolder
+    The leftovers of an unfinished one are removed
+    """
+    pathStaged = getAsidePath(pathTarget, "staged")
+    shutil.rmtree(pathStaged, ignore_errors=True)
+    os.makedirs(pathStaged)
+    return pathStaged
+
+# Journal of a folder whose files are being replaced one by one, in its hidden .undo folder next to the old files being replaced
+# One line per staged file: "=name" for a file which replaces an old one, "+name" for a new one
+JOURNAL_FILE = ".journal"
+
+def recoverFolder(pathTarget):
+    """ Put back a folder which a crash left in the middle of replaceFolder, so that it holds its old files again
+    """
+    pathOld = getAsidePath(pathTarget, "old")
+    if os.path.exists(pathOld):
+        if not os.path.exists(pathTarget):
+            os.rename(pathOld, pathTarget)
+        else:
+            shutil.rmtree(pathOld, ignore_errors=True)
+    pathUndo = getAsidePath(pathTarget, "undo")
+    if os.path.exists(os.path.join(pathUndo, JOURNAL_FILE)):
+        undoReplacedFiles(pathTarget, pathUndo)
+    elif os.path.exists(pathUndo):
+        shutil.rmtree(pathUndo, ignore_errors=True)
+
+def undoReplacedFiles(pathTarget, pathUndo):
+    """ Put back the old files of a folder whose files were being replaced one by one, as its journal lists them, see replaceFilesOneByOne
+    It can be stopped and run again: an old file is moved back at once, and a new file is only removed
+    """
+    with open(os.path.join(pathUndo, JOURNAL_FILE)) as f:
+        entries = f.read().splitlines()
+    for entry in entries:
+        kind, filename = entry[0], entry[1:]
+        pathOldFile = os.path.join(pathUndo, filename)
+        filePath = os.path.join(pathTarget, filename)
+        if kind == "=" and os.path.exists(pathOldFile):
+            os.replace(pathOldFile, filePath)
+        elif kind == "+" and os.path.exists(filePath):
+            os.remove(filePath)
+    os.remove(os.path.join(pathUndo, JOURNAL_FILE))
+    shutil.rmtree(pathUndo, ignore_errors=True)
+
+def replaceFilesOneByOne(pathStaged, pathTarget, filenames):
+    """ Replace the files of a folder by staged ones, one by one, for when the folder cannot be renamed
+    The old files are linked into a journal first: if a file cannot be replaced, the ones already replaced are put back and the error raised,
+    and after a crash, recoverFolder puts them back, so that the folder never keeps a mix of old and new files
+    """
+    pathUndo = getAsidePath(pathTarget, "undo")
+    shutil.rmtree(pathUndo, ignore_errors=True)
+    os.makedirs(pathUndo)
+    entries = []
+    for filename in filenames:
+        filePath = os.path.join(pathTarget, filename)
+        if os.path.exists(filePath):
+            linkOrCopyFile(filePath, os.path.join(pathUndo, filename))
+            entries.append("=" + filename)
+        else:
+            entries.append("+" + filename)
+    writeFileAtomically(os.path.join(pathUndo, JOURNAL_FILE), "".join(entry + "\n" for entry in entries))
+    try:
+        for filename in filenames:
+            os.replace(os.path.join(pathStaged, filename), os.path.join(pathTarget, filename))
+    except BaseException:
+        undoReplacedFiles(pathTarget, pathUndo)
+        raise
+    os.remove(os.path.join(pathUndo, JOURNAL_FILE))
+    shutil.rmtree(pathUndo, ignore_errors=True)
+
+def replaceFolder(pathStaged, pathTarget) -> bool:
+    """ Put a staged folder in place of a folder with two renames, so that the folder holds either all its old files or all the new ones, never a mix
+    The files of the folder which the staged one does not have (e.g. unchanged, or added by a patch of the game) are kept as they are, with their modification time
+    Nothing is renamed when no file is staged
+    Windows does not rename a folder with an open file; its staged files are then replaced one by one, with a journal to put the old ones back, see replaceFilesOneByOne
+
+    Args:
+        pathStaged (str): Folder made by newStagedFolder, with the new files
+        pathTarget (str): Folder to be replaced
+
+    Returns:
+        bool: Whether the whole folder was replaced at once
+    """
+    recoverFolder(pathTarget)
+    if not os.path.exists(pathTarget):
+        os.rename(pathStaged, pathTarget)
+        return True
+    stagedFiles = os.listdir(pathStaged)
+    if not stagedFiles:
+        os.rmdir(pathStaged)
+        return True
+    for filename in os.listdir(pathTarget):
+        filePath = os.path.join(pathTarget, filename)
+        if os.path.isfile(filePath) and not os.path.exists(os.path.join(pathStaged, filename)):
+            linkOrCopyFile(filePath, os.path.join(pathStaged, filename))
+    pathOld = getAsidePath(pathTarget, "old")
+    try:
+        os.rename(pathTarget, pathOld)
+    except OSError:
+        try:
+            replaceFilesOneByOne(pathStaged, pathTarget, stagedFiles)
+        finally:
+            shutil.rmtree(pathStaged, ignore_errors=True)
+        return False
+    try:
+        os.rename(pathStaged, pathTarget)
+    except BaseException:
+        os.rename(pathOld, pathTarget)
+        raise
+    shutil.rmtree(pathOld, ignore_errors=True)
+    return True
+
+def checkNumpy(logger):
+    """Stop with a clear message if numpy, which shuffles and ranks the resources, is not installed
+    It is only imported once something is shuffled or ranked, so that the app starts fast: this finds it without importing it"""
+    if importlib.util.find_spec("numpy") is None:
+        logger.error("numpy is not installed; it is needed to shuffle and rank the resources: pip install -r requirements.txt")
+        sys.exit(1)
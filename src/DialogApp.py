@@ -1,16 +1,19 @@
 import functools
 import os
+import queue
 import sys
+import threading
 import customtkinter as ctk
-from PIL import Image
-import re
-from callbacks import openFolderCallback, switchBestStatesCallback, switchResourceCallback, switchResourcePresetCallback, switchVersionCallback, performShuffle
-from globalProperties import IGNORED_RESOURCES, TEXT_DEFAULT_BEST_STATES, TABLE_GOODS_FIRST_ROW
-from readFromGameFiles import getInfoFromStateRegions
-from services import getGameFilePaths, findStatesWithMostResources, getResourcesFromConfig, getStateCountAndNames, getVersions
+from AppData import readGamePath
+from callbacks import openFolderCallback, switchBestStatesCallback, switchResourceCallback, switchResourcePresetCallback, switchVersionCallback, performPreview, performShuffle
+from globalProperties import IGNORED_RESOURCES, PATH_CHECK_DELAY_MS, PATH_CHECK_POLL_MS, PRESETS, TEXT_DEFAULT_BEST_STATES, TABLE_GOODS_FIRST_ROW
+from parseCache import saveParseCache
+from progress import gameFilesLock, requestCancel
+from startupTrace import markPhase, reportStartup
+from services import backUpStateRegions, getGameFilePaths, getVersions, loadGameDatabase, rankStates
 
 class App(ctk.CTk):
-    def __init__(self, pathAppdataConfig, pathAppdataStateRegionsOriginal, logger, pathAppdataVersions, *args, **kwargs):
+    def __init__(self, pathAppdataConfig, pathAppdataStateRegionsOriginal, logger, pathAppdataVersions, parseCache, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.width = 5
         
@@ -22,12 +25,8 @@ class App(ctk.CTk):
             self.grid_columnconfigure(i, weight=1, uniform=5)
 
         self.pathGame = None
-        with open(pathAppdataConfig, "r") as f:
-            for line in f:
-                pathGame = re.search("path=(.*)", line)
-                if pathGame:
-                    pathGame = pathGame.groups()[0]
-                    break
+        self.parseCache = parseCache
+        pathGame = readGamePath(pathAppdataConfig)
 
         self.labelPath = ctk.CTkLabel(master=self, text="Victoria 3 / Mod folder: ")
         self.labelPath.grid(row=0, column=0, columnspan=2, padx=(10, 5), pady=10)#, sticky=ctk.W)
@@ -35,17 +34,48 @@ class App(ctk.CTk):
         self.entryPath = ctk.CTkEntry(master=self, width=500)
         self.entryPath.insert(0, pathGame)
         self.entryPath.grid(row=0, column=2, columnspan=4, padx=(0, 10), pady=10)#, sticky=ctk.W)
-        self.imagePathIsCorrect = Image.open('resources/wrong.png')
-        self.btnPathIsCorrect = ctk.CTkButton(self, text = "", corner_radius=32, fg_color="transparent", image=ctk.CTkImage(self.imagePathIsCorrect))
+        self.btnPathIsCorrect = ctk.CTkButton(self, text = "", corner_radius=32, fg_color="transparent")
         self.btnPathIsCorrect.grid(row=0, column=6)
         
         self.top = None
+        self.task = None
+        self.activeVersion = None
+        self.loadedPath = None
+        self.pathCheckAfterID = None
+        self.pathCheckRequest = 0
+        self.pathCheckText = None
+        self.pathCheckPolling = False
+        self.pathCheckQueue = queue.Queue()
+        self.pathCheckWorkers = []
+        self.pathLoadLock = threading.Lock()
         self.entryPath.bind("<KeyRelease>", functools.partial(onPathEntryChange, self, pathAppdataConfig, pathAppdataStateRegionsOriginal, logger, pathAppdataVersions))
-        onPathEntryChange(self, pathAppdataConfig, pathAppdataStateRegionsOriginal, logger, pathAppdataVersions, None)
+        # The first check of the path, which parses the game, waits for the first frame to be painted
+        self.after_idle(self.after, 0, onFirstFrame, self, pathAppdataConfig, pathAppdataStateRegionsOriginal, logger, pathAppdataVersions)
+
+@functools.cache
+def loadImage(fileName, logger):
+    """Decode an image of the 'resources' folder the first time it is shown; later calls reuse it
+    PIL is imported with the first image, after the window is painted"""
+    from PIL import Image
+    filePath = os.path.join('resources', fileName)
+    if not os.path.exists(filePath):
+        logger.error(f"No file at path {filePath}")
+        sys.exit()
+    return ctk.CTkImage(Image.open(filePath))
+
+def onFirstFrame(app: App, pathAppdataConfig, pathAppdataStateRegionsOriginal, logger, pathAppdataVersions) -> None:
+    """Once the window is painted, report the startup timings, then check the saved path"""
+    markPhase("first frame")
+    reportStartup(logger)
+    app.btnPathIsCorrect.configure(image=loadImage('wrong.png', logger))
+    onPathEntryChange(app, pathAppdataConfig, pathAppdataStateRegionsOriginal, logger, pathAppdataVersions, None)
 
 def clearExtendedGUI(app: App) -> None:
     """ Remove most of the GUI, relating to Victoria 3 modding
+    A running shuffle or switch of version is cancelled, unless it is already writing the game's files
     """
+    if app.task is not None:
+        requestCancel(app.task)
     if hasattr(app, 'resourcesListGUI'):
         for widget in app.resourcesListGUI:
             widget.destroy()
@@ -56,48 +86,111 @@ def clearExtendedGUI(app: App) -> None:
     app.extendedGUIElements = []
 
 def onPathEntryChange(app: App, pathAppdataConfig, pathAppdataStateRegionsOriginal, logger, pathAppdataVersions, event) -> None:
-    """ If path is correct, show the entire GUI. Otherwise, show only the entry for path to the game"""
-    def callback(app, pathAppdataConfig, pathAppdataStateRegionsOriginal, logger, pathAppdataVersions):
-        pathToGame = app.entryPath.get()
-        isPathValid, gamePath, pathGameStateRegions, pathGameHistoryBuildings, pathGameCompanies, pathGameGoodIcons = getGameFilePaths(pathToGame, pathAppdataStateRegionsOriginal, logger)
+    """ If path is correct, show the entire GUI. Otherwise, show only the entry for path to the game
+    The check is debounced: it starts only once the user stops typing, and runs on a worker thread"""
+    if app.pathCheckAfterID is not None:
+        app.after_cancel(app.pathCheckAfterID)
+    delay = 0 if event is None else PATH_CHECK_DELAY_MS
+    app.pathCheckAfterID = app.after(delay, startPathCheck, app, pathAppdataConfig, pathAppdataStateRegionsOriginal, logger, pathAppdataVersions)
+
+def startPathCheck(app: App, pathAppdataConfig, pathAppdataStateRegionsOriginal, logger, pathAppdataVersions) -> None:
+    """Start the check of the path on a worker thread; any check still running for a previous path becomes stale
+    Keys which do not change the text, e.g. arrows, do not start a new check"""
+    app.pathCheckAfterID = None
+    pathToGame = app.entryPath.get()
+    if pathToGame == app.pathCheckText:
+        return
+    app.pathCheckText = pathToGame
+    app.pathCheckRequest += 1
+    worker = threading.Thread(target=checkPath, args=(app, app.pathCheckRequest, pathToGame, pathAppdataStateRegionsOriginal, logger, pathAppdataVersions), daemon=True)
+    worker.start()
+    app.pathCheckWorkers = [thread for thread in app.pathCheckWorkers if thread.is_alive()] + [worker]
+    if not app.pathCheckPolling:
+        app.pathCheckPolling = True
+        pollPathCheck(app, pathAppdataConfig, pathAppdataStateRegionsOriginal, logger, pathAppdataVersions)
+
+def checkPath(app: App, requestID, pathToGame, pathAppdataStateRegionsOriginal, logger, pathAppdataVersions) -> None:
+    """Runs on a worker thread: validate the path, then load the game files - only once per distinct valid path
+    The results are handed to the main thread through the queue, since Tk must be used only from there"""
+    try:
+        isPathValid, gamePath, pathGameStateRegions, pathGameHistoryBuildings, pathGameCompanies, pathGameGoodIcons = getGameFilePaths(pathToGame, logger)
+        if requestID != app.pathCheckRequest:
+            return
+        if not isPathValid:
+            app.pathCheckQueue.put((requestID, 'invalid', None))
+            return
+        if gamePath == app.loadedPath:
+            app.pathCheckQueue.put((requestID, 'unchanged', None))
+            return
+        with app.pathLoadLock:
+            if requestID != app.pathCheckRequest:
+                return
+            app.pathCheckQueue.put((requestID, 'loading', None))
+            with gameFilesLock:
+                backUpStateRegions(pathGameStateRegions, pathAppdataStateRegionsOriginal, logger)
+            versions = getVersions(pathAppdataVersions, logger)
+            database = loadGameDatabase(pathGameStateRegions, pathGameHistoryBuildings, pathGameCompanies, logger, app.parseCache)
+            saveParseCache(app.parseCache, logger)
+            ranking = rankStates(database['resources'])
+        app.pathCheckQueue.put((requestID, 'loaded', {
+            'gamePath': gamePath,
+            'pathGameStateRegions': pathGameStateRegions,
+            'pathGameHistoryBuildings': pathGameHistoryBuildings,
+            'pathGameCompanies': pathGameCompanies,
+            'versions': versions,
+            'resources': database['resources'],
+            'ranking': ranking,
+            'stateIDToName': database['gameIndex']['stateIDToName'],
+            }))
+    except (Exception, SystemExit):
+        logger.exception(f"Could not load the game files from {pathToGame}")
+        app.pathCheckQueue.put((requestID, 'invalid', None))
 
-        clearExtendedGUI(app)
-        if isPathValid:
+def pollPathCheck(app: App, pathAppdataConfig, pathAppdataStateRegionsOriginal, logger, pathAppdataVersions) -> None:
+    """On the main thread, apply the results of the path checks to the GUI; results of stale checks are dropped"""
+    while not app.pathCheckQueue.empty():
+        requestID, status, result = app.pathCheckQueue.get()
+        if requestID != app.pathCheckRequest:
+            continue
+        if status == 'invalid':
+            clearExtendedGUI(app)
+            app.loadedPath = None
+            app.btnPathIsCorrect.configure(image=loadImage('wrong.png', logger))
+            markPhase("path checked, not a game folder")
+            reportStartup(logger, True)
+        elif status == 'loading':
+            clearExtendedGUI(app)
+            app.loadedPath = None
+        elif status == 'loaded':
             with open(pathAppdataConfig, "w") as f:
-                f.write("path=" + gamePath)
+                f.write("path=" + result['gamePath'])
 
             app.focus_set()
-            
-            versions = getVersions(pathAppdataVersions, logger)
-            countStates, stateInfo, stateNameToID, stateIDToName = getStateCountAndNames(pathGameStateRegions, logger)            
-            app.resources = getResourcesFromConfig(countStates, logger)
-            app.resources, stateInfo = getInfoFromStateRegions(pathGameStateRegions, stateInfo, app.resources, logger)
-            app.resources = findStatesWithMostResources(app.resources, countStates)
+            app.resources = result['resources']
+            app.rankingIndex = result['ranking']
+            app.loadedPath = result['gamePath']
 
-            app = addNonTableWidgets(app, logger, pathGameStateRegions, versions, pathAppdataVersions, pathAppdataStateRegionsOriginal, pathGameHistoryBuildings, pathGameCompanies, stateIDToName)
+            clearExtendedGUI(app)
+            app = addNonTableWidgets(app, logger, result['pathGameStateRegions'], result['versions'], pathAppdataVersions, pathAppdataStateRegionsOriginal, result['pathGameHistoryBuildings'], result['pathGameCompanies'], result['stateIDToName'])
             app = addTableWidgets(app, logger)
-        else:
-            filePath = os.path.join('resources', 'wrong.png')
-            if not os.path.exists(filePath):
-                logger.error(f"No file at path {filePath}")
-                sys.exit()
-            app.imagePathIsCorrect = Image.open(filePath)
-            app.btnPathIsCorrect.configure(image=ctk.CTkImage(app.imagePathIsCorrect))
-    #callback()
-    return callback(app, pathAppdataConfig, pathAppdataStateRegionsOriginal, logger, pathAppdataVersions)   
+            markPhase("game files loaded")
+            reportStartup(logger, True)
+    if any(thread.is_alive() for thread in app.pathCheckWorkers) or not app.pathCheckQueue.empty():
+        app.after(PATH_CHECK_POLL_MS, pollPathCheck, app, pathAppdataConfig, pathAppdataStateRegionsOriginal, logger, pathAppdataVersions)
+    else:
+        app.pathCheckPolling = False
 
 def addNonTableWidgets (app: App, logger, pathGameStateRegions, versions, pathAppdataVersions, pathAppdataStateRegionsOriginal, pathGameHistoryBuildings, pathGameCompanies, stateIDToName):
     """Add to GUI all widgets which are not the widget table corresponding to the resources
     Returns the app and the container of non-table widgets
     """
-    imagePathIsCorrect = Image.open('resources/OK.png')
-    app.btnPathIsCorrect.configure(image=ctk.CTkImage(imagePathIsCorrect))
+    app.btnPathIsCorrect.configure(image=loadImage('OK.png', logger))
 
     app.labelPresets = ctk.CTkLabel(master=app, text="Presets", justify=ctk.RIGHT)
     app.labelPresets.grid(row = 1, column = 0)
 
-    app.comboBoxPresets = ctk.CTkComboBox(app, values=["Vanilla - No shuffle", "Gold", "Yellow & Black Gold", "Discoverables", "Mineable & Oil", "All but wood", "All"])
-    app.comboBoxPresets.configure(command=functools.partial(switchResourcePresetCallback, resources=app.resources))
+    app.comboBoxPresets = ctk.CTkComboBox(app, values=PRESETS)
+    app.comboBoxPresets.configure(command=functools.partial(switchResourcePresetCallback, app=app))
     app.comboBoxPresets.grid(row = 1, column = 1)
 
     app.labelHeaderResource = ctk.CTkLabel(master=app, text="Resource", justify=ctk.RIGHT)
@@ -114,7 +207,7 @@ def addNonTableWidgets (app: App, logger, pathGameStateRegions, versions, pathAp
     app.labelVersion = ctk.CTkLabel(master=app, text="Version", justify=ctk.RIGHT)
     app.labelVersion.grid(row = 1, column = 3)
 
-    app.comboBoxVersions = ctk.CTkComboBox(app, values=versions, command=functools.partial(switchVersionCallback, app, pathAppdataVersions, pathGameStateRegions, logger))
+    app.comboBoxVersions = ctk.CTkComboBox(app, values=versions, command=functools.partial(switchVersionCallback, app, pathAppdataVersions, pathGameStateRegions, pathAppdataStateRegionsOriginal, pathGameHistoryBuildings, pathGameCompanies, logger))
     app.comboBoxVersions.grid(row = 1, column = 4)
 
     # app.imageRename = Image.open('resources/edit.png')
@@ -128,19 +221,31 @@ def addNonTableWidgets (app: App, logger, pathGameStateRegions, versions, pathAp
     #                         command=None)
     # app.btnDelete.grid(row=2, column=5)
 
-    app.imageOpen = Image.open('resources/open.png')
-    app.btnOpen = ctk.CTkButton(app, text = "", corner_radius=32, image=ctk.CTkImage(app.imageOpen), fg_color="#dddddd",
-                            command=functools.partial(openFolderCallback(app, pathAppdataVersions)))
+    app.btnOpen = ctk.CTkButton(app, text = "", corner_radius=32, image=loadImage('open.png', logger), fg_color="#dddddd",
+                            command=functools.partial(openFolderCallback(app, pathAppdataVersions, pathAppdataStateRegionsOriginal, pathGameHistoryBuildings, pathGameCompanies, logger)))
     app.btnOpen.grid(row=1, column=5)
 
-    app.imagePathIsCorrect = Image.open('resources/OK.png')
     app.btnExecute = ctk.CTkButton(app, text = "Shuffle", corner_radius=32, 
                             command=functools.partial(performShuffle(app, versions, pathAppdataVersions, pathGameStateRegions, pathAppdataStateRegionsOriginal, pathGameHistoryBuildings, pathGameCompanies, logger)))
     app.btnExecute.grid(row=1, column=6)
 
+    app.btnPreview = ctk.CTkButton(app, text = "Preview", corner_radius=32,
+                            command=functools.partial(performPreview(app, pathAppdataVersions, pathGameStateRegions, pathAppdataStateRegionsOriginal, pathGameHistoryBuildings, pathGameCompanies, logger)))
+    app.btnPreview.grid(row=1, column=2)
+
+    # Progress of a shuffle or of a switch of version, shown only while one runs
+    app.labelProgress = ctk.CTkLabel(master=app, text="", justify=ctk.LEFT)
+    app.labelProgress.grid(row=2, column=3, columnspan=2)
+    app.progressBar = ctk.CTkProgressBar(app)
+    app.progressBar.grid(row=2, column=5)
+    app.btnCancel = ctk.CTkButton(app, text="Cancel", corner_radius=32)
+    app.btnCancel.grid(row=2, column=6)
+    for widget in (app.labelProgress, app.progressBar, app.btnCancel):
+        widget.grid_remove()
+
     app.extendedGUIElements.extend([app.labelPresets, app.comboBoxPresets, app.labelHeaderResource, app.labelHeaderShuffle, app.switchMaxResources,
                         app.labelVersion, app.comboBoxVersions, #app.btnRename, app.btnDelete, 
-                        app.btnExecute])
+                        app.btnExecute, app.btnPreview, app.labelProgress, app.progressBar, app.btnCancel])
 
     return app
 
@@ -157,7 +262,7 @@ def addTableWidgets(app: App, logger):
         labelGoodName.grid(row = TABLE_GOODS_FIRST_ROW + len(app.resourcesListGUI), column = 0)
 
         switchBox = ctk.CTkSwitch(master=app, text="", variable=resource['stringVar'], onvalue="1", offvalue="0",
-                                        command=functools.partial(switchResourceCallback(resKey, app.resources, app.comboBoxPresets, logger)))
+                                        command=functools.partial(switchResourceCallback(resKey, app, logger)))
         
         if resource['strColor']:
             switchBox.configure(progress_color="#" + resource['strColor'])
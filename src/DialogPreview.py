@@ -0,0 +1,30 @@
+import functools
+import customtkinter as ctk
+
+from preview import formatBestStates, formatShuffleDiff
+
+class PreviewDialog(ctk.CTkToplevel):
+    """Shows what a shuffle would change in the game's files, and the best states after it, before it is written"""
+    def __init__(self, database, onWrite, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.geometry("700x500")
+        self.title(f"Preview of the shuffle with seed {database['seed']}")
+        self.grab_set()
+        self.grid_columnconfigure((0, 1), weight=1)
+
+        lines = formatShuffleDiff(database['diff']) + ["", "Best states"] + formatBestStates(database['ranking'], database['gameIndex']['stateIDToName'], database['resources'])
+        self.textDiff = ctk.CTkTextbox(self, width=680, height=420, font=("Courier", 12))
+        self.textDiff.insert("0.0", "\n".join(lines))
+        self.textDiff.configure(state="disabled")
+        self.textDiff.grid(row=0, column=0, columnspan=2, padx=10, pady=10)
+
+        self.btnWrite = ctk.CTkButton(self, text = "Write into the game", command=functools.partial(writeCallback, self, onWrite))
+        self.btnWrite.grid(row=1, column=0, padx=(10, 5), pady=10)
+
+        self.btnDiscard = ctk.CTkButton(self, text = "Discard", command=self.destroy)
+        self.btnDiscard.grid(row=1, column=1, padx=(5, 10), pady=10)
+
+def writeCallback(self, onWrite):
+    """On button press, close the preview and write the shuffle"""
+    self.destroy()
+    onWrite()
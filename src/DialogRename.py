@@ -1,19 +1,18 @@
 import functools
-import os
 import re
 import customtkinter as ctk
 from CTkMessagebox import CTkMessagebox
 
-from Auxiliary import copyTree
+from services import saveRecipeVersion
 
 class RenameDialog(ctk.CTkToplevel):
     """Handles the input and the validation of the new name for the new version"""
-    def __init__(self, name, app, pathAppdataVersions, pathGameStateRegions, *args, **kwargs):
+    def __init__(self, name, app, pathAppdataVersions, pathGameStateRegions, logger, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.geometry("400x300")
         self.grab_set()
 
-        self.label = ctk.CTkLabel(self, text="New name:")
+        self.label = ctk.CTkLabel(self, text=f"New name (seed {app.shuffleRecipe['seed']}):")
         self.label.grid(row=0, column=0, padx=(10, 5), pady=10)
 
         self.entry = ctk.CTkEntry(self, width = 300)
@@ -22,10 +21,10 @@ class RenameDialog(ctk.CTkToplevel):
         
 
         self.btnRename = ctk.CTkButton(self, text = "Confirm",
-                                 command=functools.partial(renameCallback, self, app, pathAppdataVersions, pathGameStateRegions))
+                                 command=functools.partial(renameCallback, self, app, pathAppdataVersions, pathGameStateRegions, logger))
         self.btnRename.grid(row=2, column=0, padx=(10, 5), pady=10)
 
-def renameCallback(self, app, pathAppdataVersions, pathGameStateRegions):
+def renameCallback(self, app, pathAppdataVersions, pathGameStateRegions, logger):
     """On button press, perform validation of the new version name"""
     def callback():
         newName = self.entry.get()
@@ -44,22 +43,10 @@ def renameCallback(self, app, pathAppdataVersions, pathGameStateRegions):
             versions.append(newName)
             app.comboBoxVersions.configure(values=versions)
             app.comboBoxVersions.set(newName)
+            app.activeVersion = newName
              
-            pathVersion = os.path.join(pathAppdataVersions, newName)
-            pathVersionConfigFile = os.path.join(pathVersion, 'config.ini')
-            pathVersionStateRegions = os.path.join(pathVersion, 'state_regions')
-            os.makedirs(pathVersionStateRegions)
-            
-            with open(pathVersionConfigFile, "w+") as f:
-                for resKey, resource in app.resources.items():
-                    if resource['isShuffled']:
-                        f.write(resKey + " ")
-            
-            if not os.path.exists(pathVersionStateRegions):
-                CTkMessagebox(title="Error", message=f'Cannot find {pathVersionStateRegions}', icon="cancel")
-            else:
-                copyTree(pathGameStateRegions, pathVersionStateRegions)
-                self.destroy()
-                CTkMessagebox(title="Success", message=f"You are now ready to play with the new version '{newName}'!", icon="check", option_1="OK")
+            saveRecipeVersion(pathAppdataVersions, newName, app.shuffleRecipe, logger)
+            self.destroy()
+            CTkMessagebox(title="Success", message=f"You are now ready to play with the new version '{newName}'!", icon="check", option_1="OK")
     callback()
     return callback
\ No newline at end of file
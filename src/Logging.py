@@ -1,5 +1,6 @@
 import os
 import yaml
+from instrumentation import configureInstrumentation
 import logging.config
 import logging.handlers
 from logging import Logger
@@ -13,6 +14,8 @@ def setupLogging() -> Logger:
     configFile = os.path.join("loggingConfigs", "config.yaml")
     with open(configFile) as fIn:
         config = yaml.safe_load(fIn)
+    os.makedirs("logs", exist_ok=True)
+    configureInstrumentation(config.pop('instrumentation', None))
     logging.config.dictConfig(config)
 
     logger = logging.getLogger("V3RS")
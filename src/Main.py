@@ -1,11 +1,26 @@
-from DialogApp import App
-from Logging import setupLogging
-from AppData import configureAppData
+import multiprocessing
+from startupTrace import importTimed, markPhase
+
+# Everything is imported under the main guard: the worker processes which parse the game files import this module again, and need none of the GUI
+# The heavy libraries are imported first, so that the trace shows what each of them costs; PIL and CTkMessagebox are only imported at their first use
 
 if __name__ == "__main__":
-    logger = setupLogging()
-    pathAppdataVersions, pathAppdataConfig, pathAppdataStateRegionsOriginal = configureAppData(logger)
+    multiprocessing.freeze_support()
+    importTimed("yaml")
+    importTimed("customtkinter")
+    Logging = importTimed("Logging")
+    AppData = importTimed("AppData")
+    Auxiliary = importTimed("Auxiliary")
+    parseCache = importTimed("parseCache")
+    DialogApp = importTimed("DialogApp")
 
-    app = App(pathAppdataConfig, pathAppdataStateRegionsOriginal, logger, pathAppdataVersions)
-    app.mainloop()
+    logger = Logging.setupLogging()
+    Auxiliary.checkNumpy(logger)
+    markPhase("logging")
+    pathAppdataVersions, pathAppdataConfig, pathAppdataStateRegionsOriginal, pathAppdataCache = AppData.configureAppData(logger)
+    cache = parseCache.loadParseCache(pathAppdataCache, logger)
+    markPhase("app data & parse cache")
 
+    app = DialogApp.App(pathAppdataConfig, pathAppdataStateRegionsOriginal, logger, pathAppdataVersions, cache)
+    markPhase("window")
+    app.mainloop()
@@ -1,6 +0,0 @@
-from enum import Enum
-
-class StateResourceExpected (Enum):
-    NONE = 0
-    STATIC = 1
-    DYNAMIC = 2
\ No newline at end of file
@@ -0,0 +1,101 @@
+import copy
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from corpus import closeCorpus, getCorpusBytes, newCorpus
+from gameIndex import getFilesOfStates
+from parseCache import newParseCache, parseCached, saveParseCache
+from readFromGameFiles import listStateRegionsFiles, parseStateRegionsBuffer
+from services import backUpStateRegions, fingerprintGameFiles, getGameFilePaths, loadGameDatabase, makeRecipe, renderStateRegionsFile, selectShuffledResources, shuffleAndGetChangedStates
+from versionStore import addVersion, loadVersionIndex, saveVersionIndex, writeBlob
+
+# The game database, parsed once by the main process and handed to each worker process when it starts
+workerDatabase = None
+
+def initWorker(database):
+    """Keep in the worker process the game database shared by every version it generates"""
+    global workerDatabase
+    workerDatabase = database
+
+def readOriginalFiles(pathAppdataStateRegionsOriginal, parseCache, corpus):
+    """Get, from the corpus, the bytes and the parsed states of the files of the original state_regions, which every version is rendered from
+    Files which are not rewritten, like the seas, map to None: versions keep them as they are"""
+    files = {}
+    stateFiles = set(listStateRegionsFiles(pathAppdataStateRegionsOriginal))
+    for filename in os.listdir(pathAppdataStateRegionsOriginal):
+        filePath = os.path.join(pathAppdataStateRegionsOriginal, filename)
+        if not os.path.isfile(filePath):
+            continue
+        if filePath in stateFiles:
+            files[filename] = (bytes(getCorpusBytes(corpus, filePath)), parseCached(parseCache, filePath, parseStateRegionsBuffer, corpus))
+        else:
+            files[filename] = None
+    return files
+
+def generateVersion(task):
+    """Runs in a worker process: shuffle with the seed of the task and store the files it changed in the versions store
+    Returns the version's name, its changed files (file name -> blob hash) and its recipe; the index is updated by the main process"""
+    name, seed = task
+    database = workerDatabase
+    logger = logging.getLogger("V3RS")
+    resources = copy.deepcopy(database['resources'])
+    resources, changedStates = shuffleAndGetChangedStates(resources, logger, database['gameIndex']['stateIDToName'], seed, database['options'])
+
+    changedFiles = {}
+    filesToRender = getFilesOfStates(database['gameIndex'], changedStates)
+    for filename, original in database['files'].items():
+        if original is None or filename not in filesToRender:
+            continue
+        content, states = original
+        newContent = renderStateRegionsFile(content, database['stateInfo'], resources, database['gameIndex'], changedStates, states)
+        if newContent != content:
+            changedFiles[filename] = writeBlob(database['pathAppdataVersions'], newContent)
+    return name, changedFiles, makeRecipe(seed, resources, database['fingerprint'], database['options']), len(changedStates)
+
+def generateVersions(pathGame, pathAppdataVersions, pathAppdataStateRegionsOriginal, preset, resourceKeys, count, baseSeed, logger, parseCache=None, processes=None, options=None):
+    """Generate 'count' versions into the versions store, shuffled with the seeds baseSeed, baseSeed + 1, ..., in parallel worker processes
+    The shuffled resources are the ones of the preset if given, otherwise 'resourceKeys'; 'options' are the ones of shuffleResources
+    The game is parsed once, from the original back-up; the game's own files are not changed
+    Returns the names of the generated versions"""
+    isPathValid, _, pathGameStateRegions, pathGameHistoryBuildings, pathGameCompanies, _ = getGameFilePaths(pathGame, logger)
+    if not isPathValid:
+        logger.error(f"Cannot generate versions, {pathGame} is not a Victoria 3 folder")
+        return []
+    if not os.path.exists(pathAppdataStateRegionsOriginal):
+        backUpStateRegions(pathGameStateRegions, pathAppdataStateRegionsOriginal, logger)
+
+    parseCache = newParseCache() if parseCache is None else parseCache
+    corpus = newCorpus()
+    try:
+        database = loadGameDatabase(pathAppdataStateRegionsOriginal, pathGameHistoryBuildings, pathGameCompanies, logger, parseCache, corpus=corpus)
+        resourceKeys = selectShuffledResources(database['resources'], preset, resourceKeys)
+        database['files'] = readOriginalFiles(pathAppdataStateRegionsOriginal, parseCache, corpus)
+        database['pathAppdataVersions'] = pathAppdataVersions
+        database['options'] = options
+        database['fingerprint'] = fingerprintGameFiles(pathAppdataStateRegionsOriginal, pathGameHistoryBuildings, pathGameCompanies, corpus)
+    finally:
+        closeCorpus(corpus)
+    label = preset if preset else "Custom"
+    saveParseCache(parseCache, logger)
+
+    index = loadVersionIndex(pathAppdataVersions, logger)
+    tasks = []
+    for seed in range(baseSeed, baseSeed + count):
+        name = f"{label} seed {seed}"
+        if name in index['versions']:
+            logger.warning(f"Version '{name}' already exists, it is skipped")
+            continue
+        tasks.append((name, seed))
+    logger.info(f"Generating {len(tasks)} versions shuffling {' '.join(resourceKeys)}")
+
+    names = []
+    with ProcessPoolExecutor(max_workers=processes, initializer=initWorker, initargs=(database,)) as executor:
+        for name, changedFiles, recipe, changedStateCount in executor.map(generateVersion, tasks):
+            manifest = dict(index['versions']['original']['manifest'])
+            manifest.update(changedFiles)
+            addVersion(index, name, manifest, recipe['resources'], recipe)
+            logger.info(f"Generated version '{name}': resources changed in {changedStateCount} states, {len(changedFiles)} files")
+            names.append(name)
+    saveVersionIndex(pathAppdataVersions, index)
+    return names
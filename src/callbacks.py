@@ -1,99 +1,248 @@
 from datetime import datetime
+import functools
 import os
-from Auxiliary import copyTree
-from DialogRename import RenameDialog
-from globalProperties import IGNORED_RESOURCES, TEXT_DEFAULT_BEST_STATES
-from CTkMessagebox import CTkMessagebox
+import queue
+import threading
+from globalProperties import BEST_STATES_COUNT, IGNORED_RESOURCES, TASK_POLL_MS, TEXT_DEFAULT_BEST_STATES
 import subprocess
 
-from readFromGameFiles import getInfoFromStateRegions, getGuaranteedResourcesFromCompanies, getGuaranteedResourcesFromHistory
-from services import clearCollectedResources, findStatesWithMostResources, getStateCountAndNames, loadVersionConfigFile, backUpStateRegions, updateNewStateRegions
+from instrumentation import exportTrace, span
+from parseCache import saveParseCache
+from progress import TaskCancelled, finishTask, gameFilesLock, requestCancel, startTask
+from gameIndex import indexResources
+from readFromGameFiles import getInfoFromStateRegions
+from services import clearCollectedResources, isShuffledInPreset, getStateCountAndNames, rankStates, loadVersionConfigFile, previewShuffle, shuffleGameFiles, writeShuffle, writeVersion
 
 def performShuffle(app, versions, pathAppdataVersions, pathGameStateRegions, pathAppdataStateRegionsOriginal, pathGameHistoryBuildings, pathGameCompanies, logger):
-    """At the button click, perform the shuffle with the specified set of resources                    
+    """At the button click, perform the shuffle with the specified set of resources
+    The shuffle runs on a worker thread, on a copy of the resources, so that the window stays responsive and a cancelled shuffle changes nothing
     """
     def callback():
-        if app.top is None or not app.top.winfo_exists():
-
-            backUpStateRegions(pathGameStateRegions, pathAppdataStateRegionsOriginal, logger)
-            stateCount, stateInfo, stateNameToID, stateIDToName = getStateCountAndNames(pathGameStateRegions, logger)
-            clearCollectedResources(stateCount, app.resources)
-            app.resources, stateInfo = getInfoFromStateRegions(pathGameStateRegions, stateInfo, app.resources, logger)
-            app.resources = getGuaranteedResourcesFromHistory(pathGameHistoryBuildings, app.resources, logger)
-            app.resources = getGuaranteedResourcesFromCompanies(stateNameToID, stateIDToName, app.resources, pathGameCompanies, logger)
-            app.resources = updateNewStateRegions(pathGameStateRegions, stateInfo, app.resources, logger, stateIDToName)
-            app.resources = findStatesWithMostResources(app.resources, stateCount)
-            switchBestStatesCallback(app, stateIDToName, logger)
+        if app.top is not None and app.top.winfo_exists():
+            app.top.focus()  # if window exists focus it
+            return
+        if app.task is not None:
+            return
+        resources = {resKey: dict(resource) for resKey, resource in app.resources.items()}
+
+        def work():
+            with span("performShuffle"):
+                database = shuffleGameFiles(pathGameStateRegions, pathAppdataStateRegionsOriginal, pathGameHistoryBuildings, pathGameCompanies, resources, logger, parseCache=app.parseCache)
+                with span("save parse cache"):
+                    saveParseCache(app.parseCache, logger)
+            return database
+
+        startBackgroundTask(app, "Shuffling", work, functools.partial(onShuffled, app, pathAppdataVersions, pathGameStateRegions, logger), logger)
+    return callback
+
+def onShuffled(app, pathAppdataVersions, pathGameStateRegions, logger, database):
+    """Once a shuffle is written into the game's files, show its best states and ask for the name of the new version"""
+    from DialogRename import RenameDialog
+
+    app.resources = database['resources']
+    app.shuffleRecipe = database['recipe']
+    app.rankingIndex = database['ranking']
+    with span("best states"):
+        switchBestStatesCallback(app, database['gameIndex']['stateIDToName'], logger)
+    exportTrace("shuffle", logger)
+
+    now = datetime.now()
+    name = app.comboBoxPresets.get() + " " + f" {now.year}-{now.month:02d}-{now.day:02d}  {now.hour:02d}-{now.minute:02d}-{now.second:02d}"
+
+    app.top = RenameDialog(name, app, pathAppdataVersions, pathGameStateRegions, logger)  # create window if its None or destroyed
+    app.top.focus()
 
-            now = datetime.now()
-            name = app.comboBoxPresets.get() + " " + f" {now.year}-{now.month:02d}-{now.day:02d}  {now.hour:02d}-{now.minute:02d}-{now.second:02d}"
+def performPreview(app, pathAppdataVersions, pathGameStateRegions, pathAppdataStateRegionsOriginal, pathGameHistoryBuildings, pathGameCompanies, logger):
+    """At the button click, shuffle the specified set of resources in memory only, and show what would change against the original files
+    Nothing is written, nor backed up and restored, unless the user writes the shuffle from the preview; it then goes on as a shuffle of the "Shuffle" button
+    """
+    def callback():
+        if app.top is not None and app.top.winfo_exists():
+            app.top.focus()
+            return
+        if app.task is not None:
+            return
+        resources = {resKey: dict(resource) for resKey, resource in app.resources.items()}
+
+        def work():
+            with span("performPreview"):
+                database = previewShuffle(pathAppdataStateRegionsOriginal, pathGameHistoryBuildings, pathGameCompanies, resources, logger, parseCache=app.parseCache)
+                with span("save parse cache"):
+                    saveParseCache(app.parseCache, logger)
+            return database
+
+        def onPreviewed(database):
+            from DialogPreview import PreviewDialog
 
-            app.top = RenameDialog(name, app, pathAppdataVersions, pathGameStateRegions)  # create window if its None or destroyed
+            exportTrace("preview", logger)
+            app.top = PreviewDialog(database, functools.partial(writePreviewedShuffle, app, database, pathAppdataVersions, pathGameStateRegions, pathAppdataStateRegionsOriginal, logger))
+            app.top.focus()
 
-        app.top.focus()  # if window exists focus it
+        startBackgroundTask(app, "Previewing", work, onPreviewed, logger)
     return callback
 
-def switchResourceCallback(resKey, resources, comboBoxPresets, logger):
-    """At the switch click, switch whether the respective resource will be shuffled"""
+def writePreviewedShuffle(app, database, pathAppdataVersions, pathGameStateRegions, pathAppdataStateRegionsOriginal, logger):
+    """Write a previewed shuffle into the game's files, on a worker thread; only the files of the states which changed are rendered"""
+    def work():
+        with span("writePreview"):
+            writeShuffle(database, pathGameStateRegions, pathAppdataStateRegionsOriginal, logger, app.parseCache)
+        return database
+
+    startBackgroundTask(app, "Writing the shuffle", work, functools.partial(onShuffled, app, pathAppdataVersions, pathGameStateRegions, logger), logger)
+
+def startBackgroundTask(app, title, work, onFinished, logger):
+    """Run 'work' on a worker thread, with its progress and a cancel button shown in the window
+    'onFinished' gets the result of 'work' on the main thread, through after(); it is not called if the task was cancelled or failed
+    Only one task runs at a time: the shuffle and preview buttons and the versions are disabled meanwhile, and it waits for the back-up of a path check, see progress.gameFilesLock"""
+    task = startTask()
+    app.task = task
+    results = queue.Queue()
+    def run():
+        try:
+            with gameFilesLock:
+                results.put(('done', work()))
+        except TaskCancelled:
+            logger.info(f"{title}: cancelled")
+            results.put(('cancelled', None))
+        except (Exception, SystemExit):
+            logger.exception(f"{title}: failed")
+            results.put(('failed', None))
+        finally:
+            finishTask(task)
+    showTaskWidgets(app, task, title)
+    threading.Thread(target=run, daemon=True).start()
+    app.after(TASK_POLL_MS, pollBackgroundTask, app, task, results, title, onFinished, app.progressBar)
+
+def showTaskWidgets(app, task, title):
+    """Show the progress of a task in place of the buttons which start one"""
+    app.btnExecute.configure(state="disabled")
+    app.btnPreview.configure(state="disabled")
+    app.comboBoxVersions.configure(state="disabled")
+    app.labelProgress.configure(text=title)
+    app.progressBar.set(0)
+    app.btnCancel.configure(command=lambda: cancelBackgroundTask(app, task), state="normal")
+    for widget in (app.labelProgress, app.progressBar, app.btnCancel):
+        widget.grid()
+
+def hideTaskWidgets(app):
+    """Hide the progress of the finished task, and enable again the buttons which start one"""
+    for widget in (app.labelProgress, app.progressBar, app.btnCancel):
+        widget.grid_remove()
+    app.btnExecute.configure(state="normal")
+    app.btnPreview.configure(state="normal")
+    app.comboBoxVersions.configure(state="normal")
+
+def cancelBackgroundTask(app, task):
+    """At the button click, ask the task to stop; once it writes the game's files, it runs to its end instead"""
+    app.btnCancel.configure(state="disabled")
+    if requestCancel(task):
+        app.labelProgress.configure(text="Cancelling...")
+    else:
+        app.labelProgress.configure(text="Writing the files, it cannot be cancelled anymore")
+
+def pollBackgroundTask(app, task, results, title, onFinished, progressBar):
+    """On the main thread, show the progress of the task, then hand its result to 'onFinished'
+    If the widgets were removed meanwhile, e.g. because the path to the game changed, the task is only waited for"""
+    isShown = progressBar is app.progressBar and progressBar.winfo_exists()
+    if results.empty():
+        if isShown and task['phase'] is not None and not task['cancelRequested'].is_set():
+            app.labelProgress.configure(text=f"{title}: {task['phase']} {task['done']}/{task['total']}")
+            progressBar.set(task['done'] / task['total'] if task['total'] else 0)
+        app.after(TASK_POLL_MS, pollBackgroundTask, app, task, results, title, onFinished, progressBar)
+        return
+    status, result = results.get()
+    app.task = None
+    if not isShown:
+        return
+    hideTaskWidgets(app)
+    if status == 'done':
+        onFinished(result)
+    elif status == 'failed':
+        from CTkMessagebox import CTkMessagebox
+        CTkMessagebox(title="Error", message=f"{title} failed, see the log", icon="cancel")
+    elif app.activeVersion is not None:
+        app.comboBoxVersions.set(app.activeVersion)
+
+def switchResourceCallback(resKey, app, logger):
+    """At the switch click, switch whether the respective resource will be shuffled
+    The resources are looked up at the click: a shuffle or a switch of version replaces app.resources with its own"""
     def callback():
-        value = resources[resKey]['stringVar'].get()
-        if value == "1":
-            resources[resKey]['isShuffled'] = True
-        else:
-            resources[resKey]['isShuffled'] = False
-        comboBoxPresets.set('Custom')
-        logger.info(f'{resKey}: {resources[resKey]['isShuffled']}')
+        resource = app.resources[resKey]
+        resource['isShuffled'] = resource['stringVar'].get() == "1"
+        app.comboBoxPresets.set('Custom')
+        logger.info(f'{resKey}: {resource['isShuffled']}')
     return callback
 
-def switchResourcePresetCallback(value, resources):
-    """At the selection of a dropdown element, change the set of resources to be shuffled"""
+def switchResourcePresetCallback(value, app):
+    """At the selection of a dropdown element, change the set of resources to be shuffled, in the app's current resources"""
     def callback():
-        for resourceName, resource in resources.items():
+        for resourceName, resource in app.resources.items():
             if resourceName in IGNORED_RESOURCES:
                 continue
-            resource['isShuffled'] = False
-            resource['stringVar'].set("0")
-
-            if  value == "All" or \
-                resourceName == 'gold' and value != "Vanilla - No shuffle" or \
-                resourceName == 'oil' and value not in ["Vanilla - No shuffle", "Gold"] or \
-                resourceName in ['coal', 'iron', 'lead', 'sulfur'] and value not in ["Vanilla - No shuffle", "Gold", "Yellow & Black Gold", "Discoverables"] or \
-                resourceName == 'rubber' and value in ["All but wood", "All", "Discoverables"]:
-
-                resource['isShuffled'] = True
-                resource['stringVar'].set("1")
+            resource['isShuffled'] = isShuffledInPreset(resourceName, value)
+            resource['stringVar'].set("1" if resource['isShuffled'] else "0")
     callback()            
     return callback
 
-def openFolderCallback(app, pathAppdataVersions):
-    """At the button click, open the versions folder"""
+def openFolderCallback(app, pathAppdataVersions, pathAppdataStateRegionsOriginal, pathGameHistoryBuildings, pathGameCompanies, logger):
+    """At the button click, open the folder of the version
+    The version's files are exported there first from the versions store (or re-created from its recipe), so that they can be copied into a mod
+    The export runs on a worker thread, like a switch of version: re-creating a recipe shuffles the original files again"""
     def callback():
+        if app.task is not None:
+            return
         currentVersion = app.comboBoxVersions.get()
-        currentPath = os.path.join(pathAppdataVersions, currentVersion)
-        subprocess.Popen(r'explorer /select,' + currentPath + "\\")
+        currentPath = os.path.join(os.path.dirname(pathAppdataVersions), "exports", currentVersion)
+        currentVersionPath = os.path.join(currentPath, 'state_regions')
+
+        def work():
+            return writeVersion(pathAppdataVersions, currentVersion, currentVersionPath, pathAppdataStateRegionsOriginal, pathGameHistoryBuildings, pathGameCompanies, logger, app.parseCache)
+
+        def onExported(isWritten):
+            if not isWritten:
+                from CTkMessagebox import CTkMessagebox
+                CTkMessagebox(title="Error", message="The version does not exist, or it was made from other game files or by another release and cannot be re-created", icon="cancel")
+                return
+            subprocess.Popen(r'explorer /select,' + currentPath + "\\")
+
+        startBackgroundTask(app, f"Exporting '{currentVersion}'", work, onExported, logger)
     return callback
 
-def switchVersionCallback(app, pathAppdataVersions, pathGameStateRegions, logger, nothing):
-    """At the combobox element selection, change to another version and load it"""
+def switchVersionCallback(app, pathAppdataVersions, pathGameStateRegions, pathAppdataStateRegionsOriginal, pathGameHistoryBuildings, pathGameCompanies, logger, nothing):
+    """At the combobox element selection, change to another version and load it
+    Versions stored as recipes are re-created from the original files and their seed
+    The version is written and parsed again on a worker thread; a cancelled switch leaves the game's files and the selected version as they were"""
     def callback():
+        if app.task is not None:
+            return
         currentVersion = app.comboBoxVersions.get()
-        currentVersionPath = os.path.join(pathAppdataVersions, currentVersion, 'state_regions')
-        if not os.path.exists(currentVersionPath):
-            CTkMessagebox(title="Error", message="The version's folder does not exist", icon="cancel")
-        else:
-            # for file in  os.listdir(pathGameStateRegions):
-            #     filePath = os.path.join(pathGameStateRegions, file)
-            #     os.remove(filePath)
-            copyTree(currentVersionPath, pathGameStateRegions)
-            logger.info(f"Copied from {currentVersionPath} to {pathGameStateRegions}")
-            CTkMessagebox(title="Success", message=f"You are now ready to play with the version '{currentVersion}'!", icon="check", option_1="OK")
+        resources = {resKey: dict(resource) for resKey, resource in app.resources.items()}
+
+        def work():
+            if not writeVersion(pathAppdataVersions, currentVersion, pathGameStateRegions, pathAppdataStateRegionsOriginal, pathGameHistoryBuildings, pathGameCompanies, logger, app.parseCache):
+                return None
+            stateCount, stateInfo, gameIndex = getStateCountAndNames(pathGameStateRegions, logger, app.parseCache)
+            clearCollectedResources(stateCount, resources)
+            getInfoFromStateRegions(pathGameStateRegions, stateInfo, indexResources(gameIndex, resources), resources, logger, app.parseCache)
+            saveParseCache(app.parseCache, logger)
+            return rankStates(resources), gameIndex['stateIDToName']
 
-            stateCount, stateInfo, stateNameToID, stateIDToName = getStateCountAndNames(pathGameStateRegions, logger)
-            clearCollectedResources(stateCount, app.resources)
-            app.resources, stateInfo = getInfoFromStateRegions(pathGameStateRegions, stateInfo, app.resources, logger)
-            app.resources = findStatesWithMostResources(app.resources, stateCount)
+        def onSwitched(result):
+            from CTkMessagebox import CTkMessagebox
+
+            if result is None:
+                CTkMessagebox(title="Error", message="The version does not exist, or it was made from other game files or by another release and cannot be re-created", icon="cancel")
+                if app.activeVersion is not None:
+                    app.comboBoxVersions.set(app.activeVersion)
+                return
+            app.resources = resources
+            app.rankingIndex, stateIDToName = result
+            app.activeVersion = currentVersion
             switchBestStatesCallback(app, stateIDToName, logger)
-            loadVersionConfigFile(app, pathAppdataVersions)
+            loadVersionConfigFile(app, pathAppdataVersions, logger)
+            CTkMessagebox(title="Success", message=f"You are now ready to play with the version '{currentVersion}'!", icon="check", option_1="OK")
+
+        startBackgroundTask(app, f"Switching to '{currentVersion}'", work, onSwitched, logger)
 
     callback()
     return callback
@@ -107,11 +256,13 @@ def switchBestStatesCallback(app, stateIDToName, logger):
                     continue
                 resource['labelBestStates'].set(TEXT_DEFAULT_BEST_STATES)        
         else:
+            from rankingIndex import getTopStates
             for resName, resource in app.resources.items():
                 if resName in IGNORED_RESOURCES:
                     continue
                 text = ""
-                for bestState in resource['bestStates']:
+                bestStates, _ = getTopStates(app.rankingIndex, resName, BEST_STATES_COUNT)
+                for bestState in bestStates:
                     state = stateIDToName[bestState][6:].capitalize()
                     text +=  state + " "
                 resource['labelBestStates'].set(text)
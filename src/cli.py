@@ -0,0 +1,159 @@
+import argparse
+import json
+import sys
+
+from AppData import configureAppData, readGamePath
+from Auxiliary import checkNumpy
+from globalProperties import IGNORED_RESOURCES, PRESETS
+from Logging import setupLogging
+from parseCache import loadParseCache
+from services import getResourcesFromConfig
+from shuffler import analyzeShuffles, deleteSavedVersion, generateVersions, listVersions, previewGame, shuffleGame, switchVersion, writePreview
+
+def positiveInt(value):
+    """Argument type of a count which must be at least 1, e.g. of shuffles"""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: '{value}'")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, not {number}")
+    return number
+
+def addResourceArguments(parser):
+    """Arguments choosing the resources to be shuffled"""
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--preset", choices=PRESETS, help="Preset of resources to be shuffled")
+    group.add_argument("--resources", help="Comma-separated resources to be shuffled, e.g. gold,oil")
+
+def addShuffleOptionArguments(parser):
+    """Arguments adding targets to the shuffle, on top of the amounts guaranteed for initial buildings and companies"""
+    parser.add_argument("--preserve-totals", action="store_true", help="Keep the world total of every resource: what is added to states short of their guaranteed amount is taken from the other deposits")
+    parser.add_argument("--max-per-state", type=int, default=None, help="Most of a resource a state may get, unless more is guaranteed to it")
+
+def getShuffleOptions(args):
+    """Get the options of the shuffle given on the command line, or None"""
+    options = {}
+    if args.preserve_totals:
+        options['preserveTotals'] = True
+    if args.max_per_state is not None:
+        options['maxPerState'] = args.max_per_state
+    return options or None
+
+def parseResourceKeys(parser, args, logger):
+    """Get the resources given with --resources; the command stops with the valid ones if one of them is not in resources.ini or is never shuffled"""
+    if not getattr(args, 'resources', None):
+        return []
+    resourceKeys = [key.strip() for key in args.resources.split(",") if key.strip()]
+    validKeys = [resKey for resKey in getResourcesFromConfig(0, logger) if resKey not in IGNORED_RESOURCES]
+    invalidKeys = [key for key in resourceKeys if key not in validKeys]
+    if invalidKeys or not resourceKeys:
+        parser.error(f"argument --resources: {'cannot shuffle ' + ', '.join(invalidKeys) if invalidKeys else 'no resource given'}; the resources which can be shuffled are {', '.join(validKeys)}")
+    return resourceKeys
+
+def buildParser():
+    """Command line of the shuffler"""
+    parser = argparse.ArgumentParser(description="Victoria 3 Resource Shuffler, without the GUI. Run it from the app's folder, next to resources.ini")
+    parser.add_argument("--path", help="Path to the Victoria 3 / mod folder; by default the one saved by the app")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    shuffle = commands.add_parser("shuffle", help="Shuffle the resources into the game's files")
+    addResourceArguments(shuffle)
+    addShuffleOptionArguments(shuffle)
+    shuffle.add_argument("--seed", type=int, default=None, help="Seed of the shuffle; by default a random one")
+    shuffle.add_argument("--name", default=None, help="Save the new version under this name")
+
+    preview = commands.add_parser("preview", help="Shuffle in memory and show what would change, without writing any file unless --write is given")
+    addResourceArguments(preview)
+    addShuffleOptionArguments(preview)
+    preview.add_argument("--seed", type=int, default=None, help="Seed of the shuffle; by default a random one. The same seed given to 'shuffle' writes the same shuffle")
+    preview.add_argument("--states", type=int, default=10, help="Number of changed states shown per resource, the ones which changed the most")
+    preview.add_argument("--output", default=None, help="Also write the whole diff, with every changed state, into this JSON file")
+    preview.add_argument("--write", action="store_true", help="Then write the shuffle into the game's files")
+    preview.add_argument("--name", default=None, help="With --write, save the new version under this name")
+
+    switch = commands.add_parser("switch", help="Write a saved version into the game's files; 'original' restores them")
+    switch.add_argument("name", help="Name of the version")
+
+    commands.add_parser("list", help="List the saved versions")
+
+    delete = commands.add_parser("delete", help="Delete a saved version, and the files no other version uses; the game's files are not changed")
+    delete.add_argument("name", help="Name of the version")
+
+    generate = commands.add_parser("generate", help="Generate many versions at once, without changing the game's files")
+    addResourceArguments(generate)
+    addShuffleOptionArguments(generate)
+    generate.add_argument("--count", type=positiveInt, required=True, help="Number of versions to generate")
+    generate.add_argument("--seed", type=int, required=True, help="Seed of the first version; the next ones use the following seeds")
+    generate.add_argument("--processes", type=positiveInt, default=None, help="Number of worker processes; by default one per core")
+
+    analyze = commands.add_parser("analyze", help="Measure how uneven many shuffles are, in memory, without writing any file")
+    addResourceArguments(analyze)
+    addShuffleOptionArguments(analyze)
+    analyze.add_argument("--runs", type=positiveInt, default=1000, help="Number of shuffles")
+    analyze.add_argument("--seed", type=int, default=0, help="Seed of the shuffles")
+    analyze.add_argument("--top", type=int, default=5, help="Number of states whose share of the world total is measured")
+    analyze.add_argument("--threshold", type=float, default=0.25, help="Share of the world total of a resource, e.g. 0.25; how often one state gets more is counted")
+    analyze.add_argument("--output", default=None, help="Also write the whole report, with every strategic region, into this JSON file")
+    return parser
+
+if __name__ == "__main__":
+    parser = buildParser()
+    args = parser.parse_args()
+    if args.command == "preview" and args.name is not None and not args.write:
+        parser.error("--name needs --write: a preview is saved only once it is written")
+
+    logger = setupLogging()
+    checkNumpy(logger)
+    resourceKeys = parseResourceKeys(parser, args, logger)
+    pathAppdataVersions, pathAppdataConfig, pathAppdataStateRegionsOriginal, pathAppdataCache = configureAppData(logger)
+    pathGame = args.path if args.path else readGamePath(pathAppdataConfig)
+
+    if args.command == "list":
+        for name in listVersions(logger):
+            print(name)
+        sys.exit()
+    if args.command == "delete":
+        sys.exit(0 if deleteSavedVersion(args.name, logger) else 1)
+
+    parseCache = loadParseCache(pathAppdataCache, logger)
+    if args.command == "shuffle":
+        database = shuffleGame(pathGame, logger, args.preset, resourceKeys, args.seed, args.name, parseCache, getShuffleOptions(args))
+        if database is None:
+            sys.exit(1)
+        print(f"Shuffled with seed {database['seed']}")
+    elif args.command == "preview":
+        from preview import formatBestStates, formatShuffleDiff
+        database = previewGame(pathGame, logger, args.preset, resourceKeys, args.seed, parseCache, getShuffleOptions(args))
+        if database is None:
+            sys.exit(1)
+        print(f"Shuffle with seed {database['seed']}")
+        for line in formatShuffleDiff(database['diff'], args.states):
+            print(line)
+        print("Best states")
+        for line in formatBestStates(database['ranking'], database['gameIndex']['stateIDToName'], database['resources']):
+            print(line)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({'seed': database['seed'], 'recipe': database['recipe'], 'diff': database['diff']}, f, indent=4)
+        if args.write:
+            if not writePreview(pathGame, database, logger, args.name, parseCache):
+                sys.exit(1)
+            print(f"Wrote the shuffle with seed {database['seed']}")
+    elif args.command == "switch":
+        if not switchVersion(pathGame, args.name, logger, parseCache):
+            sys.exit(1)
+    elif args.command == "generate":
+        names = generateVersions(pathGame, logger, args.count, args.seed, args.preset, resourceKeys, parseCache, args.processes, getShuffleOptions(args))
+        if not names:
+            sys.exit(1)
+    elif args.command == "analyze":
+        from fairness import formatFairnessReport
+        report = analyzeShuffles(pathGame, logger, args.runs, args.seed, args.preset, resourceKeys, parseCache, getShuffleOptions(args), args.top, args.threshold)
+        if report is None:
+            sys.exit(1)
+        for line in formatFairnessReport(report):
+            print(line)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=4)
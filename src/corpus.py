@@ -0,0 +1,67 @@
+import contextlib
+import mmap
+import os
+
+from instrumentation import addCounts
+
+# The game files of one run (a shuffle, a switch of version, a batch), each mapped into memory at most once
+# and shared by every phase which needs it: the parse, the back-up, the rendering of the new files and the fingerprint
+# Each file keeps its read-only memory map (pages are read from the disk only when scanned) and its fingerprint (size, modification time) taken before it was mapped
+
+def newCorpus():
+    """Get an empty corpus; files are mapped into it the first time they are asked for"""
+    return {'files': {}}
+
+@contextlib.contextmanager
+def usingCorpus(corpus=None):
+    """Read files through 'corpus' if given, which its owner closes; otherwise through a new one, closed at the end of the block
+    `with usingCorpus(corpus) as corpus:` in a function which may be called without one"""
+    if corpus is not None:
+        yield corpus
+        return
+    corpus = newCorpus()
+    try:
+        yield corpus
+    finally:
+        closeCorpus(corpus)
+
+def mapFile(filePath):
+    """Map a file into memory, read-only; an empty file, which cannot be mapped, is empty bytes"""
+    with open(filePath, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def getCorpusEntry(corpus, filePath):
+    """Get the entry of a file, mapping it if it is not in the corpus yet"""
+    key = os.path.abspath(filePath)
+    entry = corpus['files'].get(key)
+    if entry is None:
+        stat = os.stat(filePath)
+        entry = {'buffer': mapFile(filePath), 'fingerprint': (stat.st_size, stat.st_mtime_ns)}
+        corpus['files'][key] = entry
+        addCounts(filesRead=1, bytesRead=stat.st_size)
+    return entry
+
+def getCorpusFingerprint(corpus, filePath):
+    """Get the size and modification time of a file, from the corpus if it was mapped, otherwise from the disk"""
+    entry = corpus['files'].get(os.path.abspath(filePath)) if corpus is not None else None
+    if entry is not None:
+        return entry['fingerprint']
+    stat = os.stat(filePath)
+    return stat.st_size, stat.st_mtime_ns
+
+def getCorpusBytes(corpus, filePath):
+    """Get the content of a file, as a bytes-like buffer"""
+    return getCorpusEntry(corpus, filePath)['buffer']
+
+def releaseCorpusFile(corpus, filePath):
+    """Unmap a file, e.g. before it is replaced: Windows does not replace a mapped file"""
+    entry = corpus['files'].pop(os.path.abspath(filePath), None)
+    if entry is not None and isinstance(entry['buffer'], mmap.mmap):
+        entry['buffer'].close()
+
+def closeCorpus(corpus):
+    """Unmap every file of the corpus"""
+    for filePath in list(corpus['files']):
+        releaseCorpusFile(corpus, filePath)
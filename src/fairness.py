@@ -0,0 +1,100 @@
+import numpy as np
+
+from globalProperties import IGNORED_RESOURCES
+from resourceMatrix import AVAILABLE, UNDISCOVERED, buildResourceMatrix, shuffleResourceMatrixRuns
+
+# How uneven the shuffles of a preset are, measured over thousands of them before the preset is picked, e.g. for a league
+# The shuffles run in memory only, in batches along a first axis of runs (see shuffleResourceMatrixRuns): no file is read or written for them
+# A state's amount of a resource is the sum of its capped, discovered and undiscovered amounts, as in the best states table
+
+# Elements of the largest array of a batch (runs × resources × layers × states), so that a batch takes a few tens of MB whatever the size of the game
+BATCH_ELEMENTS = 1 << 22
+PERCENTILES = (5, 50, 95)
+
+def getBatchSizes(runs, elementsPerRun):
+    """Split the runs into batches of at most BATCH_ELEMENTS elements"""
+    batch = max(1, BATCH_ELEMENTS // max(1, elementsPerRun))
+    return [min(batch, runs - done) for done in range(0, runs, batch)]
+
+def summarize(values, original=None):
+    """Mean and percentiles of a statistic over the runs (the first axis), with its value before the shuffle if given"""
+    summary = {'mean': float(np.mean(values))}
+    for percentile, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f"p{percentile}"] = float(value)
+    summary['max'] = float(np.max(values))
+    if original is not None:
+        summary['original'] = float(original)
+    return summary
+
+def getShares(amounts, topCount):
+    """Share of the world total held by the 'topCount' states with the most, and by the single state with the most (the last axis is the states)"""
+    totals = np.maximum(amounts.sum(axis=-1), 1)
+    top = -np.partition(-amounts, topCount - 1, axis=-1)[..., :topCount]
+    return top.sum(axis=-1) / totals, amounts.max(axis=-1) / totals
+
+def analyzeFairness(resources, stateIDToName, runs, seed=None, options=None, topCount=5, threshold=0.25, regions=None):
+    """Shuffle the resources marked as shuffled 'runs' times, with the 'options' of services.shuffleResources, and measure for each of them:
+    - the share of the world total held by the 'topCount' states with the most of it
+    - the share held by the single state with the most, and how often it is above 'threshold'
+    - the state which most often has the most
+    - with 'regions' (strategic region name -> state IDs), the total of every region
+    The same seed gives the same report; the runs are draws of one random stream, not the shuffles of the seeds seed, seed + 1, ...
+    Returns the report"""
+    options = options or {}
+    keys, matrix = buildResourceMatrix(resources)
+    shuffled = np.array([resources[key]['isShuffled'] and key not in IGNORED_RESOURCES for key in keys], dtype=bool)
+    noInitialBuildings = np.array([resources[key]['noInitialBuildings'] for key in keys], dtype=bool)
+    rows = np.flatnonzero(shuffled)
+    stateCount = matrix.shape[1]
+    topCount = max(1, min(topCount, stateCount))
+    regions = regions or {}
+    membership = np.zeros((stateCount, len(regions)), dtype=np.int64)
+    for column, stateIDs in enumerate(regions.values()):
+        membership[stateIDs, column] = 1
+
+    rng = np.random.default_rng(seed)
+    topShares, maxShares, largestStates, regionTotals = [], [], [], []
+    for batch in getBatchSizes(runs, len(rows) * (UNDISCOVERED + 1 - AVAILABLE) * stateCount):
+        _, layers, _ = shuffleResourceMatrixRuns(matrix, shuffled, noInitialBuildings, batch, rng, options.get('preserveTotals', False), options.get('maxPerState'))
+        amounts = layers.sum(axis=2)
+        topShare, maxShare = getShares(amounts, topCount)
+        topShares.append(topShare)
+        maxShares.append(maxShare)
+        largestStates.append(amounts.argmax(axis=-1))
+        regionTotals.append(amounts @ membership)
+    topShares = np.concatenate(topShares)
+    maxShares = np.concatenate(maxShares)
+    largestStates = np.concatenate(largestStates)
+    regionTotals = np.concatenate(regionTotals)
+
+    originalAmounts = matrix[rows, :, AVAILABLE:UNDISCOVERED + 1].sum(axis=-1)
+    originalTopShares, originalMaxShares = getShares(originalAmounts, topCount)
+    originalRegionTotals = originalAmounts @ membership
+    report = {'runs': runs, 'seed': seed, 'options': options, 'topCount': topCount, 'threshold': threshold, 'resources': {}}
+    for column, row in enumerate(rows):
+        counts = np.bincount(largestStates[:, column], minlength=stateCount)
+        report['resources'][keys[row]] = {
+            'topShare': summarize(topShares[:, column], originalTopShares[column]),
+            'maxShare': summarize(maxShares[:, column], originalMaxShares[column]),
+            'aboveThreshold': float(np.mean(maxShares[:, column] > threshold)),
+            'mostOftenLargest': {'state': stateIDToName[int(counts.argmax())], 'frequency': float(counts.max() / runs)},
+            'regions': {regionName: summarize(regionTotals[:, column, regionColumn], originalRegionTotals[column, regionColumn]) for regionColumn, regionName in enumerate(regions)},
+            }
+    return report
+
+def formatFairnessReport(report, regionCount=3):
+    """Get the lines of the summary of a report of analyzeFairness; for each resource, the 'regionCount' strategic regions with the most of it on average"""
+    lines = [f"{report['runs']} shuffles, seed {report['seed']}" + (f", options {report['options']}" if report['options'] else "")]
+    lines.append(f"{'resource':<12}{'top ' + str(report['topCount']) + ' share (original, mean, p5-p95)':<44}{'largest state share (original, mean, p95)':<44}{'> ' + format(report['threshold'], '.0%'):>8}  most often largest")
+    for resKey, result in report['resources'].items():
+        top = result['topShare']
+        largest = result['maxShare']
+        lines.append(f"{resKey:<12}{f'{top['original']:.1%}, {top['mean']:.1%}, {top['p5']:.1%}-{top['p95']:.1%}':<44}"
+                     f"{f'{largest['original']:.1%}, {largest['mean']:.1%}, {largest['p95']:.1%}':<44}{result['aboveThreshold']:>8.1%}"
+                     f"  {result['mostOftenLargest']['state']} ({result['mostOftenLargest']['frequency']:.1%})")
+    if any(result['regions'] for result in report['resources'].values()):
+        lines.append(f"Strategic regions with the most of each resource (expected total, p5-p95; original)")
+        for resKey, result in report['resources'].items():
+            best = sorted(result['regions'].items(), key=lambda item: -item[1]['mean'])[:regionCount]
+            lines.append(f"{resKey:<12}" + "; ".join(f"{name} {summary['mean']:.0f} ({summary['p5']:.0f}-{summary['p95']:.0f}; {summary['original']:.0f})" for name, summary in best))
+    return lines
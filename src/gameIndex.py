@@ -0,0 +1,32 @@
+import os
+
+# The hash indexes of the game database, built once per load and shared by the readers and the writers of the game files,
+# so that the work per line or per state does not depend on the number of states or resources:
+# state name <-> ID, state ID -> the files and offsets of its definitions, building -> resource and building group -> resource
+
+def newGameIndex():
+    """Get an empty index; states are added in the order of their IDs, resources once resources.ini is read"""
+    return {'stateNameToID': {}, 'stateIDToName': {}, 'stateLocations': {}, 'buildingToResource': {}, 'buildingGroupToResource': {}}
+
+def addState(gameIndex, stateName, filePath, start, end):
+    """Add a state defined in a file of state_regions, between the offsets 'start' and 'end'
+    A state defined more than once keeps the ID of its first definition; returns whether it is a new state"""
+    stateID = gameIndex['stateNameToID'].get(stateName)
+    isNew = stateID is None
+    if isNew:
+        stateID = len(gameIndex['stateIDToName'])
+        gameIndex['stateNameToID'][stateName] = stateID
+        gameIndex['stateIDToName'][stateID] = stateName
+        gameIndex['stateLocations'][stateID] = []
+    gameIndex['stateLocations'][stateID].append((os.path.basename(filePath), start, end))
+    return isNew
+
+def indexResources(gameIndex, resources):
+    """Index the resources by their building and their building group"""
+    gameIndex['buildingToResource'] = {resource['building']: key for key, resource in resources.items()}
+    gameIndex['buildingGroupToResource'] = {resource['buildingGroup']: key for key, resource in resources.items()}
+    return gameIndex
+
+def getFilesOfStates(gameIndex, stateIDs):
+    """Get the names of the files of state_regions which define any of the states"""
+    return {filename for stateID in stateIDs for filename, _, _ in gameIndex['stateLocations'].get(stateID, ())}
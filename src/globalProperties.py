@@ -1,7 +1,14 @@
 # constants
 IGNORED_RESOURCES = ['monument', 'fish', 'whale']
 TABLE_GOODS_FIRST_ROW = 3
+PRESETS = ["Vanilla - No shuffle", "Gold", "Yellow & Black Gold", "Discoverables", "Mineable & Oil", "All but wood", "All"]
 TEXT_DEFAULT_BEST_STATES = "Hidden"
+BEST_STATES_COUNT = 5
+PATH_CHECK_DELAY_MS = 500
+PATH_CHECK_POLL_MS = 100
+TASK_POLL_MS = 100
+# Below this many files to parse, starting worker processes costs more than parsing the files one after another
+PARALLEL_PARSE_MIN_FILES = 32
 
 # variables
 logger = None
\ No newline at end of file
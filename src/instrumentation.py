@@ -0,0 +1,151 @@
+import contextlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+# Spans around the phases of a shuffle, with the files and bytes they read and wrote and their peak memory
+# Off by default; turned on by 'instrumentation: enabled' in loggingConfigs/config.yaml, or by the environment variable V3RS_TRACE (1 or 0, which wins over the file)
+# A trace is written as JSON and as a Chrome trace-event file (chrome://tracing, Perfetto), so that it can be attached to a report of a slow shuffle
+# It goes into 'output' if given, else into the traces folder of the app data, next to the versions
+# Peak memory, with 'memory: true', is the one of Python's allocations; tracing them makes the shuffle several times slower, and memory-mapped files are not part of it
+# Spans of several threads at once, like the concurrent load, share one peak, so theirs overlap
+
+ENVIRONMENT_VARIABLE = "V3RS_TRACE"
+settings = {'enabled': False, 'memory': False, 'output': None}
+spans = []
+lock = threading.Lock()
+local = threading.local()
+traceStart = time.perf_counter()
+
+def configureInstrumentation(config=None):
+    """Turn the instrumentation on or off from the 'instrumentation' section of the logging config and the environment"""
+    global traceStart
+    config = config or {}
+    settings['enabled'] = bool(config.get('enabled', False))
+    settings['memory'] = bool(config.get('memory', False))
+    settings['output'] = config.get('output')
+    value = os.environ.get(ENVIRONMENT_VARIABLE)
+    if value is not None:
+        settings['enabled'] = value.strip().lower() not in ("", "0", "false", "no", "off")
+    if settings['enabled'] and settings['memory'] and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    traceStart = time.perf_counter()
+
+def isEnabled() -> bool:
+    """Whether spans are recorded"""
+    return settings['enabled']
+
+def getPeakMemory() -> int:
+    """Peak of Python's allocations since the last reset; 0 when memory is not traced"""
+    return tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+
+def getStack():
+    """Open spans of the current thread, innermost last"""
+    if not hasattr(local, 'stack'):
+        local.stack = []
+    return local.stack
+
+def getCurrentSpan():
+    """Innermost open span of the current thread, to be given as the parent of spans opened in other threads; None when nothing is recorded"""
+    stack = getStack() if settings['enabled'] else None
+    return stack[-1] if stack else None
+
+@contextlib.contextmanager
+def recordSpan(name, parent=None):
+    """Record a span; its counts and peak memory are given to its parent when it ends, so that every span has the ones of its whole duration"""
+    stack = getStack()
+    parent = stack[-1] if stack else parent
+    if parent is not None:
+        with lock:
+            parent['peakMemory'] = max(parent['peakMemory'], getPeakMemory())
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    current = {'name': name, 'thread': threading.get_ident(), 'depth': parent['depth'] + 1 if parent else 0, 'start': time.perf_counter(), 'counts': {}, 'peakMemory': 0}
+    stack.append(current)
+    try:
+        yield current
+    finally:
+        stack.pop()
+        current['duration'] = time.perf_counter() - current['start']
+        current['peakMemory'] = max(current['peakMemory'], getPeakMemory())
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        with lock:
+            if parent is not None:
+                parent['peakMemory'] = max(parent['peakMemory'], current['peakMemory'])
+                for key, value in current['counts'].items():
+                    parent['counts'][key] = parent['counts'].get(key, 0) + value
+            spans.append(current)
+
+def span(name, parent=None):
+    """Time a phase: `with span("parse"):`; spans opened inside it, in the same thread, are nested in it
+    A span opened in another thread is nested in 'parent', see getCurrentSpan
+    When the instrumentation is off, nothing is recorded"""
+    if not settings['enabled']:
+        return contextlib.nullcontext()
+    return recordSpan(name, parent)
+
+def addCounts(**counts):
+    """Add to the counts of the innermost span of the current thread, e.g. addCounts(filesRead=1, bytesRead=size)
+    The counts of a span are added to its parent when it ends"""
+    if not settings['enabled']:
+        return
+    stack = getStack()
+    if stack:
+        for key, value in counts.items():
+            stack[-1]['counts'][key] = stack[-1]['counts'].get(key, 0) + value
+
+def toChromeEvents(recordedSpans):
+    """The spans as complete events of the Chrome trace-event format, in microseconds"""
+    pid = os.getpid()
+    events = []
+    for recorded in recordedSpans:
+        arguments = dict(recorded['counts'])
+        if settings['memory']:
+            arguments['peakMemory'] = recorded['peakMemory']
+        events.append({'name': recorded['name'], 'ph': "X", 'ts': round((recorded['start'] - traceStart) * 1e6, 1), 'dur': round(recorded['duration'] * 1e6, 1), 'pid': pid, 'tid': recorded['thread'], 'args': arguments})
+    return {'traceEvents': events, 'displayTimeUnit': "ms"}
+
+def getTracesFolder():
+    """Default folder of the traces, in the app data"""
+    from AppData import getAppdataFolder
+    return os.path.join(getAppdataFolder(), "traces")
+
+def exportTrace(label, logger):
+    """Write the spans recorded since the last export into the output folder, as JSON and as a Chrome trace
+    Returns the paths of both files, or None if the instrumentation is off or nothing was recorded"""
+    if not settings['enabled']:
+        return None
+    with lock:
+        recordedSpans = sorted(spans, key=lambda recorded: recorded['start'])
+        spans.clear()
+    if not recordedSpans:
+        return None
+    pathOutput = settings['output'] or getTracesFolder()
+    os.makedirs(pathOutput, exist_ok=True)
+    fileName = f"trace_{time.strftime('%Y%m%d_%H%M%S')}_{label}"
+    pathJson = os.path.join(pathOutput, fileName + ".json")
+    pathChrome = os.path.join(pathOutput, fileName + ".chrome.json")
+    summary = [{
+        'name': recorded['name'],
+        'thread': recorded['thread'],
+        'depth': recorded['depth'],
+        'start': round(recorded['start'] - traceStart, 6),
+        'duration': round(recorded['duration'], 6),
+        'counts': recorded['counts'],
+        'peakMemory': recorded['peakMemory'] if settings['memory'] else None,
+        } for recorded in recordedSpans]
+    with open(pathJson, "w") as f:
+        json.dump({'label': label, 'spans': summary}, f, indent=4)
+    with open(pathChrome, "w") as f:
+        json.dump(toChromeEvents(recordedSpans), f)
+    for recorded in summary:
+        details = [f"{recorded['duration'] * 1000:.1f} ms"]
+        if settings['memory']:
+            details.append(f"peak {recorded['peakMemory'] / 1e6:.1f} MB")
+        details.extend(f"{key}={value}" for key, value in recorded['counts'].items())
+        logger.info(f"{'  ' * recorded['depth']}{recorded['name']}: {', '.join(details)}")
+    logger.info(f"Trace written into {pathJson} and {pathChrome}")
+    return pathJson, pathChrome
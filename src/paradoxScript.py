@@ -0,0 +1,122 @@
+import re
+from collections import namedtuple
+
+# One entry of a Paradox script block: `key operator value`
+# 'value' is either a string or a list of entries (a nested block); bare values, like the provinces of a state, have no key nor operator
+# 'start' and 'end' are the offsets of the entry in the parsed text, or in the parsed bytes
+Entry = namedtuple('Entry', ['key', 'operator', 'value', 'start', 'end'])
+
+TOKEN_PATTERN = re.compile(r'''
+      (?P<skip>\s+|\#[^\n]*)
+    | (?P<string>"(?:[^"\\]|\\.)*")
+    | (?P<operator>[<>!?]=|[=<>])
+    | (?P<open>\{)
+    | (?P<close>\})
+    | (?P<word>[^\s{}=<>!?\#"]+|.)
+''', re.VERBOSE)
+# The same tokens in the bytes of a file, e.g. a memory-mapped one: only the keys and values are decoded
+BYTES_TOKEN_PATTERN = re.compile(TOKEN_PATTERN.pattern.encode(), re.VERBOSE)
+# Game files are UTF-8, most of them with a byte order mark
+SCRIPT_ENCODING = "utf-8"
+BYTE_ORDER_MARK = b"\xef\xbb\xbf"
+
+def tokenize(text):
+    """Split a Paradox script into tokens of (kind, value, start, end); whitespace and comments are dropped
+    Strings are returned without their quotes
+    'text' is either a str or bytes-like, e.g. a memory-mapped file: then the offsets are in bytes, and only the words are decoded"""
+    isText = isinstance(text, str)
+    if isText:
+        pattern, start = TOKEN_PATTERN, 1 if text.startswith("\ufeff") else 0
+    else:
+        pattern, start = BYTES_TOKEN_PATTERN, len(BYTE_ORDER_MARK) if text[:len(BYTE_ORDER_MARK)] == BYTE_ORDER_MARK else 0
+    tokens = []
+    for match in pattern.finditer(text, start):
+        kind = match.lastgroup
+        if kind == 'skip':
+            continue
+        if kind == 'string':
+            value = match.group()[1:-1]
+            kind = 'word'
+        else:
+            value = match.group()
+        if not isText:
+            value = value.decode(SCRIPT_ENCODING, "replace")
+        tokens.append((kind, value, match.start(), match.end()))
+    return tokens
+
+def parseScript(text):
+    """Parse a Paradox script (the `key = { ... }` format) in a single pass, from a str or from bytes
+    Returns the list of top-level entries; a stray '}' is ignored and unclosed blocks are closed at the end of the text, like the game does"""
+    tokens = tokenize(text)
+    root = []
+    current = root
+    stack = []
+    count = len(tokens)
+    i = 0
+    while i < count:
+        kind, value, start, end = tokens[i]
+        if kind == 'close':
+            if stack:
+                parent, key, operator, entryStart = stack.pop()
+                parent.append(Entry(key, operator, current, entryStart, end))
+                current = parent
+            i += 1
+        elif kind == 'open':
+            stack.append((current, None, None, start))
+            current = []
+            i += 1
+        elif kind == 'operator':
+            i += 1
+        elif i + 2 < count and tokens[i + 1][0] == 'operator':
+            operator = tokens[i + 1][1]
+            nextKind, nextValue, _, nextEnd = tokens[i + 2]
+            if nextKind == 'open':
+                stack.append((current, value, operator, start))
+                current = []
+            elif nextKind == 'word':
+                current.append(Entry(value, operator, nextValue, start, nextEnd))
+            else:
+                current.append(Entry(value, operator, None, start, tokens[i + 1][3]))
+                i -= 1
+            i += 3
+        else:
+            current.append(Entry(None, None, value, start, end))
+            i += 1
+    while stack:
+        parent, key, operator, entryStart = stack.pop()
+        parent.append(Entry(key, operator, current, entryStart, len(text)))
+        current = parent
+    return root
+
+def isBlock(entry):
+    """Whether the value of the entry is a nested block"""
+    return isinstance(entry.value, list)
+
+def findFirst(block, key, default=None):
+    """Get the value of the first entry with the given key"""
+    for entry in block:
+        if entry.key == key:
+            return entry.value
+    return default
+
+def walkEntries(block):
+    """Iterate depth-first over every entry of the block and of its nested blocks"""
+    stack = [iter(block)]
+    while stack:
+        entry = next(stack[-1], None)
+        if entry is None:
+            stack.pop()
+            continue
+        yield entry
+        if isinstance(entry.value, list):
+            stack.append(iter(entry.value))
+
+def toInt(value, default=0):
+    """Convert a script value to int, e.g. '20' or '20.0'"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return default
@@ -0,0 +1,146 @@
+import hashlib
+import marshal
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from corpus import getCorpusBytes, getCorpusEntry, getCorpusFingerprint, mapFile, usingCorpus
+from globalProperties import PARALLEL_PARSE_MIN_FILES
+from instrumentation import addCounts, isEnabled
+from progress import checkCancelled, reportProgress
+
+CACHE_FORMAT = 3
+
+def hashResourcesConfig(fileName="resources.ini"):
+    """Hash of 'resources.ini', so that the cache is dropped whenever the configured resources change"""
+    if not os.path.exists(fileName):
+        return None
+    with open(fileName, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def getCacheHeader():
+    """Everything, other than the game files, which makes a cache unusable when it changes"""
+    return (CACHE_FORMAT, marshal.version, tuple(sys.version_info[:2]), hashResourcesConfig())
+
+def newParseCache(pathCache=None):
+    """Get an empty cache; without a path, it is only kept in memory"""
+    return {'path': pathCache, 'files': {}, 'dirty': False}
+
+def loadParseCache(pathCache, logger):
+    """Load from %appdata% the parsed game files of the previous runs
+    Returns the cache: the path it is saved to, the cached files (path -> (size, mtime, parsed content)) and whether it changed since loaded"""
+    parseCache = newParseCache(pathCache)
+    if not os.path.exists(pathCache):
+        logger.info("No cache of the game files, they will be parsed")
+        return parseCache
+    try:
+        with open(pathCache, "rb") as f:
+            header, files = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError) as e:
+        logger.warning(f"Cache of the game files at {pathCache} is unreadable, it will be rebuilt: {e}")
+        parseCache['dirty'] = True
+        return parseCache
+    if header != getCacheHeader():
+        logger.info("Cache of the game files is outdated (resources.ini or app version changed), it will be rebuilt")
+        parseCache['dirty'] = True
+        return parseCache
+    parseCache['files'] = files
+    logger.info(f"Loaded the cache of {len(files)} parsed game files")
+    return parseCache
+
+def saveParseCache(parseCache, logger):
+    """Write the cache to %appdata%, if anything was parsed since it was loaded"""
+    if parseCache is None or not parseCache['dirty'] or parseCache['path'] is None:
+        return
+    for filePath in [filePath for filePath in parseCache['files'] if not os.path.exists(filePath)]:
+        del parseCache['files'][filePath]
+    pathCache = parseCache['path']
+    pathTemp = pathCache + ".tmp"
+    try:
+        with open(pathTemp, "wb") as f:
+            marshal.dump((getCacheHeader(), parseCache['files']), f)
+        os.replace(pathTemp, pathCache)
+    except OSError as e:
+        logger.warning(f"Could not save the cache of the game files to {pathCache}: {e}")
+        return
+    parseCache['dirty'] = False
+    logger.info(f"Saved the cache of {len(parseCache['files'])} parsed game files")
+
+def getCachedParse(parseCache, filePath, corpus=None):
+    """Get the cached parse of a file with its current fingerprint; the parse is None if it must be parsed again"""
+    size, mtime = getCorpusFingerprint(corpus, filePath)
+    cached = parseCache['files'].get(os.path.abspath(filePath))
+    if cached is not None and cached[0] == size and cached[1] == mtime:
+        return cached[2], (size, mtime)
+    return None, (size, mtime)
+
+def storeParse(parseCache, filePath, fingerprint, parsed):
+    """Keep the parse of a file with the fingerprint it had before it was read"""
+    parseCache['files'][os.path.abspath(filePath)] = (fingerprint[0], fingerprint[1], parsed)
+    parseCache['dirty'] = True
+
+def parseMappedFile(parseFunction, filePath):
+    """Runs in a worker process: map a file and parse it"""
+    buffer = mapFile(filePath)
+    try:
+        return parseFunction(buffer)
+    finally:
+        if not isinstance(buffer, bytes):
+            buffer.close()
+
+def parseCached(parseCache, filePath, parseFunction, corpus=None):
+    """Get the parsed content of a game file, parsing it only if it is not in the cache or it changed on disk
+    The file is mapped through the corpus, if given, so that other phases reuse it"""
+    with usingCorpus(corpus) as corpus:
+        if parseCache is None:
+            return parseFunction(getCorpusBytes(corpus, filePath))
+        parsed, fingerprint = getCachedParse(parseCache, filePath, corpus)
+        if parsed is None:
+            fingerprint = getCorpusEntry(corpus, filePath)['fingerprint']
+            parsed = parseFunction(getCorpusBytes(corpus, filePath))
+            storeParse(parseCache, filePath, fingerprint, parsed)
+        return parsed
+
+def reportParseProgress(filePaths, done):
+    """Report the progress of the parse of files of one folder, then stop if the task was cancelled"""
+    reportProgress(f"Parsing {os.path.basename(os.path.dirname(filePaths[0]))}", done, len(filePaths))
+    checkCancelled()
+
+def parseCachedFiles(parseCache, filePaths, parseFunction, corpus=None, processes=None):
+    """Get the parsed content of many game files, in the order of 'filePaths'
+    The files which are not cached are parsed independently of each other: in worker processes, which map the files themselves, when there are several cores and enough files to pay for starting the processes
+    'parseFunction' takes the bytes of a file and must be a module-level function, so that the workers can run it"""
+    with usingCorpus(corpus) as corpus:
+        parsedFiles = {}
+        fingerprints = {}
+        missing = []
+        for filePath in filePaths:
+            parsed = None
+            if parseCache is not None:
+                parsed, fingerprints[filePath] = getCachedParse(parseCache, filePath, corpus)
+            if parsed is None:
+                missing.append(filePath)
+            else:
+                parsedFiles[filePath] = parsed
+        processes = processes or os.cpu_count() or 1
+        if len(missing) >= PARALLEL_PARSE_MIN_FILES and processes > 1:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                results = []
+                for parsed in executor.map(parseMappedFile, repeat(parseFunction), missing, chunksize=max(1, len(missing) // (4 * processes))):
+                    results.append(parsed)
+                    reportParseProgress(missing, len(results))
+            if isEnabled():
+                addCounts(filesRead=len(missing), bytesRead=sum(os.path.getsize(filePath) for filePath in missing))
+        else:
+            results = []
+            for filePath in missing:
+                results.append(parseFunction(getCorpusBytes(corpus, filePath)))
+                fingerprints[filePath] = getCorpusEntry(corpus, filePath)['fingerprint']
+                reportParseProgress(missing, len(results))
+        addCounts(filesParsed=len(missing), filesFromCache=len(filePaths) - len(missing))
+        for filePath, parsed in zip(missing, results):
+            parsedFiles[filePath] = parsed
+            if parseCache is not None:
+                storeParse(parseCache, filePath, fingerprints[filePath], parsed)
+        return [parsedFiles[filePath] for filePath in filePaths]
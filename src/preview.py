@@ -0,0 +1,51 @@
+from globalProperties import BEST_STATES_COUNT, IGNORED_RESOURCES
+
+# What a shuffle changes, before it is written: the states whose resources differ from the source files, per resource, and the best states after it
+# A preview is made in memory only (see services.previewShuffle); the user decides from it whether the shuffle is written into the game
+
+# Names of the layers compared, in the order of the lists of a state in the diff
+DIFF_LAYERS = ('capped', 'discovered', 'undiscovered')
+
+def getShuffleDiff(resourcesBefore, resources, changedStates, stateIDToName):
+    """Compare the shuffled resources with their lists from before the shuffle, see services.shuffleAndCompare
+    Returns, for every resource which changed, its world totals before and after, and its changed states in the order of their IDs, with their amounts before and after (see DIFF_LAYERS)"""
+    diff = {}
+    for resKey, resource in resources.items():
+        before = resourcesBefore[resKey]
+        after = (resource['available'], resource['discoveredInState'], resource['undiscoveredInState'])
+        states = []
+        for state in sorted(changedStates):
+            amountsBefore = [layer[state] for layer in before]
+            amountsAfter = [layer[state] for layer in after]
+            if amountsBefore != amountsAfter:
+                states.append({'state': stateIDToName[state], 'before': amountsBefore, 'after': amountsAfter})
+        if states:
+            diff[resKey] = {'totalBefore': [sum(layer) for layer in before], 'totalAfter': [sum(layer) for layer in after], 'states': states}
+    return diff
+
+def formatAmounts(before, after):
+    """Get the changed amounts of the layers, e.g. "capped 5 -> 0, undiscovered 0 -> 3" """
+    return ", ".join(f"{name} {old} -> {new}" for name, old, new in zip(DIFF_LAYERS, before, after) if old != new) or "unchanged"
+
+def formatShuffleDiff(diff, stateCount=10):
+    """Get the lines of a diff of getShuffleDiff; for each resource, the 'stateCount' states which changed the most"""
+    lines = []
+    for resKey, change in diff.items():
+        lines.append(f"{resKey}: {len(change['states'])} states changed; world {formatAmounts(change['totalBefore'], change['totalAfter'])}")
+        largest = sorted(change['states'], key=lambda state: -sum(abs(new - old) for old, new in zip(state['before'], state['after'])))[:stateCount]
+        for state in largest:
+            lines.append(f"    {state['state']:<32}{formatAmounts(state['before'], state['after'])}")
+        if len(change['states']) > len(largest):
+            lines.append(f"    ... and {len(change['states']) - len(largest)} more")
+    return lines or ["Nothing changed"]
+
+def formatBestStates(ranking, stateIDToName, resources, count=BEST_STATES_COUNT):
+    """Get the lines of the table of the 'count' states with the most of each shuffled resource, with their amounts, as shown by the "best states" switch"""
+    from rankingIndex import getTopStates
+    lines = []
+    for resKey, resource in resources.items():
+        if resKey in IGNORED_RESOURCES or not resource['isShuffled']:
+            continue
+        states, amounts = getTopStates(ranking, resKey, count)
+        lines.append(f"{resKey:<12}" + ", ".join(f"{stateIDToName[state]} {amount}" for state, amount in zip(states, amounts)))
+    return lines
@@ -0,0 +1,49 @@
+import threading
+
+# The progress of the one long operation running at a time from the GUI (a shuffle, a switch of version), and its cancellation
+# The operation runs on a worker thread; the services report their progress and check for cancellation here, without knowing about the GUI
+# Without a running task (the command line, the batch workers), reporting and checking do nothing
+# Once a task starts writing the game's files it is committed: it cannot be cancelled anymore, so that the files are never half-written
+# Whatever writes the game's state_regions, their staged copy or their back-up, a task or the back-up of a path check, holds gameFilesLock meanwhile
+
+class TaskCancelled(Exception):
+    """Raised in the worker thread at the first check after the user asked to cancel"""
+
+currentTask = None
+gameFilesLock = threading.Lock()
+
+def startTask():
+    """Make a new task the current one; returns it, to be polled and cancelled from the main thread"""
+    global currentTask
+    currentTask = {'cancelRequested': threading.Event(), 'isCommitted': False, 'phase': None, 'done': 0, 'total': 0}
+    return currentTask
+
+def finishTask(task):
+    """The task is over: nothing reports to it anymore"""
+    global currentTask
+    if currentTask is task:
+        currentTask = None
+
+def reportProgress(phase, done, total):
+    """Report that 'done' of the 'total' steps (e.g. files) of a phase are done"""
+    task = currentTask
+    if task is not None:
+        task['phase'], task['done'], task['total'] = phase, done, total
+
+def checkCancelled():
+    """Stop the current task, by raising TaskCancelled, if the user asked to cancel it and it did not start writing yet"""
+    task = currentTask
+    if task is not None and not task['isCommitted'] and task['cancelRequested'].is_set():
+        raise TaskCancelled()
+
+def commitTask():
+    """Mark the point after which the current task writes the game's files: a last check, then it can no longer be cancelled"""
+    checkCancelled()
+    task = currentTask
+    if task is not None:
+        task['isCommitted'] = True
+
+def requestCancel(task) -> bool:
+    """Ask a task to stop at its next check; returns False if it is already writing, so that it will run to its end"""
+    task['cancelRequested'].set()
+    return not task['isCommitted']
@@ -0,0 +1,27 @@
+import numpy as np
+
+from resourceMatrix import AVAILABLE, DISCOVERED, UNDISCOVERED, buildResourceMatrix
+
+# Layers the states can be ranked by; 'total' is the sum of the other three, as shown by the "best states" switch
+RANKING_LAYERS = {'capped': AVAILABLE, 'discovered': DISCOVERED, 'undiscovered': UNDISCOVERED}
+
+def buildRankingIndex(resources):
+    """Build the index ranking the states by their quantity of each resource, once per parse or shuffle
+    Returns the index: the row of each resource and, for each layer, the quantities as a matrix of resources × states"""
+    keys, matrix = buildResourceMatrix(resources)
+    values = {layer: matrix[:, :, column] for layer, column in RANKING_LAYERS.items()}
+    values['total'] = values['capped'] + values['discovered'] + values['undiscovered']
+    return {'rows': {key: row for row, key in enumerate(keys)}, 'values': values}
+
+def getTopStates(index, resKey, k, layer='total'):
+    """Get the 'k' states with the most of a resource in a layer, best first, with their quantities
+    The states are selected with a partition, in linear time, then only those 'k' are sorted; ties go to the lower state ID"""
+    values = index['values'][layer][index['rows'][resKey]]
+    k = min(k, len(values))
+    if k <= 0:
+        return [], []
+    # Unique keys, so that the partition breaks ties the same way as the sort: more resources first, then lower state ID
+    keys = values * len(values) + (len(values) - 1 - np.arange(len(values)))
+    top = np.argpartition(-keys, k - 1)[:k]
+    top = top[np.argsort(-keys[top])]
+    return top.tolist(), values[top].tolist()
@@ -1,77 +1,157 @@
 import os
-import re
 import sys
-from StateResourceExpected import StateResourceExpected
+from paradoxScript import findFirst, isBlock, parseScript, toInt, walkEntries
 from globalProperties import logger
+from parseCache import parseCached, parseCachedFiles
 
-def getInfoFromStateRegions(pathGameStateRegions, stateInfo, resources, logger):
+def parseStateRegionsBuffer(buffer):
+    """Parse the bytes of one file from game/map_data/state_regions in a single pass, e.g. a memory-mapped file
+    Returns the list of states in file order, each with its capped resources, discoverable resources, naval exit and the offsets of its block in the bytes"""
+    states = []
+    for entry in parseScript(buffer):
+        if entry.key is None or not entry.key.startswith("STATE_") or not isBlock(entry):
+            continue
+        cappedResources = {}
+        discoverableResources = []
+        navalExitID = 0
+        for field in entry.value:
+            if field.key == 'capped_resources' and isBlock(field):
+                for resourceEntry in field.value:
+                    if resourceEntry.key is not None:
+                        cappedResources[resourceEntry.key] = cappedResources.get(resourceEntry.key, 0) + toInt(resourceEntry.value)
+            elif field.key == 'resource' and isBlock(field):
+                discoverableResources.append((findFirst(field.value, 'type'), toInt(findFirst(field.value, 'discovered_amount')), toInt(findFirst(field.value, 'undiscovered_amount'))))
+            elif field.key == 'naval_exit_id':
+                navalExitID = toInt(field.value)
+        states.append({'name': entry.key, 'cappedResources': cappedResources, 'discoverableResources': discoverableResources, 'navalExitID': navalExitID, 'start': entry.start, 'end': entry.end})
+    return states
+
+def listStateRegionsFiles(pathGameStateRegions):
+    """Get the files of game/map_data/state_regions which hold states, sorted by name; the seas (99_seas.txt) hold no resources"""
+    filePaths = []
+    for filename in sorted(os.listdir(pathGameStateRegions)):
+        filePath = os.path.join(pathGameStateRegions, filename)
+        if filename[0:2] != "99" and os.path.isfile(filePath):
+            filePaths.append(filePath)
+    return filePaths
+
+def listHistoryBuildingsFiles(pathGameHistoryBuildings):
+    """Get the files of game/common/history/buildings, sorted by name"""
+    filePaths = [os.path.join(pathGameHistoryBuildings, filename) for filename in sorted(os.listdir(pathGameHistoryBuildings))]
+    return [filePath for filePath in filePaths if os.path.isfile(filePath)]
+
+def listCompaniesFiles(pathGameCompanies):
+    """Get the files of game/common/company_types which are read, sorted by name: the ones of the game start with 00"""
+    filePaths = [os.path.join(pathGameCompanies, filename) for filename in sorted(os.listdir(pathGameCompanies)) if filename[0:2] == "00"]
+    return [filePath for filePath in filePaths if os.path.isfile(filePath)]
+
+def listStrategicRegionsFiles(pathGameStrategicRegions):
+    """Get the files of game/common/strategic_regions, sorted by name; none if the folder does not exist"""
+    if not os.path.isdir(pathGameStrategicRegions):
+        return []
+    filePaths = [os.path.join(pathGameStrategicRegions, filename) for filename in sorted(os.listdir(pathGameStrategicRegions))]
+    return [filePath for filePath in filePaths if os.path.isfile(filePath)]
+
+def parseStrategicRegionsBuffer(buffer):
+    """Parse the bytes of one file from game/common/strategic_regions
+    Returns the strategic regions as (name, names of their states)"""
+    regions = []
+    for entry in parseScript(buffer):
+        if entry.key is None or not isBlock(entry):
+            continue
+        states = findFirst(entry.value, 'states')
+        if isinstance(states, list):
+            regions.append((entry.key, [state.value for state in states if state.key is None and isinstance(state.value, str)]))
+    return regions
+
+def parseHistoryBuildingsBuffer(buffer):
+    """Parse the bytes of one file from game/common/history/buildings
+    Returns the list of initial buildings as (state name, building, levels); levels is None if the file does not state them"""
+    buildings = []
+    stack = [(iter(parseScript(buffer)), None)]
+    while stack:
+        entry = next(stack[-1][0], None)
+        if entry is None:
+            stack.pop()
+            continue
+        stateName = stack[-1][1]
+        if not isBlock(entry):
+            continue
+        if entry.key is not None and "STATE_" in entry.key:
+            stateName = entry.key[entry.key.index("STATE_"):]
+        if entry.key == 'create_building':
+            building = findFirst(entry.value, 'building')
+            levels = findFirst(entry.value, 'level')
+            if levels is None:
+                ownerships = [ownership for ownership in walkEntries(entry.value) if ownership.key == 'levels']
+                if ownerships:
+                    levels = sum(toInt(ownership.value) for ownership in ownerships)
+            else:
+                levels = toInt(levels)
+            buildings.append((stateName, building, levels))
+            continue
+        stack.append((iter(entry.value), stateName))
+    return buildings
+
+def parseCompaniesBuffer(buffer):
+    """Parse the bytes of one file from game/common/company_types
+    Returns, for every 'possible' block, the candidate state names, the required buildings and the required levels"""
+    requirements = []
+    for entry in walkEntries(parseScript(buffer)):
+        if entry.key != 'possible' or not isBlock(entry):
+            continue
+        stateNames = []
+        buildings = []
+        levels = None
+        for condition in walkEntries(entry.value):
+            # A condition without a value, e.g. `state_region = }` in a malformed file, is None
+            if condition.key == 'state_region' and isinstance(condition.value, str):
+                stateNames.append(condition.value[2:] if condition.value.startswith("s:") else condition.value)
+            elif condition.key == 'is_building_type' and isinstance(condition.value, str):
+                buildings.append(condition.value)
+            elif levels is None and condition.key is not None and ('level' in condition.key or 'count' in condition.key) and not isBlock(condition):
+                levels = toInt(condition.value, None)
+        requirements.append((stateNames, buildings, levels))
+    return requirements
+
+def getInfoFromStateRegions(pathGameStateRegions, stateInfo, gameIndex, resources, logger, parseCache=None, corpus=None):
     """Get from the game files the resources for each state
-    This is the most important information from the game, from game/map_data/state_regions"""
+    This is the most important information from the game, from game/map_data/state_regions
+    States are found by name, and resources by building group, in the game index, so that every file is parsed on its own"""
     logger.info(f"Reading files from {pathGameStateRegions}")
     resourcesFoundStatic = 0
     resourcesFoundDiscovered = 0
     resourcesFoundUndiscovered = 0
-    lineCount = 0
-    stateCurrent = -1
-    for filename in os.listdir(pathGameStateRegions):
-        if filename[0:2] == "99":
-            continue
-        filePath = os.path.join(pathGameStateRegions, filename)
-        if os.path.isfile(filePath):
-            with open(filePath, "r") as f:
-                lines = f.readlines()
-                lineCount += len(lines)
-                state = StateResourceExpected.NONE
-                for lineID in range(len(lines)):
-                    line = lines[lineID]
-                    found = re.search("(STATE_.*) =.*", line)
-                    if found:
-                        stateCurrent += 1
-                        state = StateResourceExpected.NONE
-                        continue
-                    elif re.search("capped_resources", line):
-                        state = StateResourceExpected.STATIC
-                        continue
-                    elif re.search("resource =", line):
-                        state = StateResourceExpected.DYNAMIC
-                        continue
-                    
-                    found = re.search(r"naval_exit_id\s*=\s*(\d+)", line)
-                    if found:
-                        stateInfo[stateCurrent]["naval_exit_id"] = int(found.groups()[0])
-                    if state == StateResourceExpected.STATIC:                        
-                        for key, resource in resources.items():
-                            findResource = re.search(resource['buildingGroup'] + r" = (\d+)", line)
-                            if findResource:
-                                value = int(findResource.groups()[0])
-                                resource['available'][stateCurrent] = value
-                                resource['total'] += value
-                                stateInfo[stateCurrent]['resourcesStaticTotal'] += value
-                                resourcesFoundStatic += value
-                    elif state == StateResourceExpected.DYNAMIC:
-                        for key, resource in resources.items():
-                            if not resource['isDynamic']:
-                                continue
-                            findResource = re.search(r'type\s*=\s*"' + resource['buildingGroup'], line)
-                            if findResource:
-                                while(not re.search('    }', line)):
-                                    lineID += 1
-                                    line = lines[lineID]
-                                    findResource = re.search(r'        discovered_amount = (\d+)', line)
-                                    if findResource:
-                                        value = int(findResource.groups()[0])
-                                        resource['discoveredInState'][stateCurrent] = value
-                                        resources[key]['totalDiscovered'] += value
-                                        resourcesFoundDiscovered += value
-                                        lineID += 1
-                                        line = lines[lineID]
-                                    findResource = re.search(r'        undiscovered_amount = (\d+)', line)
-                                    if findResource:
-                                        value = int(findResource.groups()[0])
-                                        resource['undiscoveredInState'][stateCurrent] = value
-                                        resources[key]['totalUndiscovered'] += value
-                                        resourcesFoundUndiscovered += value
-                        
+    stateNameToID = gameIndex['stateNameToID']
+    buildingGroupToResource = gameIndex['buildingGroupToResource']
+    for states in parseCachedFiles(parseCache, listStateRegionsFiles(pathGameStateRegions), parseStateRegionsBuffer, corpus):
+        for state in states:
+            stateID = stateNameToID.get(state['name'])
+            if stateID is None:
+                continue
+            if state['navalExitID']:
+                stateInfo[stateID]["naval_exit_id"] = state['navalExitID']
+            for buildingGroup, value in state['cappedResources'].items():
+                key = buildingGroupToResource.get(buildingGroup)
+                if key is None:
+                    continue
+                resource = resources[key]
+                resource['available'][stateID] = value
+                resource['total'] += value
+                stateInfo[stateID]['resourcesStaticTotal'] += value
+                resourcesFoundStatic += value
+            for buildingGroup, discovered, undiscovered in state['discoverableResources']:
+                key = buildingGroupToResource.get(buildingGroup)
+                if key is None or not resources[key]['isDynamic']:
+                    continue
+                resource = resources[key]
+                resource['discoveredInState'][stateID] += discovered
+                resource['totalDiscovered'] += discovered
+                resourcesFoundDiscovered += discovered
+                resource['undiscoveredInState'][stateID] += undiscovered
+                resource['totalUndiscovered'] += undiscovered
+                resourcesFoundUndiscovered += undiscovered
+
     if resourcesFoundStatic == 0:
         logger.error("No static resources found in state_regions")
         sys.exit()
@@ -96,105 +176,84 @@ def getInfoFromStateRegions(pathGameStateRegions, stateInfo, resources, logger):
             for key, resource in resources.items():
                 logger.info(f"Undiscovered: {resource['totalUndiscovered']} {key} in state_regions")
     
-    logger.info(f"Total lines in original state_regions: {lineCount}")
+    logger.info(f"Total states in original state_regions: {len(stateInfo)}")
     return resources, stateInfo
 
-def getGuaranteedResourcesFromHistory(pathGameHistoryBuildings, resources, logger):
+
+def getGuaranteedResourcesFromHistory(pathGameHistoryBuildings, gameIndex, resources, logger, parseCache=None, corpus=None):
     """Get the number of resources required for each state so that the initial buildings (in 1836) can run
     The files are got from game/common/history/buildings
     """
     logger.info(f"Reading files from {pathGameHistoryBuildings}")
-    stateCurrent = -1
-    for filename in os.listdir(pathGameHistoryBuildings):
-        filePath = os.path.join(pathGameHistoryBuildings, filename)
-        if os.path.isfile(filePath):
-            with open(filePath, "r") as f:
-                lines = f.readlines()
-                for lineID in range(len(lines)):
-                    line = lines[lineID]
-                    found = re.search(r"(STATE_[A-Z_]+)\s*=\s*", line)
-                    if found:
-                        stateCurrent += 1
-                    found = re.search(r'building="([a-z_]+)"', line)
-                    if found:
-                        building = found.groups()[0]
-                        for key, resource in resources.items():
-                            if resource['building'] == building:
-                                lineID += 1
-                                line = lines[lineID]
-                                found = re.search(r'level=(\d+)', line)
-                                if found:
-                                    levels = int(found.groups()[0])
-                                    resource['constrainedHistory'][stateCurrent] = levels
-                                    resource['constrainedHistoryTotal'] += levels
-                                    logger.debug(f'In state #{str(stateCurrent)} it is required {str(levels)} {key} in 1836')
-                                    break
-                                else:
-                                    logger.error(f'Expected resource for state #{stateCurrent} for building {resource['building']}')
-                                    sys.exit()
+    stateNameToID = gameIndex['stateNameToID']
+    buildingToResource = gameIndex['buildingToResource']
+    for filePath in listHistoryBuildingsFiles(pathGameHistoryBuildings):
+        filename = os.path.basename(filePath)
+        for stateName, building, levels in parseCached(parseCache, filePath, parseHistoryBuildingsBuffer, corpus):
+            key = buildingToResource.get(building)
+            if key is None:
+                continue
+            if levels is None:
+                logger.error(f'Expected resource for state {stateName} for building {building}')
+                sys.exit()
+            if stateName not in stateNameToID:
+                logger.warning(f'Unknown state {stateName} for building {building} in {filename}')
+                continue
+            stateID = stateNameToID[stateName]
+            resource = resources[key]
+            # Every building of a state needs its resources: the levels of its buildings of the same type, e.g. of several owners, add up
+            resource['constrainedHistory'][stateID] += levels
+            resource['constrainedHistoryTotal'] += levels
+            logger.debug(f'In state {stateName} it is required {str(levels)} {key} in 1836')
 
     for key, resource in resources.items():
         logger.info(f"Initial buildings related to {key}: {resource['constrainedHistoryTotal']}")
     return resources
 
-def getGuaranteedResourcesFromCompanies(stateNameToID, stateIDToName, resources, pathGameCompanies, logger):
+def getGuaranteedResourcesFromCompanies(gameIndex, resources, pathGameCompanies, logger, parseCache=None, corpus=None):
     """Get the required number of resources for each state so that the player is able to found companies
     The files are in game/common/company_types
     """
     logger.info(f"Reading files from {pathGameCompanies}")
-    for filename in os.listdir(pathGameCompanies):
-        filePath = os.path.join(pathGameCompanies, filename)
-        if filename[0:2] != "00":
-            continue
-        if os.path.isfile(filePath):
-            with open(filePath, "r", encoding="utf8") as f:
-                lines = f.readlines()
-                for lineID in range(len(lines)):
-                    line = lines[lineID]
-                    if re.search(r"possible\s*=\s*{", line):
-                        listCandidateStates = []
-                        listResourcesReq = []
-                        #logger.debug(r"Reset - new company")
-                        levelFound = False
-                        while(not levelFound):
-                            lineID += 1
-                            line = lines[lineID]
-                            found = re.search(r'state_region = s:([A-Z_]+)', line)
-                            if found:
-                                stateID = int(stateNameToID[found.groups()[0]])
-                                listCandidateStates.append(stateID)
-                                #logger.debug(f'{stateIDToName[stateID]} added to list of candidates')
-                                continue
-                            
-                            found = re.search(r'is_building_type = ([a-z_]+)', line)
-                            if found:
-                                building = found.groups()[0]
-                                for key, resource in resources.items():
-                                    if building == resource['building']:
-                                        listResourcesReq.append(key)
-                                        logger.debug(f'#{key} added to list of resources')
-                                        break
-                            found = re.search(r'level.*=\s*(\d+)', line)
-                            if not found:\
-                                found = re.search(r'count.*=\s*(\d+)', line)
-                            if found:
-                                levels = int(found.groups()[0])
-                                if len(listResourcesReq) * listCandidateStates == 0:
-                                    if len(listResourcesReq) == 0:
-                                        logger.error('NO resources required for company')
-                                        sys.exit()
-                                    if len(listCandidateStates) == 0:
-                                        logger.error('NO candidate states required for company')
-                                        sys.exit()
-                                for resKey in listResourcesReq:
-                                    for stateID in listCandidateStates:
-                                        logger.debug(f'{levels} {resKey} required in state {stateIDToName[stateID]}')
-                                        resources[resKey]['constrainedCompany'][stateID] = levels
-                                        resources[resKey]['constrainedCompanyTotal'] += levels
-                                levelFound = True
+    stateNameToID = gameIndex['stateNameToID']
+    stateIDToName = gameIndex['stateIDToName']
+    buildingToResource = gameIndex['buildingToResource']
+    for filePath in listCompaniesFiles(pathGameCompanies):
+        filename = os.path.basename(filePath)
+        for stateNames, buildings, levels in parseCached(parseCache, filePath, parseCompaniesBuffer, corpus):
+            listResourcesReq = [buildingToResource[building] for building in buildings if building in buildingToResource]
+            listCandidateStates = []
+            for stateName in stateNames:
+                if stateName in stateNameToID:
+                    listCandidateStates.append(stateNameToID[stateName])
+                else:
+                    logger.warning(f'Unknown state {stateName} required by a company in {filename}')
+            if len(listResourcesReq) == 0 or len(listCandidateStates) == 0:
+                continue
+            if levels is None:
+                logger.warning(f'A company requiring {', '.join(listResourcesReq)} in {filename} states no level of its buildings: nothing is guaranteed for it')
+                continue
+            for resKey in listResourcesReq:
+                for stateID in listCandidateStates:
+                    logger.debug(f'{levels} {resKey} required in state {stateIDToName[stateID]}')
+                    resources[resKey]['constrainedCompany'][stateID] = levels
+                    resources[resKey]['constrainedCompanyTotal'] += levels
 
     for key, resource in resources.items():
         if key == "monument":
             continue
         logger.info(f"{resource['constrainedCompanyTotal']} {key} required for companies")
-    return resources
\ No newline at end of file
+    return resources
+
+def getStrategicRegions(pathGameStrategicRegions, gameIndex, logger, parseCache=None, corpus=None):
+    """Get the states of every strategic region, from game/common/strategic_regions, as region name -> state IDs
+    The seas, and the states unknown to state_regions, are left out; a game without the folder has no regions"""
+    regions = {}
+    stateNameToID = gameIndex['stateNameToID']
+    for filePath in listStrategicRegionsFiles(pathGameStrategicRegions):
+        for regionName, stateNames in parseCached(parseCache, filePath, parseStrategicRegionsBuffer, corpus):
+            stateIDs = [stateNameToID[stateName] for stateName in stateNames if stateName in stateNameToID]
+            if stateIDs:
+                regions[regionName] = stateIDs
+    logger.info(f"Found {len(regions)} strategic regions with states")
+    return regions
@@ -0,0 +1,115 @@
+import numpy as np
+
+# Layers of the matrix, named as the per-state lists of a resource in 'resources'
+LAYERS = ['available', 'discoveredInState', 'undiscoveredInState', 'constrainedHistory', 'constrainedCompany']
+AVAILABLE = 0
+DISCOVERED = 1
+UNDISCOVERED = 2
+CONSTRAINED_HISTORY = 3
+CONSTRAINED_COMPANY = 4
+SHUFFLED_LAYERS = range(AVAILABLE, UNDISCOVERED + 1)
+
+def buildResourceMatrix(resources):
+    """Get the per-state quantities of every resource as a dense matrix of resources × states × layers
+    Returns the resource names, in the order of the matrix rows, and the matrix"""
+    keys = list(resources)
+    matrix = np.array([[resource[layer] for layer in LAYERS] for resource in resources.values()], dtype=np.int64)
+    return keys, np.ascontiguousarray(matrix.transpose(0, 2, 1))
+
+def storeResourceMatrix(keys, matrix, resources):
+    """Copy the shuffled layers of the matrix back into the per-state lists of 'resources'"""
+    for row, key in enumerate(keys):
+        for layer in SHUFFLED_LAYERS:
+            resources[key][LAYERS[layer]] = matrix[row, :, layer].tolist()
+
+def getProtectedQuantities(matrix, noInitialBuildings):
+    """Get the quantity of each resource guaranteed in each state, so that initial buildings and companies work
+    Resources without initial buildings are protected among the undiscovered ones, the others among the available ones
+    Returns the protected available and the protected undiscovered quantities, both of resources × states"""
+    protected = np.maximum(matrix[:, :, CONSTRAINED_HISTORY], matrix[:, :, CONSTRAINED_COMPANY])
+    noInitialBuildings = noInitialBuildings[:, None]
+    return np.where(noInitialBuildings, 0, protected), np.where(noInitialBuildings, protected, 0)
+
+def permuteStates(values, rng):
+    """Permute the states (the last axis) independently for every other index, with one sort of random keys"""
+    return np.take_along_axis(values, np.argsort(rng.random(values.shape), axis=-1), axis=-1)
+
+def getProtectedLayers(matrix, shuffled, noInitialBuildings):
+    """Get the guaranteed quantity of every shuffled resource in every state, for each shuffled layer: resources × states × (available, discovered, undiscovered)"""
+    protectedAvailable, protectedUndiscovered = getProtectedQuantities(matrix, noInitialBuildings)
+    protected = np.zeros(matrix[:, :, AVAILABLE:UNDISCOVERED + 1].shape, dtype=np.int64)
+    protected[:, :, AVAILABLE] = protectedAvailable
+    protected[:, :, UNDISCOVERED] = protectedUndiscovered
+    protected[~shuffled] = 0
+    return protected
+
+def trimDeposits(deposits, excess):
+    """Lower the deposits (the last axis) by 'excess' in total, in proportion to their size; the units left by the rounding go to the largest remainders
+    Returns the trimmed deposits, and the part of 'excess' larger than all the deposits, which could not be taken"""
+    totals = deposits.sum(axis=-1, keepdims=True)
+    targets = np.maximum(0, totals - excess[..., None])
+    scaled = deposits * np.divide(targets, totals, out=np.zeros(totals.shape), where=totals > 0)
+    trimmed = np.floor(scaled).astype(np.int64)
+    leftover = targets - trimmed.sum(axis=-1, keepdims=True)
+    ranks = np.argsort(np.argsort(trimmed - scaled, axis=-1, kind='stable'), axis=-1, kind='stable')
+    trimmed += ranks < leftover
+    return trimmed, np.maximum(0, excess - totals[..., 0])
+
+def fitToCaps(values, protected, maxPerState, rng):
+    """Take from every state what it has above 'maxPerState', unless it is guaranteed, and give it to the states with room, in a random order
+    Returns the new values, and what did not fit into any state"""
+    limits = np.maximum(protected, maxPerState)
+    excess = np.maximum(0, values - limits)
+    values = values - excess
+    room = limits - values
+    order = np.argsort(rng.random(values.shape), axis=-1)
+    roomInOrder = np.take_along_axis(room, order, axis=-1)
+    roomBefore = np.cumsum(roomInOrder, axis=-1) - roomInOrder
+    fill = np.clip(excess.sum(axis=-1, keepdims=True) - roomBefore, 0, roomInOrder)
+    np.put_along_axis(values, order, np.take_along_axis(values, order, axis=-1) + fill, axis=-1)
+    return values, np.maximum(0, excess.sum(axis=-1) - room.sum(axis=-1))
+
+def shuffleResourceMatrix(matrix, shuffled, noInitialBuildings, rng=None, preserveTotals=False, maxPerState=None):
+    """Shuffle the rows marked in 'shuffled' into an assignment where every state has its guaranteed amount, by construction
+    Each state keeps its guaranteed amount and the rest of the resources (the deposits) are permuted between the states
+    States short of their guaranteed amount before the shuffle get it, which raises the world total; with 'preserveTotals', the deposits are trimmed by as much
+    With 'maxPerState', no state gets more than that of a resource in one layer, unless it is guaranteed more; the excess goes to states with room
+    The runtime is bounded: a few sorts of the states, whatever the constraints; without the options, the same seed gives the same shuffle as before them
+    Returns the new matrix and the report of the adjustments: the states short before the shuffle (resources × states) and, per resource and layer, the amount added to the world total and the amount which fit under no cap"""
+    rows, layers, report = shuffleResourceMatrixRuns(matrix, shuffled, noInitialBuildings, 1, rng, preserveTotals, maxPerState)
+    result = matrix.copy()
+    result[rows, :, AVAILABLE:UNDISCOVERED + 1] = layers[0].transpose(0, 2, 1)
+    report['droppedByCap'] = report['droppedByCap'][0]
+    return result, report
+
+def shuffleResourceMatrixRuns(matrix, shuffled, noInitialBuildings, runs, rng=None, preserveTotals=False, maxPerState=None):
+    """Shuffle the rows marked in 'shuffled' 'runs' times at once, as shuffleResourceMatrix does once: the runs are the first axis of the arrays,
+    so that many shuffles cost the same few sorts as one; a single run draws the same random numbers as shuffleResourceMatrix
+    Returns the shuffled rows, their shuffled layers as runs × shuffled rows × (available, discovered, undiscovered) × states, and the report of shuffleResourceMatrix, with 'droppedByCap' per run"""
+    rng = np.random.default_rng() if rng is None else rng
+    protected = getProtectedLayers(matrix, shuffled, noInitialBuildings)
+    values = matrix[:, :, AVAILABLE:UNDISCOVERED + 1]
+    missing = np.maximum(0, protected - values)
+    deposits = np.maximum(0, values - protected)
+    added = missing.sum(axis=1)
+
+    rows = np.flatnonzero(shuffled)
+    layers = deposits[rows].transpose(0, 2, 1)
+    if preserveTotals:
+        layers, notTrimmed = trimDeposits(layers, added[rows])
+        added[rows] = notTrimmed
+    protectedLayers = protected[rows].transpose(0, 2, 1)
+    layers = permuteStates(np.broadcast_to(layers, (runs,) + layers.shape), rng) + protectedLayers
+    dropped = np.zeros((runs,) + added.shape, dtype=np.int64)
+    if maxPerState is not None:
+        layers, dropped[:, rows] = fitToCaps(layers, np.broadcast_to(protectedLayers, layers.shape), maxPerState, rng)
+    report = {'missingBefore': missing[:, :, AVAILABLE] > 0, 'addedToTotal': added, 'droppedByCap': dropped}
+    return rows, layers, report
+
+def validateResourceMatrix(matrix, shuffled, noInitialBuildings):
+    """Find the states which do not have the guaranteed amount of a shuffled resource
+    Returns the (resource row, state) pairs short of available and short of undiscovered resources"""
+    protectedAvailable, protectedUndiscovered = getProtectedQuantities(matrix, noInitialBuildings)
+    shortAvailable = (matrix[:, :, AVAILABLE] < protectedAvailable) & shuffled[:, None]
+    shortUndiscovered = (matrix[:, :, UNDISCOVERED] < protectedUndiscovered) & shuffled[:, None]
+    return np.argwhere(shortAvailable), np.argwhere(shortUndiscovered)
@@ -1,26 +1,122 @@
+import hashlib
 import os
-from random import shuffle
+import random
 import re
 import shutil
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 from globalProperties import IGNORED_RESOURCES
-from Auxiliary import copyTree
+from Auxiliary import copyTree, getAsidePath, hasContent, newStagedFolder, recoverFolder, replaceFolder, writeFileAtomically
+from paradoxScript import SCRIPT_ENCODING, findFirst, isBlock, parseScript
+from instrumentation import addCounts, getCurrentSpan, span
+from progress import checkCancelled, commitTask, reportProgress
+from corpus import closeCorpus, getCorpusBytes, newCorpus, releaseCorpusFile, usingCorpus
+from gameIndex import addState, getFilesOfStates, indexResources, newGameIndex
+from parseCache import newParseCache, parseCached, parseCachedFiles
+from preview import getShuffleDiff
+from readFromGameFiles import getGuaranteedResourcesFromCompanies, getGuaranteedResourcesFromHistory, getInfoFromStateRegions, listCompaniesFiles, listHistoryBuildingsFiles, listStateRegionsFiles, parseCompaniesBuffer, parseHistoryBuildingsBuffer, parseStateRegionsBuffer
+from versionStore import RECIPE_FORMAT, addVersion, deleteVersion, exportVersion, hashFile, loadBackUpManifest, loadVersionIndex, saveBackUpManifest, saveVersionIndex
 
 def backUpStateRegions(pathGameStateRegions, pathAppdataStateRegionsOriginal, logger):
-    """If there is no back-up on %appdata%, create it
-    Otherwise, replace the game's files with the back-up, to start fresh"""
+    """If there is no back-up on %appdata%, create it, with the manifest of its files
+    Otherwise, put the back-up's files back into the game's state_regions, to start fresh: only the files which differ from it are copied
+    A file which differs from the back-up although the app did not write it, or which the back-up does not have, comes from a patch of the game:
+    it is kept, and replaces its back-up (the previous one is moved into original/replaced) instead of being overwritten by a stale file
+    A state_regions which a crash left in the middle of a switch of version is put back first, see Auxiliary.recoverFolder; in the GUI, this runs under progress.gameFilesLock"""
+    recoverFolder(pathGameStateRegions)
     if not os.path.exists(pathAppdataStateRegionsOriginal):
         os.makedirs(pathAppdataStateRegionsOriginal)
         copyTree(pathGameStateRegions, pathAppdataStateRegionsOriginal)
+        manifest = getBackUpManifest(pathGameStateRegions, pathAppdataStateRegionsOriginal)
+        recordGameStateRegions(pathGameStateRegions, pathAppdataStateRegionsOriginal, True, manifest)
         logger.info("Made a back-up from %appdata%")
-    else:
-        copyTree(pathAppdataStateRegionsOriginal, pathGameStateRegions)
-        logger.info("Game's state_region replaced by the back-up from %appdata%")
+        return
 
-def getGameFilePaths(pathGame, pathAppdataStateRegionsOriginal, logger):
+    manifest = getBackUpManifest(pathGameStateRegions, pathAppdataStateRegionsOriginal)
+    # What the app wrote is only known for the game the back-up was made from, and since a release which records it
+    records = manifest['game'] if manifest['pathGame'] == os.path.abspath(pathGameStateRegions) else {}
+    gameFiles = [filename for filename in os.listdir(pathGameStateRegions) if os.path.isfile(os.path.join(pathGameStateRegions, filename))]
+    staleFiles = []
+    for filename in sorted(set(manifest['files']) | set(gameFiles)):
+        filePath = os.path.join(pathGameStateRegions, filename)
+        original = manifest['files'].get(filename)
+        if not os.path.isfile(filePath):
+            logger.warning(f"{filename} is missing from the game's state_regions, it is restored from the back-up")
+            staleFiles.append(filename)
+            continue
+        stat = os.stat(filePath)
+        record = records.get(filename)
+        isWrittenByApp = record is not None and record[:2] == [stat.st_size, stat.st_mtime_ns]
+        if isWrittenByApp and record[2]:
+            continue
+        if original is not None and stat.st_size == original['size'] and hashFile(filePath) == original['hash']:
+            continue
+        if original is not None and (isWrittenByApp or not records):
+            staleFiles.append(filename)
+            continue
+        logger.warning(f"The game's {filename} {'is new' if original is None else 'changed'} since the back-up, and not by the app: a patch of the game? The back-up takes it in")
+        replaceBackUpFile(pathGameStateRegions, pathAppdataStateRegionsOriginal, filename, manifest)
+
+    if staleFiles:
+        pathStaged = newStagedFolder(pathGameStateRegions)
+        try:
+            for filename in staleFiles:
+                shutil.copy2(os.path.join(pathAppdataStateRegionsOriginal, filename), os.path.join(pathStaged, filename))
+            replaceFolder(pathStaged, pathGameStateRegions)
+        except BaseException:
+            shutil.rmtree(pathStaged, ignore_errors=True)
+            raise
+    recordGameStateRegions(pathGameStateRegions, pathAppdataStateRegionsOriginal, True, manifest)
+    logger.info(f"Game's state_region replaced by the back-up from %appdata%: {len(staleFiles)} files copied, the others were unchanged")
+
+def getBackUpManifest(pathGameStateRegions, pathAppdataStateRegionsOriginal):
+    """Load the manifest of the back-up, see loadBackUpManifest; a back-up without one gets it, from the hash of its files"""
+    manifest = loadBackUpManifest(pathAppdataStateRegionsOriginal)
+    if manifest is None:
+        files = {}
+        for filename in sorted(os.listdir(pathAppdataStateRegionsOriginal)):
+            filePath = os.path.join(pathAppdataStateRegionsOriginal, filename)
+            if os.path.isfile(filePath):
+                files[filename] = {'size': os.path.getsize(filePath), 'hash': hashFile(filePath)}
+        manifest = {'pathGame': os.path.abspath(pathGameStateRegions), 'files': files, 'game': {}}
+        saveBackUpManifest(pathAppdataStateRegionsOriginal, manifest)
+    return manifest
+
+def replaceBackUpFile(pathGameStateRegions, pathAppdataStateRegionsOriginal, filename, manifest):
+    """Put a file of the game into the back-up and its manifest; the back-up's previous file, if any, is moved into original/replaced"""
+    pathBackUpFile = os.path.join(pathAppdataStateRegionsOriginal, filename)
+    if os.path.exists(pathBackUpFile):
+        pathReplaced = os.path.join(os.path.dirname(os.path.abspath(pathAppdataStateRegionsOriginal)), "replaced")
+        os.makedirs(pathReplaced, exist_ok=True)
+        os.replace(pathBackUpFile, os.path.join(pathReplaced, filename))
+    shutil.copy2(os.path.join(pathGameStateRegions, filename), pathBackUpFile)
+    manifest['files'][filename] = {'size': os.path.getsize(pathBackUpFile), 'hash': hashFile(pathBackUpFile)}
+
+def recordGameStateRegions(pathGameStateRegions, pathAppdataStateRegionsOriginal, isOriginal=False, manifest=None):
+    """Note the size and modification time of the game's state_regions files as the app left them, after it wrote them,
+    so that backUpStateRegions tells them from the files a patch of the game changed
+    Nothing is noted for another folder than the game's one, e.g. the export of a version"""
+    if not os.path.exists(pathAppdataStateRegionsOriginal):
+        return
+    manifest = getBackUpManifest(pathGameStateRegions, pathAppdataStateRegionsOriginal) if manifest is None else manifest
+    if manifest['pathGame'] != os.path.abspath(pathGameStateRegions):
+        if not isOriginal:
+            return
+        manifest['pathGame'] = os.path.abspath(pathGameStateRegions)
+    manifest['game'] = {}
+    for filename in sorted(os.listdir(pathGameStateRegions)):
+        filePath = os.path.join(pathGameStateRegions, filename)
+        if os.path.isfile(filePath):
+            stat = os.stat(filePath)
+            manifest['game'][filename] = [stat.st_size, stat.st_mtime_ns, isOriginal]
+    saveBackUpManifest(pathAppdataStateRegionsOriginal, manifest)
+
+def getGameFilePaths(pathGame, logger):
     """Check if the provided path to the game is correct. 
-    If that's the case, return paths to folders that are worked with by the app, such as the state regions, history buildings, companies and good icons"""
+    If that's the case, return paths to folders that are worked with by the app, such as the state regions, history buildings, companies and good icons
+    It only reads the folders' existence: the back-up, and putting back a state_regions left aside by a crash during a switch of version, are left to the caller, see backUpStateRegions"""
     validPath = True
 
     pathGameStateRegions = os.path.join(pathGame, "game", "map_data", "state_regions")
@@ -30,7 +126,8 @@ def getGameFilePaths(pathGame, pathAppdataStateRegionsOriginal, logger):
     if not os.path.exists(pathGame):
         logger.error("Path to Victoria 3 folder does not exist in config file")
         validPath = False
-    if not os.path.exists(pathGameStateRegions):
+    # A state_regions left aside by a crash is valid: the caller puts it back
+    if not os.path.exists(pathGameStateRegions) and not os.path.exists(getAsidePath(pathGameStateRegions, "old")):
         logger.error(f"Path does not correspond to Victoria 3 folder; Expected {pathGameStateRegions}")
         validPath = False
     if not os.path.exists(pathGameHistoryBuildings):
@@ -43,34 +140,23 @@ def getGameFilePaths(pathGame, pathAppdataStateRegionsOriginal, logger):
     if not validPath: 
         return validPath, None, None, None, None, None
 
-    backUpStateRegions(pathGameStateRegions, pathAppdataStateRegionsOriginal, logger)
-    
     return validPath, pathGame, pathGameStateRegions, pathGameHistoryBuildings, pathGameCompanies, pathGameGoodIcons
 
-def getStateCountAndNames(pathGameStateRegions, logger):
-    """Get the number & names of states
-    This must be done before running the methods that read from state regions, buildings and history"""
-    stateCount = 0
-    stateNameToID = {}
-    stateIDToName = {}
-    for filename in os.listdir(pathGameStateRegions):
-        if filename[0:2] == "99":
-            continue
-        filePath = os.path.join(pathGameStateRegions, filename)
-        if os.path.isfile(filePath):
-            with open(filePath, "r") as f:
-                for line in f:
-                    findState = re.search("(STATE_.*) =.*", line)
-                    if findState:
-                        stateCount += 1
-                        stateName = findState.groups()[0]
-                        stateNameToID[stateName] = stateCount - 1
-                        stateIDToName[stateCount - 1] = stateName
+def getStateCountAndNames(pathGameStateRegions, logger, parseCache=None, corpus=None):
+    """Get the number & names of states, and the game index of their IDs and of the files and offsets which define them: in the order of the files sorted by name, then of the states in each file
+    This must be done before running the methods that read from state regions, buildings and history; the resources are added to the index by indexResources"""
+    gameIndex = newGameIndex()
+    filePaths = listStateRegionsFiles(pathGameStateRegions)
+    for filePath, states in zip(filePaths, parseCachedFiles(parseCache, filePaths, parseStateRegionsBuffer, corpus)):
+        for state in states:
+            if not addState(gameIndex, state['name'], filePath, state['start'], state['end']):
+                logger.warning(f"State {state['name']} is defined more than once in state_regions, only its first definition is used")
+    stateCount = len(gameIndex['stateIDToName'])
     logger.info(f"Found {stateCount} states in state_regions")
     stateInfo = [0] * stateCount
     for s in range(stateCount):
         stateInfo[s] = {'naval_exit_id': 0, 'resourcesStaticTotal': 0}
-    return stateCount, stateInfo, stateNameToID, stateIDToName
+    return stateCount, stateInfo, gameIndex
 
 def getResourcesFromConfig(stateCount, logger):
     """Extracts from 'resources.ini' the list of: resource name, the corresponding building, the corresponding building group, whether it's dynamic, whether it's hidden at the beggining of the game (& no buildings using it), GUI color
@@ -86,8 +172,8 @@ def getResourcesFromConfig(stateCount, logger):
         sys.exit()
     with open(fileName, "r") as f:
         for line in f:
-            isDynamic = re.search(r"dynamic", line)
-            noInitialBuildings = re.search(r'noInitialBuildings', line)
+            isDynamic = re.search(r"dynamic", line) is not None
+            noInitialBuildings = re.search(r'noInitialBuildings', line) is not None
             findResource = re.search(r"([a-z0-9]+)\s+([_\w]+)\s+([_\w]+)\s+([_\w]+)", line)
             if findResource == None:
                 logger.error(f"Error parsing line {line} in {fileName}")
@@ -114,8 +200,6 @@ def getResourcesFromConfig(stateCount, logger):
                     'totalUndiscovered' : 0,
                     'stringVar': None,
                     'strColor': color,
-                    'bestStates': [],
-                    'biggestValues': [],
                     'labelBestStates': None,
                     }
                 resources[name] = objectToAdd
@@ -128,165 +212,361 @@ def getResourcesFromConfig(stateCount, logger):
 
     return resources
 
-def updateNewStateRegions(pathGameStateRegions, stateInfo, resources, logger, stateIDToName) -> List:
-    """Remove old changes, Shuffle, add new changes"""
-    trimStateRegions(pathGameStateRegions, logger)
-    resources = shuffleResources(resources, logger, stateIDToName)
-    restoreStateRegions(pathGameStateRegions, stateInfo, resources, logger)
+def isShuffledInPreset(resourceName, preset) -> bool:
+    """Whether the resource is shuffled by one of the PRESETS"""
+    if resourceName in IGNORED_RESOURCES:
+        return False
+    return  preset == "All" or \
+            resourceName == 'gold' and preset != "Vanilla - No shuffle" or \
+            resourceName == 'oil' and preset not in ["Vanilla - No shuffle", "Gold"] or \
+            resourceName in ['coal', 'iron', 'lead', 'sulfur'] and preset not in ["Vanilla - No shuffle", "Gold", "Yellow & Black Gold", "Discoverables"] or \
+            resourceName == 'rubber' and preset in ["All but wood", "All", "Discoverables"]
+
+def selectShuffledResources(resources, preset=None, resourceKeys=()):
+    """Mark the resources to be shuffled: the ones of the preset if given, otherwise the ones in 'resourceKeys'
+    Returns the keys of the shuffled resources"""
+    for resKey, resource in resources.items():
+        if preset:
+            resource['isShuffled'] = isShuffledInPreset(resKey, preset)
+        else:
+            resource['isShuffled'] = resKey in resourceKeys and resKey not in IGNORED_RESOURCES
+    return [resKey for resKey, resource in resources.items() if resource['isShuffled']]
+
+def shuffleGameFiles(pathGameStateRegions, pathAppdataStateRegionsOriginal, pathGameHistoryBuildings, pathGameCompanies, resources, logger, seed=None, parseCache=None, options=None):
+    """Parse the original state_regions (backed up from the game the first time) and the game files into 'resources', shuffle the resources marked as shuffled and write the new files into the game's state_regions
+    'resources' may hold more than the game information, e.g. the widgets of the GUI, which are kept
+    Every file is read once, into a corpus shared by the parse, the rendering and the fingerprint, and every file of the game's state_regions is written once
+    'options' are the ones of shuffleResources
+    Returns the game database of the new version, with its seed and its recipe, see previewShuffle"""
+    if not os.path.exists(pathAppdataStateRegionsOriginal):
+        with span("back-up"):
+            backUpStateRegions(pathGameStateRegions, pathAppdataStateRegionsOriginal, logger)
+    parseCache = newParseCache() if parseCache is None else parseCache
+    corpus = newCorpus()
+    try:
+        database = previewShuffle(pathAppdataStateRegionsOriginal, pathGameHistoryBuildings, pathGameCompanies, resources, logger, seed, parseCache, options, corpus)
+        writeShuffle(database, pathGameStateRegions, pathAppdataStateRegionsOriginal, logger, parseCache, corpus)
+    finally:
+        closeCorpus(corpus)
+    return database
+
+def previewShuffle(pathSourceStateRegions, pathGameHistoryBuildings, pathGameCompanies, resources, logger, seed=None, parseCache=None, options=None, corpus=None):
+    """Parse the state_regions of 'pathSourceStateRegions' and the game files into 'resources' and shuffle the resources marked as shuffled, in memory only: no file is written
+    The source is the back-up of the original files, or the game's own state_regions as long as there is no back-up
+    Returns the game database of the shuffled version, with its seed, its recipe, its ranking, the IDs of the states which changed and its diff against the source, see preview.getShuffleDiff
+    It is written into the game by writeShuffle, only if the user keeps it"""
+    parseCache = newParseCache() if parseCache is None else parseCache
+    with usingCorpus(corpus) as corpus:
+        database = loadGameDatabase(pathSourceStateRegions, pathGameHistoryBuildings, pathGameCompanies, logger, parseCache, resources, corpus)
+        seed = generateSeed() if seed is None else seed
+        stateIDToName = database['gameIndex']['stateIDToName']
+        with span("shuffle"):
+            resources, changedStates, resourcesBefore = shuffleAndCompare(database['resources'], logger, stateIDToName, seed, options)
+        database['resources'] = resources
+        database['changedStates'] = changedStates
+        database['diff'] = getShuffleDiff(resourcesBefore, resources, changedStates, stateIDToName)
+        with span("ranking"):
+            database['ranking'] = rankStates(resources)
+        database['seed'] = seed
+        with span("fingerprint"):
+            database['recipe'] = makeRecipe(seed, resources, fingerprintGameFiles(pathSourceStateRegions, pathGameHistoryBuildings, pathGameCompanies, corpus), options)
+    return database
+
+def writeShuffle(database, pathGameStateRegions, pathAppdataStateRegionsOriginal, logger, parseCache=None, corpus=None):
+    """Write a shuffle of previewShuffle into the game's state_regions, from the back-up: only the files which define a changed state are rendered
+    Without a back-up, which happens only if the shuffle was made from the game's own files, the back-up is made from them first
+    Returns the number of files and bytes written"""
+    if not os.path.exists(pathAppdataStateRegionsOriginal):
+        with span("back-up"):
+            backUpStateRegions(pathGameStateRegions, pathAppdataStateRegionsOriginal, logger)
+    with span("rewrite"):
+        written = rewriteStateRegions(pathAppdataStateRegionsOriginal, pathGameStateRegions, database['stateInfo'], database['resources'], logger, database['gameIndex'], database['changedStates'], parseCache, corpus)
+    recordGameStateRegions(pathGameStateRegions, pathAppdataStateRegionsOriginal)
+    return written
+
+def updateNewStateRegions(pathSourceStateRegions, pathTargetStateRegions, stateInfo, resources, logger, gameIndex, seed=None, parseCache=None, corpus=None, options=None) -> List:
+    """Shuffle, then write the files of 'pathSourceStateRegions' into 'pathTargetStateRegions', with the old resources replaced by the new ones"""
+    with span("shuffle"):
+        resources, changedStates = shuffleAndGetChangedStates(resources, logger, gameIndex['stateIDToName'], seed, options)
+    with span("rewrite"):
+        rewriteStateRegions(pathSourceStateRegions, pathTargetStateRegions, stateInfo, resources, logger, gameIndex, changedStates, parseCache, corpus)
     return resources
 
-def trimStateRegions(pathGameStateRegions, logger) -> None:
-    """So that changes are made in the state_regions, firstly elements will be removed from the files"""
-    tempFileLocation = "temp.txt"
-    lineCount = 0
-    for filename in os.listdir(pathGameStateRegions):
-        if filename[0:2] == "99":
-            continue
-        filePath = os.path.join(pathGameStateRegions, filename)
-        if os.path.isfile(filePath):
-            with open(filePath, "r") as f, open(tempFileLocation, "w") as g:
-                lines = f.readlines()
-                willNotWritePersistent = False
-                for line in lines:
-                    if not willNotWritePersistent:
-                        willWrite = True
-                    if re.search(r'capped_resources', line) or re.search('resource = {', line):
-                        willWrite = False
-                        willNotWritePersistent = True
-                    if re.search(r'^}$', line):
-                        willWrite = True
-                        willNotWritePersistent = False
-                    if willWrite:
-                        g.write(line)
-            with open(tempFileLocation, "r") as g:
-                lines = g.readlines()
-                lineCount += len(lines)
-            shutil.copy2(tempFileLocation, filePath)
-    os.remove(tempFileLocation)
-    logger.info(f"Total lines in trimmed state_regions: {lineCount}")
-
-def shuffleResources(resources, logger, stateIDToName) -> List:
-    """Shuffles resources - for each resource to be shuffled: it removes from each state the guaranteed amount, shuffles the new list, then it adds the guaranteed amount back
+def shuffleAndGetChangedStates(resources, logger, stateIDToName, seed=None, options=None):
+    """Shuffle the resources, keeping track of the states whose resources changed"""
+    resources, changedStates, _ = shuffleAndCompare(resources, logger, stateIDToName, seed, options)
+    return resources, changedStates
+
+def shuffleAndCompare(resources, logger, stateIDToName, seed=None, options=None):
+    """Shuffle the resources; returns them, the IDs of the states whose resources changed and, for every resource, its available, discovered and undiscovered lists from before the shuffle"""
+    resourcesBefore = {key: (resource['available'][:], resource['discoveredInState'][:], resource['undiscoveredInState'][:]) for key, resource in resources.items()}
+    resources = shuffleResources(resources, logger, stateIDToName, seed, options)
+    changedStates = getChangedStates(resourcesBefore, resources)
+    logger.info(f"Resources changed in {len(changedStates)} states")
+    return resources, changedStates, resourcesBefore
+
+def getChangedStates(resourcesBefore, resources) -> set:
+    """Get the IDs of the states whose resources differ from the ones before the shuffle"""
+    changedStates = set()
+    for key, resource in resources.items():
+        for before, after in zip(resourcesBefore[key], (resource['available'], resource['discoveredInState'], resource['undiscoveredInState'])):
+            changedStates.update(state for state, value in enumerate(after) if value != before[state])
+    return changedStates
+
+def shuffleResources(resources, logger, stateIDToName, seed=None, options=None) -> List:
+    """Shuffles resources - for each resource to be shuffled: every state keeps its guaranteed amount, and the rest is shuffled between the states
     
-    Guaranteed amount of resources = Quantity of resources prepared for initial buildings and companies, so that they are useable"""
-    # remove guaranteed resources
+    Guaranteed amount of resources = Quantity of resources prepared for initial buildings and companies, so that they are useable
+    They are hard constraints: the new resources always meet them, so a shuffle never has to be discarded
+    'options' may ask to keep the world totals ('preserveTotals') and to cap the amount of a resource in a state ('maxPerState')
+    The work is done on a matrix of resources × states × layers, see resourceMatrix; the same seed and options give the same shuffle"""
+    # numpy is only needed once something is shuffled, so it is not imported at the start of the app
+    import numpy as np
+    from resourceMatrix import LAYERS, buildResourceMatrix, shuffleResourceMatrix, storeResourceMatrix, validateResourceMatrix
+    keys, matrix = buildResourceMatrix(resources)
+    shuffled = np.array([resources[key]['isShuffled'] and key not in IGNORED_RESOURCES for key in keys], dtype=bool)
+    noInitialBuildings = np.array([resources[key]['noInitialBuildings'] for key in keys], dtype=bool)
 
-    for resKey, resource in resources.items():
-        if resKey in IGNORED_RESOURCES:
-            continue
-        if not resource['isShuffled']:
-            continue
-        for state, _ in enumerate(resource['available']):
-            constrHistory = resource['constrainedHistory'][state]
-            constrCompany = resource['constrainedCompany'][state]
-            protectedAvailability = max(constrHistory, constrCompany)                
-            if protectedAvailability > 0:
-                if resource['noInitialBuildings']:
-                    resource['undiscoveredInState'][state] = max(0, resource['undiscoveredInState'][state] - protectedAvailability)
-                else:
-                    if resource['available'][state] < protectedAvailability:
-                        logger.info(f'Not enough {str(resKey)} in {stateIDToName[state]}: {str(resource['available'][state])} for initial buildings: {str(constrHistory)} + company: {str(constrCompany)}')
-                    
-                    resource['available'][state] = max(0, resource['available'][state] - protectedAvailability)
+    options = options or {}
+    matrix, report = shuffleResourceMatrix(matrix, shuffled, noInitialBuildings, np.random.default_rng(seed), options.get('preserveTotals', False), options.get('maxPerState'))
+    for row, state in np.argwhere(report['missingBefore']):
+        resource = resources[keys[row]]
+        logger.info(f'Not enough {keys[row]} in {stateIDToName[state]}: {resource['available'][state]} for initial buildings: {resource['constrainedHistory'][state]} + company: {resource['constrainedCompany'][state]}')
+    for row, layer in np.argwhere(report['addedToTotal']):
+        message = f'{report['addedToTotal'][row, layer]} {keys[row]} ({LAYERS[layer]}) added to the world, so that every state has its guaranteed amount'
+        if options.get('preserveTotals', False):
+            logger.warning(message + ': there were not enough deposits elsewhere to keep the total')
+        else:
+            logger.info(message)
+    for row, layer in np.argwhere(report['droppedByCap']):
+        logger.warning(f'{report['droppedByCap'][row, layer]} {keys[row]} ({LAYERS[layer]}) removed from the world: no state had room under the cap of {options['maxPerState']}')
+    storeResourceMatrix(keys, matrix, resources)
 
-    # shuffle remaining resources
-    for resKey, resource in resources.items():
-        if resKey in IGNORED_RESOURCES:
-            continue
-        if resource['isShuffled'] == False:
-            continue
-        shuffle(resource['available'])
-        if resource['totalDiscovered'] > 0:
-            shuffle(resource['discoveredInState'])
-        if resource['totalUndiscovered'] > 0:
-            shuffle(resource['undiscoveredInState'])
+    # The assignment meets the guaranteed amounts by construction; this only guards against a regression
+    shortAvailable, shortUndiscovered = validateResourceMatrix(matrix, shuffled, noInitialBuildings)
+    for row, state in shortUndiscovered:
+        resource = resources[keys[row]]
+        logger.error(f'Not enough undiscovered {keys[row]} in {stateIDToName[state]}: {resource['undiscoveredInState'][state]} for initial buildings: {resource['constrainedHistory'][state]} + company: {resource['constrainedCompany'][state]}')
+    for row, state in shortAvailable:
+        resource = resources[keys[row]]
+        logger.error(f'Not enough available {keys[row]} in {stateIDToName[state]}: {resource['available'][state]} for initial buildings: {resource['constrainedHistory'][state]} + company: {resource['constrainedCompany'][state]}')
+    return resources
 
-    # restore guaranteed resources
-    for resKey, resource in resources.items():
-        if resKey in IGNORED_RESOURCES:
-            continue
-        if not resource['isShuffled']:
-            continue
-        for state, _ in enumerate(resource['available']):
-            constrHistory = resource['constrainedHistory'][state]
-            constrCompany = resource['constrainedCompany'][state]
-            protectedAvailability = max(constrHistory, constrCompany)
-            if protectedAvailability > 0:
-                if resource['noInitialBuildings']:
-                    resource['undiscoveredInState'][state] += protectedAvailability
-                else:
-                    resource['available'][state] += protectedAvailability
+def rewriteStateRegions(pathSourceStateRegions, pathTargetStateRegions, stateInfo, resources, logger, gameIndex, changedStates=None, parseCache=None, corpus=None):
+    """Write the files of 'pathSourceStateRegions' into 'pathTargetStateRegions', with the resources replaced by the shuffled amount of resources
+    Every file is read once, through the corpus, and rendered in memory; with 'changedStates', only the files which define one of them, found in the game index, are rendered
+    Only the files whose bytes differ from the target's are written, into a staged folder which then replaces the target at once, see replaceFolder,
+    so that a cancelled task leaves the target as it was, and the other files keep their modification time
+    When both folders are the same, only the files whose content changed are rendered first, then each is replaced atomically
+    Returns the number of files and bytes written"""
+    with usingCorpus(corpus) as corpus:
+        isInPlace = os.path.abspath(pathSourceStateRegions) == os.path.abspath(pathTargetStateRegions)
+        stateFiles = set(listStateRegionsFiles(pathSourceStateRegions))
+        changedFiles = getFilesOfStates(gameIndex, changedStates) if changedStates is not None else None
+        filenames = [filename for filename in sorted(os.listdir(pathSourceStateRegions)) if os.path.isfile(os.path.join(pathSourceStateRegions, filename))]
+        pathStaged = None if isInPlace else newStagedFolder(pathTargetStateRegions)
+        contents = {}
+        filesWritten = 0
+        bytesWritten = 0
+        try:
+            for fileIndex, filename in enumerate(filenames):
+                checkCancelled()
+                reportProgress("Rendering state_regions", fileIndex, len(filenames))
+                filePath = os.path.join(pathSourceStateRegions, filename)
+                content = None
+                if filePath in stateFiles and (changedFiles is None or filename in changedFiles):
+                    buffer = getCorpusBytes(corpus, filePath)
+                    states = parseCached(parseCache, filePath, parseStateRegionsBuffer, corpus)
+                    newContent = renderStateRegionsFile(buffer, stateInfo, resources, gameIndex, changedStates, states)
+                    if memoryview(buffer) != newContent:
+                        content = newContent
+                if content is None:
+                    if isInPlace:
+                        continue
+                    content = getCorpusBytes(corpus, filePath)
+                if isInPlace:
+                    contents[filename] = content
+                    continue
+                if hasContent(os.path.join(pathTargetStateRegions, filename), content):
+                    continue
+                with open(os.path.join(pathStaged, filename), "wb") as f:
+                    f.write(content)
+                addCounts(filesWritten=1, bytesWritten=len(content))
+                filesWritten += 1
+                bytesWritten += len(content)
 
+            commitTask()
+            if not isInPlace:
+                replaceFolder(pathStaged, pathTargetStateRegions)
+        except BaseException:
+            if pathStaged is not None:
+                shutil.rmtree(pathStaged, ignore_errors=True)
+            raise
+        for filename, content in contents.items():
+            reportProgress("Writing state_regions", filesWritten, len(contents))
+            targetPath = os.path.join(pathTargetStateRegions, filename)
+            releaseCorpusFile(corpus, targetPath)
+            writeFileAtomically(targetPath, content)
+            filesWritten += 1
+            bytesWritten += len(content)
+        logger.info(f"Wrote {filesWritten} files ({bytesWritten} bytes) in {pathTargetStateRegions}")
+        return filesWritten, bytesWritten
 
-	#check
-    for resKey, resource in resources.items():
-        if resKey in IGNORED_RESOURCES:
+def renderStateRegionsFile(buffer, stateInfo, resources, gameIndex, changedStates=None, states=None) -> bytes:
+    """Get the new bytes of a file from state_regions: in every state, the capped resources, the discoverable resources and the naval exit are replaced by the ones in 'resources' and 'stateInfo'
+    Entries unknown to 'resources.ini' are kept as they are; if 'changedStates' is given, the other states are kept as they are
+    With the parsed 'states' of the file, only the blocks of the states to replace are parsed again, from their offsets
+    The bytes around the replaced entries are copied as they are; the new entries use the line endings of the file"""
+    newline = b"\r\n" if buffer.find(b"\r\n") != -1 else b"\n"
+    stateNameToID = gameIndex['stateNameToID']
+    buildingGroupToKey = gameIndex['buildingGroupToResource']
+    pieces = []
+    position = 0
+    for entry in getStateEntries(buffer, stateNameToID, changedStates, states):
+        state = stateNameToID[entry.key]
+        keptCapped = []
+        for field in entry.value:
+            if field.key == 'capped_resources' and isBlock(field):
+                keptCapped.extend(cappedEntry for cappedEntry in field.value if cappedEntry.key is not None and cappedEntry.key not in buildingGroupToKey)
+            elif field.key == 'resource' and isBlock(field):
+                key = buildingGroupToKey.get(findFirst(field.value, 'type'))
+                if key is None or not resources[key]['isDynamic']:
+                    continue
+            elif field.key != 'naval_exit_id':
+                continue
+            start, end = getLineSpan(buffer, field.start, field.end)
+            pieces.append(buffer[position:start])
+            position = end
+        insertAt = buffer.rfind(b"\n", 0, entry.end - 1) + 1
+        if buffer[insertAt:entry.end - 1].strip():
+            insertAt = entry.end - 1
+        pieces.append(buffer[position:insertAt])
+        if buffer[insertAt - 1:insertAt] not in (b"\n", b""):
+            pieces.append(newline)
+        pieces.append(renderStateResources(state, stateInfo, resources, keptCapped).replace("\n", newline.decode()).encode(SCRIPT_ENCODING))
+        position = insertAt
+    pieces.append(buffer[position:])
+    return b"".join(pieces)
+
+def getStateEntries(buffer, stateNameToID, changedStates=None, states=None):
+    """Get the blocks of the states to replace in a file, in file order, with their offsets in the whole file"""
+    if states is None:
+        entries = parseScript(buffer)
+    else:
+        entries = []
+        for state in states:
+            if changedStates is not None and stateNameToID.get(state['name']) not in changedStates:
+                continue
+            entries.extend(shiftEntry(entry, state['start']) for entry in parseScript(buffer[state['start']:state['end']]))
+    for entry in entries:
+        if entry.key not in stateNameToID or not isBlock(entry):
             continue
-        if not resource['isShuffled']:
+        if changedStates is not None and stateNameToID[entry.key] not in changedStates:
             continue
-        for state, _ in enumerate(resource['available']):
-            constrHistory = resource['constrainedHistory'][state]
-            constrCompany = resource['constrainedCompany'][state]
-            protectedAvailability = max(constrHistory, constrCompany)                
-            if protectedAvailability > 0:
-                if resource['noInitialBuildings']:
-                    if resource['undiscoveredInState'][state] < protectedAvailability:
-                        logger.error(f'Not enough undiscovered {str(resKey)} in {stateIDToName[state]}: {str(resource['available'][state])} for initial buildings: {str(constrHistory)} + company: {str(constrCompany)}')
-                else:
-                    if resource['available'][state] < protectedAvailability:
-                        logger.error(f'Not enough available {str(resKey)} in {stateIDToName[state]}: {str(resource['available'][state])} for initial buildings: {str(constrHistory)} + company: {str(constrCompany)}')
-    return resources
+        yield entry
 
-def restoreStateRegions(pathGameStateRegions, stateInfo, resources, logger) -> None:
-    """Add the shuffled amount of resources to the files (state_regions)"""
-    tempFileLocation = "temp.txt"
-    lineCount = 0
-    stateCurrent = -1
-    for filename in os.listdir(pathGameStateRegions):
-        if filename[0:2] == "99":
-            continue
-        filePath = os.path.join(pathGameStateRegions, filename)
-        if os.path.isfile(filePath):
-            with open(filePath, "r") as f, open(tempFileLocation, "w") as g:
-                lines = f.readlines()
-                for line in lines:
-                    if re.search("(STATE_.*) =.*", line):
-                        stateCurrent += 1
-                    if re.search("^}$", line): # if found end of state info, restore
-                        if stateInfo[stateCurrent]['resourcesStaticTotal'] > 0:
-                            g.write('    capped_resources = {\n')
-                            for key, resource in resources.items():
-                                currentRes = resource['available'][stateCurrent]
-                                if currentRes > 0:
-                                    g.write('        ' + resource['buildingGroup'] + ' = ' + str(currentRes) + "\n")
-                            g.write('    }\n')
-                        for key, resource in resources.items():
-                            resDisc = resource['discoveredInState'][stateCurrent]
-                            resUndisc = resource['undiscoveredInState'][stateCurrent]
-                            if resDisc + resUndisc > 0:
-                                g.write('    resource = {\n')
-                                g.write('        type = "' + resource['buildingGroup'] + '"\n')
-                                if key == 'gold':
-                                    g.write('        depleted_type = "bg_gold_mining"\n')
-                                if resDisc > 0:
-                                    g.write('        discovered_amount = ' + str(resDisc) + '\n')
-                                if resUndisc > 0:
-                                    g.write('        undiscovered_amount = ' + str(resUndisc) + '\n')
-                                g.write('    }\n')
-                        navalID = stateInfo[stateCurrent]['naval_exit_id']
-                        if navalID > 0:
-                            g.write('    naval_exit_id = ' + str(navalID) + '\n')
-                    g.write(line)
-            with open(tempFileLocation, "r") as g:
-                lines = g.readlines()
-                lineCount += len(lines)
-            shutil.copy2(tempFileLocation, filePath)
-    os.remove(tempFileLocation)
-    logger.info(f"Total lines in restored state_regions: {lineCount}")
+def shiftEntry(entry, offset):
+    """Move the offsets of an entry parsed from a slice of a file, and of its nested entries, to offsets in the whole file"""
+    value = [shiftEntry(field, offset) for field in entry.value] if isBlock(entry) else entry.value
+    return entry._replace(value=value, start=entry.start + offset, end=entry.end + offset)
 
+def getLineSpan(buffer, start, end):
+    """Widen the span of an entry to its whole lines, if nothing else is written on them"""
+    lineStart = buffer.rfind(b"\n", 0, start) + 1
+    if not buffer[lineStart:start].strip():
+        start = lineStart
+    lineEnd = buffer.find(b"\n", end)
+    lineEnd = len(buffer) if lineEnd == -1 else lineEnd + 1
+    if not buffer[end:lineEnd].strip():
+        end = lineEnd
+    return start, end
+
+def renderStateResources(state, stateInfo, resources, keptCapped) -> str:
+    """Get the capped resources, discoverable resources and naval exit of a state, in the format of state_regions"""
+    lines = []
+    if stateInfo[state]['resourcesStaticTotal'] > 0 or keptCapped:
+        lines.append('    capped_resources = {\n')
+        for key, resource in resources.items():
+            currentRes = resource['available'][state]
+            if currentRes > 0:
+                lines.append('        ' + resource['buildingGroup'] + ' = ' + str(currentRes) + "\n")
+        for cappedEntry in keptCapped:
+            lines.append('        ' + cappedEntry.key + ' = ' + str(cappedEntry.value) + "\n")
+        lines.append('    }\n')
+    for key, resource in resources.items():
+        resDisc = resource['discoveredInState'][state]
+        resUndisc = resource['undiscoveredInState'][state]
+        if resDisc + resUndisc > 0:
+            lines.append('    resource = {\n')
+            lines.append('        type = "' + resource['buildingGroup'] + '"\n')
+            if key == 'gold':
+                lines.append('        depleted_type = "bg_gold_mining"\n')
+            if resDisc > 0:
+                lines.append('        discovered_amount = ' + str(resDisc) + '\n')
+            if resUndisc > 0:
+                lines.append('        undiscovered_amount = ' + str(resUndisc) + '\n')
+            lines.append('    }\n')
+    navalID = stateInfo[state]['naval_exit_id']
+    if navalID > 0:
+        lines.append('    naval_exit_id = ' + str(navalID) + '\n')
+    return "".join(lines)
+
+
+def preloadGameFiles(pathGameStateRegions, pathGameHistoryBuildings, pathGameCompanies, logger, parseCache, corpus):
+    """Read and parse state_regions, history/buildings and company_types at the same time, one thread per source, into the parse cache
+    Each source parses its files in worker processes when there are many; the time of each source is logged"""
+    sources = [
+        ('state_regions', listStateRegionsFiles(pathGameStateRegions), parseStateRegionsBuffer),
+        ('history/buildings', listHistoryBuildingsFiles(pathGameHistoryBuildings), parseHistoryBuildingsBuffer),
+        ('company_types', listCompaniesFiles(pathGameCompanies), parseCompaniesBuffer),
+        ]
+    parentSpan = getCurrentSpan()
+    def preloadSource(source):
+        name, filePaths, parseFunction = source
+        start = time.perf_counter()
+        with span(name, parentSpan):
+            parseCachedFiles(parseCache, filePaths, parseFunction, corpus)
+        return name, len(filePaths), time.perf_counter() - start
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+        for name, fileCount, duration in executor.map(preloadSource, sources):
+            logger.info(f"Loaded {fileCount} files of {name} in {duration * 1000:.1f} ms")
+    logger.info(f"Loaded the game files in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+def loadGameDatabase(pathGameStateRegions, pathGameHistoryBuildings, pathGameCompanies, logger, parseCache=None, resources=None, corpus=None):
+    """Parse the states, their resources, the initial buildings and the companies into one game database, with the game index every reader and writer looks its states and resources up in
+    The three sources are loaded concurrently, then combined; 'resources', if given, is filled instead of new ones from resources.ini, keeping e.g. the widgets of the GUI
+    It does not need the GUI, nor does it change any file
+    Without a parse cache, one is kept in memory, so that every file is parsed only once; the files read are kept in 'corpus', if given, for the next phases"""
+    parseCache = newParseCache() if parseCache is None else parseCache
+    with usingCorpus(corpus) as corpus:
+        with span("load"):
+            with span("preload"):
+                preloadGameFiles(pathGameStateRegions, pathGameHistoryBuildings, pathGameCompanies, logger, parseCache, corpus)
+            start = time.perf_counter()
+            with span("count"):
+                stateCount, stateInfo, gameIndex = getStateCountAndNames(pathGameStateRegions, logger, parseCache, corpus)
+                if resources is None:
+                    resources = getResourcesFromConfig(stateCount, logger)
+                else:
+                    clearCollectedResources(stateCount, resources)
+                indexResources(gameIndex, resources)
+            with span("state_regions"):
+                resources, stateInfo = getInfoFromStateRegions(pathGameStateRegions, stateInfo, gameIndex, resources, logger, parseCache, corpus)
+            with span("history"):
+                resources = getGuaranteedResourcesFromHistory(pathGameHistoryBuildings, gameIndex, resources, logger, parseCache, corpus)
+            with span("companies"):
+                resources = getGuaranteedResourcesFromCompanies(gameIndex, resources, pathGameCompanies, logger, parseCache, corpus)
+        logger.info(f"Combined the game files into the game database in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return {
+            'stateCount': stateCount,
+            'stateInfo': stateInfo,
+            'gameIndex': gameIndex,
+            'resources': resources,
+            }
 
 def clearCollectedResources(stateCount, resources):
-    """Remove the collected information about resources, such as available, discovered, undiscovered, guaranteed quantity and best states"""
+    """Remove the collected information about resources, such as available, discovered, undiscovered and guaranteed quantity"""
     for resourceName, resource in resources.items():
         resource['available'] = [0] * stateCount
         resource['discoveredInState'] = [0] * stateCount
@@ -298,60 +578,124 @@ def clearCollectedResources(stateCount, resources):
         resource['total'] = 0
         resource['totalDiscovered'] = 0
         resource['totalUndiscovered'] = 0
-        resource['bestStates'] = []
-        resource['biggestValues'] = []
 
 def getVersions(pathAppdataVersions, logger) -> List:
-    """Get from %appdata% the list of folders representing the versions, so that it will be loaded into a combobox"""
+    """Get from the index of the versions store the list of versions, so that it will be loaded into a combobox"""
+    index = loadVersionIndex(pathAppdataVersions, logger)
     versions = []
-    if os.path.exists(os.path.join(pathAppdataVersions, "original")):
+    if "original" in index['versions']:
         versions.append("original")
-    for name in os.listdir(pathAppdataVersions):
+    for name in index['versions']:
         if name == "original":
             continue
-        if os.path.isdir(os.path.join(pathAppdataVersions, name)):
-            versions.append(name)
+        versions.append(name)
     logger.info(f"Loaded {len(versions)} versions")
     return versions
 
-def findStatesWithMostResources(resources, stateCount) -> List:
-    """Find state with the most resources
+def rankStates(resources):
+    """Build the index of the states with the most of each resource, see rankingIndex
     It is necessary to have run the method 'getInfoFromStateRegions'"""
-    for key, resource in resources.items():
-        for state in range(stateCount):
-            currentSum = resource['available'][state] + resource['discoveredInState'][state] + resource['undiscoveredInState'][state]
-            resource['bestStates'].append(state)
-            resource['biggestValues'].append(currentSum)
+    from rankingIndex import buildRankingIndex
+    return buildRankingIndex(resources)
 
-        pairs = list(zip(resource['bestStates'], resource['biggestValues']))
-        sorted_pairs = sorted(pairs, key=lambda x: x[1], reverse=True)
-        
-        resource['bestStates'], resource['biggestValues'] = zip(*sorted_pairs)
-        resource['bestStates'] = resource['bestStates'][:5]
-        resource['biggestValues'] = resource['biggestValues'][:5]
-    return resources
+def generateSeed() -> int:
+    """Get a new seed for a shuffle; it is short enough to be shared between players"""
+    return random.getrandbits(32)
+
+def fingerprintGameFiles(pathStateRegions, pathGameHistoryBuildings, pathGameCompanies, corpus=None) -> str:
+    """Hash of every file a shuffle depends on: the original state regions, the initial buildings, the companies and resources.ini
+    A version stored as a recipe can only be re-created from files with the same fingerprint"""
+    with usingCorpus(corpus) as corpus:
+        digest = hashlib.sha1()
+        filePaths = [os.path.join(folder, filename) for folder in (pathStateRegions, pathGameHistoryBuildings, pathGameCompanies) for filename in sorted(os.listdir(folder))]
+        for filePath in filePaths + ["resources.ini"]:
+            if os.path.isfile(filePath):
+                digest.update(os.path.basename(filePath).encode())
+                if filePath == "resources.ini":
+                    with open(filePath, "rb") as f:
+                        digest.update(f.read())
+                else:
+                    digest.update(getCorpusBytes(corpus, filePath))
+        return digest.hexdigest()
 
-def loadVersionConfigFile(app, pathAppdataVersions):
+def makeRecipe(seed, resources, fingerprint, options=None):
+    """The recipe to re-create a version: the seed, the shuffled resources, the fingerprint of the original files, the format of the recipe and the options of the shuffle, if any"""
+    recipe = {'seed': seed, 'resources': [resKey for resKey, resource in resources.items() if resource['isShuffled']], 'fingerprint': fingerprint, 'format': RECIPE_FORMAT}
+    if options:
+        recipe['options'] = options
+    return recipe
+
+def removeVersion(pathAppdataVersions, name, logger) -> bool:
+    """Delete a saved version from the versions store, and the blobs of its files which no other version uses
+    The back-up of the original files cannot be deleted; the game's files are left as they are
+    Returns whether the version was deleted"""
+    index = loadVersionIndex(pathAppdataVersions, logger)
+    if name == "original":
+        logger.error("The original files cannot be deleted")
+        return False
+    if name not in index['versions']:
+        logger.error(f"Version '{name}' does not exist")
+        return False
+    deleteVersion(pathAppdataVersions, index, name)
+    saveVersionIndex(pathAppdataVersions, index)
+    logger.info(f"Deleted version '{name}'")
+    return True
+
+def saveRecipeVersion(pathAppdataVersions, name, recipe, logger):
+    """Add to the versions store a version made only of its recipe"""
+    index = loadVersionIndex(pathAppdataVersions, logger)
+    addVersion(index, name, None, recipe['resources'], recipe)
+    saveVersionIndex(pathAppdataVersions, index)
+    logger.info(f"Saved version '{name}' with seed {recipe['seed']}")
+
+def materializeVersion(recipe, pathTargetStateRegions, pathAppdataStateRegionsOriginal, pathGameHistoryBuildings, pathGameCompanies, logger, parseCache=None):
+    """Re-create the state_regions of a version from its recipe: the original files shuffled again with the recipe's seed, written into 'pathTargetStateRegions'
+    Returns the game database of the version, or None if the original files are not the ones the recipe was made from, or the recipe was made by another format of the shuffle"""
+    recipeFormat = recipe.get('format')
+    if recipeFormat is None:
+        logger.warning(f"The version with seed {recipe['seed']} was made by an older release of the shuffler: it is re-created with the current shuffle, and its resources may differ from when it was made")
+    elif recipeFormat != RECIPE_FORMAT:
+        logger.error(f"The version with seed {recipe['seed']} was made by another release of the shuffler: recipe format {recipeFormat}, current {RECIPE_FORMAT}")
+        return None
+    corpus = newCorpus()
+    try:
+        fingerprint = fingerprintGameFiles(pathAppdataStateRegionsOriginal, pathGameHistoryBuildings, pathGameCompanies, corpus)
+        if fingerprint != recipe['fingerprint']:
+            logger.error(f"The version was made from other game files or another resources.ini: fingerprint {recipe['fingerprint']}, current {fingerprint}")
+            return None
+        parseCache = newParseCache() if parseCache is None else parseCache
+        database = loadGameDatabase(pathAppdataStateRegionsOriginal, pathGameHistoryBuildings, pathGameCompanies, logger, parseCache, corpus=corpus)
+        for resKey, resource in database['resources'].items():
+            resource['isShuffled'] = resKey in recipe['resources']
+        database['resources'] = updateNewStateRegions(pathAppdataStateRegionsOriginal, pathTargetStateRegions, database['stateInfo'], database['resources'], logger, database['gameIndex'], recipe['seed'], parseCache, corpus, recipe.get('options'))
+    finally:
+        closeCorpus(corpus)
+    logger.info(f"Re-created the version with seed {recipe['seed']} in {pathTargetStateRegions}")
+    return database
+
+def writeVersion(pathAppdataVersions, name, pathTargetStateRegions, pathAppdataStateRegionsOriginal, pathGameHistoryBuildings, pathGameCompanies, logger, parseCache=None) -> bool:
+    """Write the state_regions of a version into 'pathTargetStateRegions', e.g. the game's: copied from the versions store, or re-created from its recipe
+    Returns whether the version could be written"""
+    index = loadVersionIndex(pathAppdataVersions, logger)
+    entry = index['versions'].get(name)
+    if entry is None:
+        logger.error(f"Version '{name}' does not exist")
+        return False
+    if entry['manifest'] is not None:
+        isSwapped = exportVersion(pathAppdataVersions, index, name, pathTargetStateRegions)
+        logger.info(f"Put version '{name}' into {pathTargetStateRegions}" + ("" if isSwapped else ", file by file: the folder could not be replaced at once"))
+    elif materializeVersion(entry['recipe'], pathTargetStateRegions, pathAppdataStateRegionsOriginal, pathGameHistoryBuildings, pathGameCompanies, logger, parseCache) is None:
+        return False
+    recordGameStateRegions(pathTargetStateRegions, pathAppdataStateRegionsOriginal)
+    return True
+
+def loadVersionConfigFile(app, pathAppdataVersions, logger):
     """Gets the list of shuffled resources for the current version
     The version must be selected from the combobox in the app"""
     currentVersion = app.comboBoxVersions.get()
-    filePath = os.path.join(pathAppdataVersions, currentVersion, 'config.ini')
-    if not os.path.exists(filePath):
-        for resKey, resource in app.resources.items():
-            if resKey in IGNORED_RESOURCES:
-                continue
-            resource['stringVar'].set("0")
-    else:
-        with open(filePath, "r") as f:
-            line = f.readline()
-            goods = line.split(' ')
-            goods = goods[:len(goods) - 1]
-            for resKey, resource in app.resources.items():
-                if resKey in IGNORED_RESOURCES:
-                    continue
-                resource['stringVar'].set("0")
-                for good in goods:
-                    if good == resKey:
-                        resource['stringVar'].set("1")
-                        break
-    
\ No newline at end of file
+    entry = loadVersionIndex(pathAppdataVersions, logger)['versions'].get(currentVersion)
+    goods = entry['resources'] if entry is not None else []
+    for resKey, resource in app.resources.items():
+        if resKey in IGNORED_RESOURCES:
+            continue
+        resource['stringVar'].set("1" if resKey in goods else "0")
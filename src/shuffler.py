@@ -0,0 +1,139 @@
+import os
+
+from AppData import configureAppData
+from Auxiliary import recoverFolder
+from instrumentation import exportTrace, span
+from parseCache import saveParseCache
+from readFromGameFiles import getStrategicRegions
+from services import getGameFilePaths, getResourcesFromConfig, getVersions, loadGameDatabase, previewShuffle, removeVersion, saveRecipeVersion, selectShuffledResources, shuffleGameFiles, writeShuffle, writeVersion
+from versionStore import loadVersionIndex
+
+# The shuffler without the GUI: parse, shuffle and write the game files from scripts, headless boxes or benchmarks
+# Nothing imported here pulls in customtkinter, PIL or CTkMessagebox
+
+def getPaths(pathGame, logger):
+    """Get the folders the shuffler works with, in %appdata% and in the game; a state_regions which a crash left in the middle of a switch of version is put back
+    Returns None if 'pathGame' is not a Victoria 3 / mod folder"""
+    pathAppdataVersions, pathAppdataConfig, pathAppdataStateRegionsOriginal, pathAppdataCache = configureAppData(logger)
+    isPathValid, gamePath, pathGameStateRegions, pathGameHistoryBuildings, pathGameCompanies, _ = getGameFilePaths(pathGame, logger)
+    if not isPathValid:
+        logger.error(f"{pathGame} is not a Victoria 3 / mod folder")
+        return None
+    recoverFolder(pathGameStateRegions)
+    return {
+        'gamePath': gamePath,
+        'pathGameStateRegions': pathGameStateRegions,
+        'pathGameHistoryBuildings': pathGameHistoryBuildings,
+        'pathGameCompanies': pathGameCompanies,
+        'pathGameStrategicRegions': os.path.join(gamePath, "game", "common", "strategic_regions"),
+        'pathAppdataVersions': pathAppdataVersions,
+        'pathAppdataConfig': pathAppdataConfig,
+        'pathAppdataStateRegionsOriginal': pathAppdataStateRegionsOriginal,
+        'pathAppdataCache': pathAppdataCache,
+        }
+
+def shuffleGame(pathGame, logger, preset=None, resourceKeys=(), seed=None, name=None, parseCache=None, options=None):
+    """Shuffle the resources of the preset if given, otherwise the ones in 'resourceKeys', into the game's state_regions
+    If 'name' is given, the new version is saved under that name; 'options' are the ones of services.shuffleResources
+    Returns the game database of the new version, or None if nothing was shuffled"""
+    paths = getPaths(pathGame, logger)
+    if paths is None:
+        return None
+    if name is not None and name in loadVersionIndex(paths['pathAppdataVersions'], logger)['versions']:
+        logger.error(f"Version '{name}' already exists")
+        return None
+    resources = getResourcesFromConfig(0, logger)
+    resourceKeys = selectShuffledResources(resources, preset, resourceKeys)
+    logger.info(f"Shuffling {' '.join(resourceKeys)}")
+    with span("shuffleGame"):
+        database = shuffleGameFiles(paths['pathGameStateRegions'], paths['pathAppdataStateRegionsOriginal'], paths['pathGameHistoryBuildings'], paths['pathGameCompanies'], resources, logger, seed, parseCache, options)
+        with span("save parse cache"):
+            saveParseCache(parseCache, logger)
+    exportTrace("shuffle", logger)
+    if name is not None:
+        saveRecipeVersion(paths['pathAppdataVersions'], name, database['recipe'], logger)
+    return database
+
+def getOriginalStateRegions(paths):
+    """Get the folder of the original state_regions: the back-up if there is one, since the game's may be shuffled, otherwise the game's own"""
+    return paths['pathAppdataStateRegionsOriginal'] if os.path.exists(paths['pathAppdataStateRegionsOriginal']) else paths['pathGameStateRegions']
+
+def previewGame(pathGame, logger, preset=None, resourceKeys=(), seed=None, parseCache=None, options=None):
+    """Shuffle the resources of the preset if given, otherwise the ones in 'resourceKeys', in memory only, see services.previewShuffle
+    Nothing is written into the game nor the versions until writePreview
+    Returns the game database of the shuffle, with its diff against the original files, or None if 'pathGame' is not a Victoria 3 / mod folder"""
+    paths = getPaths(pathGame, logger)
+    if paths is None:
+        return None
+    resources = getResourcesFromConfig(0, logger)
+    resourceKeys = selectShuffledResources(resources, preset, resourceKeys)
+    logger.info(f"Previewing a shuffle of {' '.join(resourceKeys)}")
+    with span("previewGame"):
+        database = previewShuffle(getOriginalStateRegions(paths), paths['pathGameHistoryBuildings'], paths['pathGameCompanies'], resources, logger, seed, parseCache, options)
+        with span("save parse cache"):
+            saveParseCache(parseCache, logger)
+    exportTrace("preview", logger)
+    return database
+
+def writePreview(pathGame, database, logger, name=None, parseCache=None) -> bool:
+    """Write a shuffle of previewGame into the game's state_regions; if 'name' is given, it is saved under that name
+    Returns whether it was written"""
+    paths = getPaths(pathGame, logger)
+    if paths is None:
+        return False
+    if name is not None and name in loadVersionIndex(paths['pathAppdataVersions'], logger)['versions']:
+        logger.error(f"Version '{name}' already exists")
+        return False
+    writeShuffle(database, paths['pathGameStateRegions'], paths['pathAppdataStateRegionsOriginal'], logger, parseCache)
+    if name is not None:
+        saveRecipeVersion(paths['pathAppdataVersions'], name, database['recipe'], logger)
+    return True
+
+def switchVersion(pathGame, name, logger, parseCache=None) -> bool:
+    """Write a saved version into the game's state_regions; "original" restores the game's own files
+    Returns whether the version could be written"""
+    paths = getPaths(pathGame, logger)
+    if paths is None:
+        return False
+    isWritten = writeVersion(paths['pathAppdataVersions'], name, paths['pathGameStateRegions'], paths['pathAppdataStateRegionsOriginal'], paths['pathGameHistoryBuildings'], paths['pathGameCompanies'], logger, parseCache)
+    saveParseCache(parseCache, logger)
+    return isWritten
+
+def listVersions(logger):
+    """Get the names of the saved versions"""
+    pathAppdataVersions, _, _, _ = configureAppData(logger)
+    return getVersions(pathAppdataVersions, logger)
+
+def deleteSavedVersion(name, logger) -> bool:
+    """Delete a saved version and free the space of its files; returns whether it was deleted"""
+    pathAppdataVersions, _, _, _ = configureAppData(logger)
+    return removeVersion(pathAppdataVersions, name, logger)
+
+def generateVersions(pathGame, logger, count, baseSeed, preset=None, resourceKeys=(), parseCache=None, processes=None, options=None):
+    """Generate 'count' versions into the versions store, without changing the game's files
+    Returns the names of the generated versions"""
+    from batch import generateVersions as generateVersionsInParallel
+    paths = getPaths(pathGame, logger)
+    if paths is None:
+        return []
+    return generateVersionsInParallel(paths['gamePath'], paths['pathAppdataVersions'], paths['pathAppdataStateRegionsOriginal'], preset, resourceKeys, count, baseSeed, logger, parseCache, processes, options)
+
+def analyzeShuffles(pathGame, logger, runs, seed=None, preset=None, resourceKeys=(), parseCache=None, options=None, topCount=5, threshold=0.25):
+    """Measure how uneven 'runs' shuffles of the preset if given, otherwise of the resources in 'resourceKeys', are, see fairness.analyzeFairness
+    The original files are read (from the back-up if there is one, since the game's may be shuffled); nothing is written into the game nor the versions
+    Returns the report, or None if 'pathGame' is not a Victoria 3 / mod folder"""
+    from fairness import analyzeFairness
+    paths = getPaths(pathGame, logger)
+    if paths is None:
+        return None
+    with span("analyze"):
+        database = loadGameDatabase(getOriginalStateRegions(paths), paths['pathGameHistoryBuildings'], paths['pathGameCompanies'], logger, parseCache)
+        resourceKeys = selectShuffledResources(database['resources'], preset, resourceKeys)
+        logger.info(f"Analyzing {runs} shuffles of {' '.join(resourceKeys)}")
+        regions = getStrategicRegions(paths['pathGameStrategicRegions'], database['gameIndex'], logger, parseCache)
+        with span("shuffles"):
+            report = analyzeFairness(database['resources'], database['gameIndex']['stateIDToName'], runs, seed, options, topCount, threshold, regions)
+        with span("save parse cache"):
+            saveParseCache(parseCache, logger)
+    exportTrace("analyze", logger)
+    return report
@@ -0,0 +1,43 @@
+import importlib
+import time
+
+# Timings of the start of the app, so that regressions in the time to the first frame are visible in the log
+# Each phase is timed from the end of the previous one; the first one from the start of the process' own code
+startTime = time.perf_counter()
+lastMarkTime = startTime
+imports = []
+phases = []
+isFinished = False
+
+def importTimed(moduleName):
+    """Import a module, timing it; modules it imports which are not yet loaded are included in its time"""
+    global lastMarkTime
+    start = time.perf_counter()
+    module = importlib.import_module(moduleName)
+    lastMarkTime = time.perf_counter()
+    imports.append((moduleName, lastMarkTime - start))
+    return module
+
+def markPhase(name):
+    """Record the end of a phase of the start"""
+    global lastMarkTime
+    if isFinished:
+        return
+    now = time.perf_counter()
+    phases.append((name, now - lastMarkTime, now - startTime))
+    lastMarkTime = now
+
+def reportStartup(logger, isFinal=False):
+    """Write the timings recorded so far to the log; nothing is recorded nor reported once the start is finished"""
+    global isFinished
+    if isFinished:
+        return
+    isFinished = isFinal
+    lines = ["Startup timings:"]
+    for moduleName, duration in imports:
+        lines.append(f"  import {moduleName}: {duration * 1000:.1f} ms")
+    for name, duration, elapsed in phases:
+        lines.append(f"  {name}: {duration * 1000:.1f} ms (at {elapsed * 1000:.1f} ms)")
+    logger.info("\n".join(lines))
+    imports.clear()
+    phases.clear()
@@ -0,0 +1,205 @@
+import filecmp
+import hashlib
+import json
+import os
+import re
+import shutil
+
+from Auxiliary import newStagedFolder, replaceFolder
+from instrumentation import addCounts
+from progress import checkCancelled, commitTask, reportProgress
+
+# Every distinct file of every version is stored once, as versions/blobs/<2 first chars of hash>/<hash>
+# Blobs are never written into once stored, and nothing outside the store shares them: the files of a version are copied out of them, see exportVersion
+# versions/index.json holds, for each version, its manifest (file name -> hash) and/or its recipe, plus the reference count of each blob
+# versions/original/manifest.json holds the hash and size of every file of the back-up of the game's state_regions, see backUpStateRegions
+INDEX_FILE = "index.json"
+BLOBS_FOLDER = "blobs"
+BACKUP_MANIFEST_FILE = "manifest.json"
+# Format of the recipes: it changes whenever the same recipe would be re-created into another world, e.g. when the IDs of the states or the shuffle change
+# Recipes without it were made before the state files with a byte order mark were read correctly, and may be re-created differently, see services.materializeVersion
+RECIPE_FORMAT = 2
+
+def hashContent(content) -> str:
+    """Hash of the bytes of a file, which is also the name of its blob"""
+    return hashlib.sha1(content).hexdigest()
+
+def hashFile(filePath) -> str:
+    """Hash of the bytes of a file on the disk"""
+    with open(filePath, "rb") as f:
+        return hashContent(f.read())
+
+def getBlobPath(pathAppdataVersions, blobHash) -> str:
+    """Path of the blob with the given hash"""
+    return os.path.join(pathAppdataVersions, BLOBS_FOLDER, blobHash[:2], blobHash)
+
+def writeBlob(pathAppdataVersions, content) -> str:
+    """Store the bytes of a file, unless a blob with the same content already exists; returns its hash"""
+    blobHash = hashContent(content)
+    pathBlob = getBlobPath(pathAppdataVersions, blobHash)
+    if not os.path.exists(pathBlob):
+        os.makedirs(os.path.dirname(pathBlob), exist_ok=True)
+        pathTemp = f"{pathBlob}.{os.getpid()}.tmp"
+        with open(pathTemp, "wb") as f:
+            f.write(content)
+        os.replace(pathTemp, pathBlob)
+        addCounts(filesWritten=1, bytesWritten=len(content))
+    return blobHash
+
+def loadVersionIndex(pathAppdataVersions, logger):
+    """Load the index of the versions
+    On the first run, the versions stored as folders by older releases are moved into the store"""
+    pathIndex = os.path.join(pathAppdataVersions, INDEX_FILE)
+    if os.path.exists(pathIndex):
+        with open(pathIndex, "r") as f:
+            index = json.load(f)
+    else:
+        index = {'versions': {}, 'blobs': {}}
+        migrateVersionFolders(pathAppdataVersions, index, logger)
+    pathOriginal = os.path.join(pathAppdataVersions, "original", "state_regions")
+    if "original" not in index['versions'] and os.path.exists(pathOriginal):
+        storeVersionFolder(pathAppdataVersions, index, "original", pathOriginal, [])
+        saveVersionIndex(pathAppdataVersions, index)
+        logger.info("Added the original back-up to the versions store")
+    elif "original" in index['versions']:
+        # The back-up takes in the files a patch of the game changed; the stored original follows it
+        backUpManifest = loadBackUpManifest(pathOriginal)
+        if backUpManifest is not None and index['versions']['original']['manifest'] != {filename: entry['hash'] for filename, entry in backUpManifest['files'].items()}:
+            deleteVersion(pathAppdataVersions, index, "original")
+            storeVersionFolder(pathAppdataVersions, index, "original", pathOriginal, [])
+            saveVersionIndex(pathAppdataVersions, index)
+            logger.info("Updated the original version in the versions store from the back-up")
+    return index
+
+def saveVersionIndex(pathAppdataVersions, index):
+    """Write the index of the versions, replacing the previous one at once"""
+    pathIndex = os.path.join(pathAppdataVersions, INDEX_FILE)
+    with open(pathIndex + ".tmp", "w") as f:
+        json.dump(index, f)
+    os.replace(pathIndex + ".tmp", pathIndex)
+
+def getBackUpManifestPath(pathAppdataStateRegionsOriginal) -> str:
+    """Path of the manifest of the back-up, next to its state_regions"""
+    return os.path.join(os.path.dirname(os.path.abspath(pathAppdataStateRegionsOriginal)), BACKUP_MANIFEST_FILE)
+
+def loadBackUpManifest(pathAppdataStateRegionsOriginal):
+    """Load the manifest of the back-up: 'files' (file name -> hash and size of the original), 'pathGame' (the state_regions it was made from)
+    and 'game' (file name -> size, modification time and whether it is the original, of the game's files as the app last left them)
+    Returns None if there is none, e.g. for a back-up made by an older release"""
+    pathManifest = getBackUpManifestPath(pathAppdataStateRegionsOriginal)
+    if not os.path.exists(pathManifest):
+        return None
+    with open(pathManifest, "r") as f:
+        return json.load(f)
+
+def saveBackUpManifest(pathAppdataStateRegionsOriginal, manifest):
+    """Write the manifest of the back-up, replacing the previous one at once"""
+    pathManifest = getBackUpManifestPath(pathAppdataStateRegionsOriginal)
+    with open(pathManifest + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(pathManifest + ".tmp", pathManifest)
+
+def migrateVersionFolders(pathAppdataVersions, index, logger):
+    """Move the versions stored as folders (state_regions, config.ini, recipe.ini) into the store, then save the index
+    The folder of the original back-up is kept, since the game files are restored from it"""
+    for name in sorted(os.listdir(pathAppdataVersions)):
+        pathVersion = os.path.join(pathAppdataVersions, name)
+        if name == BLOBS_FOLDER or name[0] == "." or not os.path.isdir(pathVersion):
+            continue
+        resources = readResourcesFile(os.path.join(pathVersion, 'config.ini'))
+        recipe = readRecipeFile(os.path.join(pathVersion, 'recipe.ini'))
+        pathStateRegions = os.path.join(pathVersion, 'state_regions')
+        if os.path.isdir(pathStateRegions):
+            storeVersionFolder(pathAppdataVersions, index, name, pathStateRegions, resources, recipe)
+        elif recipe is not None:
+            addVersion(index, name, None, resources, recipe)
+        else:
+            continue
+        if name != "original":
+            shutil.rmtree(pathStateRegions, ignore_errors=True)
+            for filename in ('config.ini', 'recipe.ini'):
+                if os.path.exists(os.path.join(pathVersion, filename)):
+                    os.remove(os.path.join(pathVersion, filename))
+            if not os.listdir(pathVersion):
+                os.rmdir(pathVersion)
+        logger.info(f"Moved version '{name}' into the versions store")
+    saveVersionIndex(pathAppdataVersions, index)
+
+def readResourcesFile(filePath):
+    """Get the shuffled resources from the config.ini of a version folder"""
+    if not os.path.exists(filePath):
+        return []
+    with open(filePath, "r") as f:
+        return f.readline().split()
+
+def readRecipeFile(filePath):
+    """Get the recipe from the recipe.ini of a version folder, or None"""
+    if not os.path.exists(filePath):
+        return None
+    recipe = {'seed': None, 'resources': [], 'fingerprint': None}
+    with open(filePath, "r") as f:
+        for line in f:
+            found = re.search(r"(\w+)=(.*)", line)
+            if not found:
+                continue
+            key, value = found.groups()
+            if key == 'seed':
+                recipe['seed'] = int(value)
+            elif key == 'resources':
+                recipe['resources'] = value.split()
+            elif key == 'fingerprint':
+                recipe['fingerprint'] = value.strip()
+    return recipe
+
+def addVersion(index, name, manifest, resources, recipe=None):
+    """Add a version to the index: its manifest (file name -> blob hash) if its files are stored, its recipe if it can be re-created from a seed"""
+    if name in index['versions']:
+        raise ValueError(f"Version '{name}' already exists")
+    index['versions'][name] = {'manifest': manifest, 'resources': list(resources), 'recipe': recipe}
+    for blobHash in (manifest or {}).values():
+        index['blobs'][blobHash] = index['blobs'].get(blobHash, 0) + 1
+
+def storeVersionFolder(pathAppdataVersions, index, name, pathStateRegions, resources, recipe=None):
+    """Store every file of a state_regions folder as a version"""
+    manifest = {}
+    for filename in sorted(os.listdir(pathStateRegions)):
+        filePath = os.path.join(pathStateRegions, filename)
+        if os.path.isfile(filePath):
+            with open(filePath, "rb") as f:
+                manifest[filename] = writeBlob(pathAppdataVersions, f.read())
+    addVersion(index, name, manifest, resources, recipe)
+
+def deleteVersion(pathAppdataVersions, index, name):
+    """Remove a version from the index, and the blobs no other version uses"""
+    entry = index['versions'].pop(name)
+    for blobHash in (entry['manifest'] or {}).values():
+        index['blobs'][blobHash] -= 1
+        if index['blobs'][blobHash] <= 0:
+            del index['blobs'][blobHash]
+            pathBlob = getBlobPath(pathAppdataVersions, blobHash)
+            if os.path.exists(pathBlob):
+                os.remove(pathBlob)
+
+def exportVersion(pathAppdataVersions, index, name, pathTargetStateRegions):
+    """Put the stored files of a version into a folder, e.g. the game's state_regions
+    The files which differ from the folder's are copied from their blobs into a folder staged next to it, which then replaces it at once; the others are kept as they are
+    They are copies, not hard links: a game file written into by a mod tool or by hand would otherwise change the blob of every version sharing it
+    Returns whether the whole folder was replaced at once, see replaceFolder"""
+    manifest = index['versions'][name]['manifest']
+    pathStaged = newStagedFolder(pathTargetStateRegions)
+    try:
+        for fileIndex, (filename, blobHash) in enumerate(manifest.items()):
+            checkCancelled()
+            reportProgress("Staging the version", fileIndex, len(manifest))
+            pathBlob = getBlobPath(pathAppdataVersions, blobHash)
+            pathTarget = os.path.join(pathTargetStateRegions, filename)
+            if os.path.isfile(pathTarget) and filecmp.cmp(pathBlob, pathTarget, shallow=False):
+                continue
+            filePath = os.path.join(pathStaged, filename)
+            shutil.copyfile(pathBlob, filePath)
+            addCounts(filesCopied=1, bytesCopied=os.path.getsize(filePath))
+        commitTask()
+        return replaceFolder(pathStaged, pathTargetStateRegions)
+    except BaseException:
+        shutil.rmtree(pathStaged, ignore_errors=True)
+        raise
@@ -0,0 +1,35 @@
+import logging
+import os
+import shutil
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+
+from syntheticGame import generateGame
+
+# Run the tests from the root of the repository: python -m pytest
+# The tests which shuffle run on a synthetic game (see benchmarks/syntheticGame.py) with its own resources.ini, and their own app data
+
+@pytest.fixture
+def logger():
+    return logging.getLogger("V3RS")
+
+@pytest.fixture(scope="session")
+def syntheticGame(tmp_path_factory):
+    """A synthetic game of the size of the vanilla one, written once; tests work on copies of it, see game"""
+    pathGame = tmp_path_factory.mktemp("synthetic")
+    generateGame(str(pathGame), seed=1)
+    return pathGame
+
+@pytest.fixture
+def game(syntheticGame, tmp_path, monkeypatch):
+    """A copy of the synthetic game, with its resources.ini in the current folder, and an empty app data"""
+    pathGame = tmp_path / "game"
+    shutil.copytree(syntheticGame, pathGame)
+    monkeypatch.chdir(pathGame)
+    monkeypatch.delenv("APPDATA", raising=False)
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "appdata"))
+    return str(pathGame)
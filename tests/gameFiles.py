@@ -0,0 +1,27 @@
+import os
+
+# What the tests read from the state_regions of a game
+
+def getStateRegionsPath(pathGame):
+    return os.path.join(pathGame, "game", "map_data", "state_regions")
+
+def readFolder(folder):
+    """The bytes of every file of a folder, by name"""
+    files = {}
+    for filename in sorted(os.listdir(folder)):
+        with open(os.path.join(folder, filename), "rb") as f:
+            files[filename] = f.read()
+    return files
+
+def readStateRegions(pathGame):
+    """The bytes of every file of the game's state_regions, by name"""
+    return readFolder(getStateRegionsPath(pathGame))
+
+def statStateRegions(pathGame):
+    """The inode and modification time of every file of the game's state_regions, by name"""
+    folder = getStateRegionsPath(pathGame)
+    stats = {}
+    for filename in os.listdir(folder):
+        stat = os.stat(os.path.join(folder, filename))
+        stats[filename] = (stat.st_ino, stat.st_mtime_ns)
+    return stats
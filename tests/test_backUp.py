@@ -0,0 +1,53 @@
+import os
+
+from gameFiles import getStateRegionsPath, readFolder, readStateRegions, statStateRegions
+from services import backUpStateRegions
+from shuffler import getPaths, shuffleGame
+
+def getBackUpPath(game, logger):
+    return getPaths(game, logger)['pathAppdataStateRegionsOriginal']
+
+def test_backUpIsMadeFromOriginal(game, logger):
+    original = readStateRegions(game)
+    shuffleGame(game, logger, preset="All", seed=7)
+    assert readFolder(getBackUpPath(game, logger)) == original
+
+def test_filesWrittenByAppAreRestored(game, logger):
+    original = readStateRegions(game)
+    shuffleGame(game, logger, preset="All", seed=7)
+    assert readStateRegions(game) != original
+    backUpStateRegions(getStateRegionsPath(game), getBackUpPath(game, logger), logger)
+    assert readStateRegions(game) == original
+
+def test_unchangedFilesAreNotCopied(game, logger):
+    shuffleGame(game, logger, preset="Gold", seed=7)
+    pathBackUp = getBackUpPath(game, logger)
+    backUpStateRegions(getStateRegionsPath(game), pathBackUp, logger)
+    before = statStateRegions(game)
+    backUpStateRegions(getStateRegionsPath(game), pathBackUp, logger)
+    assert statStateRegions(game) == before
+
+def test_patchedFileIsTakenIntoBackUp(game, logger):
+    original = readStateRegions(game)
+    shuffleGame(game, logger, preset="All", seed=7)
+    pathBackUp = getBackUpPath(game, logger)
+    backUpStateRegions(getStateRegionsPath(game), pathBackUp, logger)
+    filename = sorted(original)[0]
+    patched = original[filename] + b"\n# patched\n"
+    filePath = os.path.join(getStateRegionsPath(game), filename)
+    with open(filePath, "wb") as f:
+        f.write(patched)
+    os.utime(filePath, ns=(1, 1))
+    backUpStateRegions(getStateRegionsPath(game), pathBackUp, logger)
+    assert readStateRegions(game) == dict(original, **{filename: patched})
+    assert readFolder(pathBackUp)[filename] == patched
+    assert readFolder(os.path.join(os.path.dirname(pathBackUp), "replaced")) == {filename: original[filename]}
+
+def test_newFileIsTakenIntoBackUp(game, logger):
+    shuffleGame(game, logger, preset="All", seed=7)
+    pathBackUp = getBackUpPath(game, logger)
+    with open(os.path.join(getStateRegionsPath(game), "99_patch.txt"), "wb") as f:
+        f.write(b"STATE_NEW = {}\n")
+    backUpStateRegions(getStateRegionsPath(game), pathBackUp, logger)
+    assert readFolder(pathBackUp)["99_patch.txt"] == b"STATE_NEW = {}\n"
+    assert readStateRegions(game)["99_patch.txt"] == b"STATE_NEW = {}\n"
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from cli import buildParser
+from fairness import BATCH_ELEMENTS, analyzeFairness, getBatchSizes
+from gameFiles import readStateRegions
+from shuffler import analyzeShuffles
+
+STATE_COUNT = 40
+STATE_ID_TO_NAME = [f"STATE_{stateID}" for stateID in range(STATE_COUNT)]
+REGIONS = {"north": list(range(0, 20)), "south": list(range(20, STATE_COUNT))}
+
+@pytest.fixture
+def resources():
+    """Two shuffled resources, gold without initial buildings, and an unshuffled one"""
+    rng = np.random.default_rng(5)
+    resources = {}
+    for key, isShuffled, noInitialBuildings in (("gold", True, True), ("coal", True, False), ("fish", False, False)):
+        resources[key] = {
+            'isShuffled': isShuffled,
+            'noInitialBuildings': noInitialBuildings,
+            'available': (rng.integers(0, 40, STATE_COUNT) * (rng.random(STATE_COUNT) < 0.5)).tolist(),
+            'discoveredInState': (rng.integers(0, 10, STATE_COUNT) * (rng.random(STATE_COUNT) < 0.3)).tolist(),
+            'undiscoveredInState': (rng.integers(0, 30, STATE_COUNT) * (rng.random(STATE_COUNT) < 0.3)).tolist(),
+            'constrainedHistory': [0] * STATE_COUNT,
+            'constrainedCompany': [0] * STATE_COUNT,
+            }
+    return resources
+
+def test_sameSeedGivesSameReport(resources):
+    report = analyzeFairness(resources, STATE_ID_TO_NAME, 50, seed=3, regions=REGIONS)
+    assert analyzeFairness(resources, STATE_ID_TO_NAME, 50, seed=3, regions=REGIONS) == report
+    assert analyzeFairness(resources, STATE_ID_TO_NAME, 50, seed=4, regions=REGIONS) != report
+
+def test_onlyShuffledResourcesAreReported(resources):
+    report = analyzeFairness(resources, STATE_ID_TO_NAME, 10, seed=3)
+    assert sorted(report['resources']) == ["coal", "gold"]
+
+@pytest.mark.parametrize("options", [{}, {'preserveTotals': True}, {'maxPerState': 30}])
+def test_sharesAndFrequencies(resources, options):
+    runs = 200
+    report = analyzeFairness(resources, STATE_ID_TO_NAME, runs, seed=3, options=options, topCount=5, threshold=0.1)
+    for result in report['resources'].values():
+        for share in (result['topShare'], result['maxShare']):
+            assert 0 <= share['p5'] <= share['p50'] <= share['p95'] <= share['max'] <= 1
+            assert 0 <= share['original'] <= 1
+        assert result['maxShare']['mean'] <= result['topShare']['mean']
+        assert 0 <= result['aboveThreshold'] <= 1
+        assert result['mostOftenLargest']['state'] in STATE_ID_TO_NAME
+        assert 1 / runs <= result['mostOftenLargest']['frequency'] <= 1
+
+def test_topCountLargerThanStates(resources):
+    report = analyzeFairness(resources, STATE_ID_TO_NAME, 10, seed=3, topCount=STATE_COUNT + 10)
+    assert report['topCount'] == STATE_COUNT
+    for result in report['resources'].values():
+        assert result['topShare']['p5'] == pytest.approx(1)
+
+def test_regionsAddUpToWorldTotal(resources):
+    report = analyzeFairness(resources, STATE_ID_TO_NAME, 10, seed=3, regions=REGIONS)
+    for key, result in report['resources'].items():
+        worldTotal = sum(resources[key][name][stateID] for name in ('available', 'discoveredInState', 'undiscoveredInState') for stateID in range(STATE_COUNT))
+        assert sum(region['original'] for region in result['regions'].values()) == worldTotal
+
+@pytest.mark.parametrize("runs, elementsPerRun", [(1, 10), (1000, 1), (1000, BATCH_ELEMENTS // 3), (7, BATCH_ELEMENTS * 2)])
+def test_batchSizes(runs, elementsPerRun):
+    batches = getBatchSizes(runs, elementsPerRun)
+    assert sum(batches) == runs
+    assert all(batch >= 1 for batch in batches)
+    assert all(batch * elementsPerRun <= BATCH_ELEMENTS for batch in batches) or batches == [1] * runs
+
+def test_analyzeShufflesWritesNothing(game, logger):
+    original = readStateRegions(game)
+    report = analyzeShuffles(game, logger, 20, seed=1, preset="All")
+    assert report['runs'] == 20 and report['resources']
+    assert readStateRegions(game) == original
+
+@pytest.mark.parametrize("arguments", [["analyze", "--runs", "0"], ["analyze", "--runs", "many"], ["generate", "--count", "0", "--seed", "1"], ["generate", "--count", "2", "--seed", "1", "--processes", "-1"]])
+def test_parserRejectsNonPositiveCounts(arguments):
+    with pytest.raises(SystemExit):
+        buildParser().parse_args(arguments)
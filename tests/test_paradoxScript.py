@@ -0,0 +1,59 @@
+from paradoxScript import BYTE_ORDER_MARK, Entry, findFirst, parseScript, tokenize, toInt, walkEntries
+
+SCRIPT = '''# a state
+STATE_A = {
+    id = 1
+    provinces = { "x000001" x000002 }
+    resource = { type = "bg_gold_fields" undiscovered_amount = 20 }
+    capped_resources = { bg_logging >= 15 }
+}
+'''
+
+def test_tokenizeDropsCommentsAndQuotes():
+    tokens = tokenize('a = "b c" # comment\n{ d }')
+    assert [(kind, value) for kind, value, _, _ in tokens] == [('word', "a"), ('operator', "="), ('word', "b c"), ('open', "{"), ('word', "d"), ('close', "}")]
+
+def test_tokenizeOffsets():
+    text = 'key = value'
+    assert [text[start:end] for _, _, start, end in tokenize(text)] == ["key", "=", "value"]
+
+def test_parseScriptNestedBlocks():
+    state = findFirst(parseScript(SCRIPT), "STATE_A")
+    assert findFirst(state, "id") == "1"
+    assert [entry.value for entry in findFirst(state, "provinces")] == ["x000001", "x000002"]
+    assert findFirst(findFirst(state, "resource"), "undiscovered_amount") == "20"
+    assert findFirst(state, "capped_resources")[0] == Entry("bg_logging", ">=", "15", SCRIPT.index("bg_logging"), SCRIPT.index("15 }") + 2)
+
+def test_parseScriptEntryOffsets():
+    root = parseScript(SCRIPT)
+    assert SCRIPT[root[0].start:root[0].end] == SCRIPT[SCRIPT.index("STATE_A"):SCRIPT.rindex("}") + 1]
+
+def test_parseScriptStrayAndUnclosedBraces():
+    assert parseScript("} a = 1") == [Entry("a", "=", "1", 2, 7)]
+    root = parseScript("a = { b = 1")
+    assert root[0].key == "a" and root[0].value == [Entry("b", "=", "1", 6, 11)] and root[0].end == 11
+
+def test_parseScriptValuelessKey():
+    assert [(entry.key, entry.value) for entry in parseScript("state_region = }")] == [("state_region", None)]
+
+def test_parseScriptBytesMatchesText():
+    data = SCRIPT.encode()
+    assert parseScript(data) == parseScript(SCRIPT)
+
+def test_byteOrderMarkText():
+    root = parseScript("\ufeff" + SCRIPT)
+    assert [entry.key for entry in root] == ["STATE_A"]
+    assert root[0].start == SCRIPT.index("STATE_A") + 1
+
+def test_byteOrderMarkBytes():
+    data = BYTE_ORDER_MARK + SCRIPT.encode()
+    root = parseScript(data)
+    assert [entry.key for entry in root] == ["STATE_A"]
+    assert data[root[0].start:root[0].start + len("STATE_A")] == b"STATE_A"
+    assert [entry.key for entry in walkEntries(root)] == [entry.key for entry in walkEntries(parseScript(SCRIPT))]
+
+def test_toInt():
+    assert toInt("20") == 20
+    assert toInt("20.0") == 20
+    assert toInt("abc") == 0
+    assert toInt(None, -1) == -1
@@ -0,0 +1,68 @@
+import os
+
+from parseCache import loadParseCache, newParseCache, parseCached, saveParseCache
+
+def countingParse(calls):
+    """A parse function which records every file content it is given"""
+    def parse(buffer):
+        calls.append(bytes(buffer))
+        return bytes(buffer).upper()
+    return parse
+
+def writeFile(filePath, content, mtime_ns):
+    with open(filePath, "wb") as f:
+        f.write(content)
+    os.utime(filePath, ns=(mtime_ns, mtime_ns))
+
+def test_unchangedFileIsNotParsedAgain(tmp_path):
+    filePath = str(tmp_path / "00_states.txt")
+    writeFile(filePath, b"state = 1", 1_000_000_000)
+    parseCache, calls = newParseCache(), []
+    assert parseCached(parseCache, filePath, countingParse(calls)) == b"STATE = 1"
+    assert parseCached(parseCache, filePath, countingParse(calls)) == b"STATE = 1"
+    assert calls == [b"state = 1"]
+
+def test_changedModificationTimeIsParsedAgain(tmp_path):
+    filePath = str(tmp_path / "00_states.txt")
+    writeFile(filePath, b"state = 1", 1_000_000_000)
+    parseCache, calls = newParseCache(), []
+    parseCached(parseCache, filePath, countingParse(calls))
+    writeFile(filePath, b"state = 2", 2_000_000_000)
+    assert parseCached(parseCache, filePath, countingParse(calls)) == b"STATE = 2"
+    assert calls == [b"state = 1", b"state = 2"]
+
+def test_changedSizeIsParsedAgain(tmp_path):
+    filePath = str(tmp_path / "00_states.txt")
+    writeFile(filePath, b"state = 1", 1_000_000_000)
+    parseCache, calls = newParseCache(), []
+    parseCached(parseCache, filePath, countingParse(calls))
+    writeFile(filePath, b"state = 10", 1_000_000_000)
+    assert parseCached(parseCache, filePath, countingParse(calls)) == b"STATE = 10"
+    assert len(calls) == 2
+
+def test_savedCacheIsLoaded(tmp_path, monkeypatch, logger):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "resources.ini").write_text("gold ffd700 bg_gold_mining building_gold_mine dynamic\n")
+    filePath = str(tmp_path / "00_states.txt")
+    writeFile(filePath, b"state = 1", 1_000_000_000)
+    parseCache, calls = newParseCache(str(tmp_path / "parseCache.bin")), []
+    parseCached(parseCache, filePath, countingParse(calls))
+    saveParseCache(parseCache, logger)
+    loaded = loadParseCache(str(tmp_path / "parseCache.bin"), logger)
+    assert parseCached(loaded, filePath, countingParse(calls)) == b"STATE = 1"
+    assert len(calls) == 1
+
+def test_changedResourcesConfigDropsCache(tmp_path, monkeypatch, logger):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "resources.ini").write_text("gold ffd700 bg_gold_mining building_gold_mine dynamic\n")
+    filePath = str(tmp_path / "00_states.txt")
+    writeFile(filePath, b"state = 1", 1_000_000_000)
+    parseCache = newParseCache(str(tmp_path / "parseCache.bin"))
+    parseCached(parseCache, filePath, countingParse([]))
+    saveParseCache(parseCache, logger)
+    (tmp_path / "resources.ini").write_text("oil 3b3131 bg_oil_extraction building_oil_rig dynamic\n")
+    loaded = loadParseCache(str(tmp_path / "parseCache.bin"), logger)
+    assert loaded['files'] == {}
+    calls = []
+    parseCached(loaded, filePath, countingParse(calls))
+    assert calls == [b"state = 1"]
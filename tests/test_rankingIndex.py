@@ -0,0 +1,33 @@
+from rankingIndex import buildRankingIndex, getTopStates
+
+def makeResources(available, discovered=None, undiscovered=None):
+    """One resource, 'gold', with the given amount per state in each layer"""
+    zeros = [0] * len(available)
+    return {'gold': {
+        'available': available,
+        'discoveredInState': discovered or zeros,
+        'undiscoveredInState': undiscovered or zeros,
+        'constrainedHistory': zeros,
+        'constrainedCompany': zeros,
+        }}
+
+def test_topStatesBestFirst():
+    index = buildRankingIndex(makeResources([5, 30, 0, 20, 10]))
+    assert getTopStates(index, 'gold', 3) == ([1, 3, 4], [30, 20, 10])
+
+def test_tiesGoToLowerStateID():
+    index = buildRankingIndex(makeResources([10, 20, 10, 20, 10]))
+    assert getTopStates(index, 'gold', 4) == ([1, 3, 0, 2], [20, 20, 10, 10])
+    assert getTopStates(index, 'gold', 1) == ([1], [20])
+
+def test_moreStatesAskedThanThereAre():
+    index = buildRankingIndex(makeResources([3, 1, 2]))
+    assert getTopStates(index, 'gold', 10) == ([0, 2, 1], [3, 2, 1])
+    assert getTopStates(index, 'gold', 0) == ([], [])
+
+def test_layers():
+    index = buildRankingIndex(makeResources([1, 0, 0], discovered=[0, 5, 0], undiscovered=[0, 0, 9]))
+    assert getTopStates(index, 'gold', 1, 'capped') == ([0], [1])
+    assert getTopStates(index, 'gold', 1, 'discovered') == ([1], [5])
+    assert getTopStates(index, 'gold', 1, 'undiscovered') == ([2], [9])
+    assert getTopStates(index, 'gold', 3) == ([2, 1, 0], [9, 5, 1])
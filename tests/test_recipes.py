@@ -0,0 +1,33 @@
+from gameFiles import readStateRegions
+from shuffler import getPaths, shuffleGame, switchVersion
+from versionStore import loadVersionIndex
+
+def test_sameSeedWritesSameFiles(game, logger):
+    original = readStateRegions(game)
+    shuffleGame(game, logger, preset="All", seed=7)
+    shuffled = readStateRegions(game)
+    assert shuffled != original
+    assert switchVersion(game, "original", logger)
+    shuffleGame(game, logger, preset="All", seed=7)
+    assert readStateRegions(game) == shuffled
+
+def test_otherSeedWritesOtherFiles(game, logger):
+    shuffleGame(game, logger, preset="All", seed=7)
+    shuffled = readStateRegions(game)
+    shuffleGame(game, logger, preset="All", seed=8)
+    assert readStateRegions(game) != shuffled
+
+def test_versionIsStoredAsRecipe(game, logger):
+    shuffleGame(game, logger, preset="Gold", seed=7, name="v7")
+    entry = loadVersionIndex(getPaths(game, logger)['pathAppdataVersions'], logger)['versions']["v7"]
+    assert entry['manifest'] is None
+    assert entry['recipe']['seed'] == 7
+    assert entry['recipe']['resources'] == ["gold"]
+
+def test_recipeRecreatesSameFiles(game, logger):
+    shuffleGame(game, logger, preset="All", seed=7, name="v7")
+    shuffled = readStateRegions(game)
+    shuffleGame(game, logger, preset="Gold", seed=9)
+    assert readStateRegions(game) != shuffled
+    assert switchVersion(game, "v7", logger)
+    assert readStateRegions(game) == shuffled
@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+import Auxiliary
+from Auxiliary import getAsidePath, newStagedFolder, recoverFolder, replaceFolder
+from gameFiles import readFolder
+
+class Crash(BaseException):
+    """Stands for the process being killed"""
+
+@pytest.fixture
+def folders(tmp_path):
+    """A folder with four old files, and a staged folder which replaces two of them and adds one"""
+    pathTarget = str(tmp_path / "state_regions")
+    os.makedirs(pathTarget)
+    for i in range(4):
+        (tmp_path / "state_regions" / f"{i}.txt").write_bytes(f"old{i}".encode())
+    pathStaged = newStagedFolder(pathTarget)
+    for i in (1, 2, 5):
+        with open(os.path.join(pathStaged, f"{i}.txt"), "wb") as f:
+            f.write(f"new{i}".encode())
+    return pathStaged, pathTarget
+
+OLD = {"0.txt": b"old0", "1.txt": b"old1", "2.txt": b"old2", "3.txt": b"old3"}
+NEW = {"0.txt": b"old0", "1.txt": b"new1", "2.txt": b"new2", "3.txt": b"old3", "5.txt": b"new5"}
+
+def failFolderRename(monkeypatch, pathTarget):
+    """Make the target folder impossible to rename, as Windows does with a file open in it"""
+    rename = os.rename
+    def fakeRename(src, dst):
+        if os.path.abspath(src) == os.path.abspath(pathTarget):
+            raise PermissionError("a file is open")
+        return rename(src, dst)
+    monkeypatch.setattr(os, "rename", fakeRename)
+
+def failStagedReplace(monkeypatch, at, error):
+    """Make the 'at'-th replace of a staged file raise 'error'"""
+    replace = os.replace
+    calls = []
+    def fakeReplace(src, dst):
+        if ".staged" in src:
+            calls.append(src)
+            if len(calls) == at:
+                raise error
+        return replace(src, dst)
+    monkeypatch.setattr(os, "replace", fakeReplace)
+
+def listSiblings(pathTarget):
+    return sorted(os.listdir(os.path.dirname(pathTarget)))
+
+def test_folderIsReplacedAtOnce(folders):
+    pathStaged, pathTarget = folders
+    inode = os.stat(os.path.join(pathTarget, "0.txt")).st_ino
+    assert replaceFolder(pathStaged, pathTarget)
+    assert readFolder(pathTarget) == NEW
+    assert os.stat(os.path.join(pathTarget, "0.txt")).st_ino == inode
+    assert listSiblings(pathTarget) == ["state_regions"]
+
+def test_filesAreReplacedOneByOneWhenFolderIsOpen(folders, monkeypatch):
+    pathStaged, pathTarget = folders
+    failFolderRename(monkeypatch, pathTarget)
+    assert not replaceFolder(pathStaged, pathTarget)
+    assert readFolder(pathTarget) == NEW
+    assert listSiblings(pathTarget) == ["state_regions"]
+
+def test_failedReplaceIsUndone(folders, monkeypatch):
+    pathStaged, pathTarget = folders
+    failFolderRename(monkeypatch, pathTarget)
+    failStagedReplace(monkeypatch, 2, PermissionError("locked"))
+    with pytest.raises(PermissionError):
+        replaceFolder(pathStaged, pathTarget)
+    assert readFolder(pathTarget) == OLD
+    assert listSiblings(pathTarget) == ["state_regions"]
+
+def test_journalIsReplayedAfterCrash(folders, monkeypatch):
+    pathStaged, pathTarget = folders
+    failFolderRename(monkeypatch, pathTarget)
+    failStagedReplace(monkeypatch, 3, Crash())
+    monkeypatch.setattr(Auxiliary, "undoReplacedFiles", lambda pathTarget, pathUndo: None)
+    with pytest.raises(Crash):
+        replaceFolder(pathStaged, pathTarget)
+    monkeypatch.undo()
+    assert readFolder(pathTarget) != OLD
+    assert os.path.exists(getAsidePath(pathTarget, "undo"))
+    recoverFolder(pathTarget)
+    assert readFolder(pathTarget) == OLD
+    assert not os.path.exists(getAsidePath(pathTarget, "undo"))
+
+def test_folderLeftAsideIsPutBack(folders):
+    pathStaged, pathTarget = folders
+    os.rename(pathTarget, getAsidePath(pathTarget, "old"))
+    recoverFolder(pathTarget)
+    assert readFolder(pathTarget) == OLD
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from resourceMatrix import AVAILABLE, UNDISCOVERED, buildResourceMatrix, getProtectedLayers, shuffleResourceMatrix, validateResourceMatrix
+
+STATE_COUNT = 60
+
+@pytest.fixture
+def matrix():
+    """Three resources over random states: gold and coal with initial buildings, oil without; some states are short of what they are guaranteed"""
+    rng = np.random.default_rng(3)
+    resources = {}
+    for key in ("gold", "coal", "oil"):
+        available = rng.integers(0, 40, STATE_COUNT) * (rng.random(STATE_COUNT) < 0.5)
+        resources[key] = {
+            'available': available.tolist(),
+            'discoveredInState': (rng.integers(0, 10, STATE_COUNT) * (rng.random(STATE_COUNT) < 0.3)).tolist(),
+            'undiscoveredInState': (rng.integers(0, 30, STATE_COUNT) * (rng.random(STATE_COUNT) < 0.3)).tolist(),
+            'constrainedHistory': (rng.integers(0, 25, STATE_COUNT) * (rng.random(STATE_COUNT) < 0.2)).tolist(),
+            'constrainedCompany': (rng.integers(0, 25, STATE_COUNT) * (rng.random(STATE_COUNT) < 0.1)).tolist(),
+            }
+    _, matrix = buildResourceMatrix(resources)
+    return matrix
+
+SHUFFLED = np.array([True, True, True])
+NO_INITIAL_BUILDINGS = np.array([False, False, True])
+
+def getTotals(matrix):
+    return matrix[:, :, AVAILABLE:UNDISCOVERED + 1].sum(axis=1)
+
+@pytest.mark.parametrize("options", [{}, {'preserveTotals': True}, {'maxPerState': 30}, {'preserveTotals': True, 'maxPerState': 30}])
+def test_guaranteedAmountsAreMet(matrix, options):
+    shortAvailable, shortUndiscovered = validateResourceMatrix(matrix, SHUFFLED, NO_INITIAL_BUILDINGS)
+    assert len(shortAvailable) + len(shortUndiscovered) > 0
+    result, _ = shuffleResourceMatrix(matrix, SHUFFLED, NO_INITIAL_BUILDINGS, np.random.default_rng(1), **options)
+    shortAvailable, shortUndiscovered = validateResourceMatrix(result, SHUFFLED, NO_INITIAL_BUILDINGS)
+    assert len(shortAvailable) == 0 and len(shortUndiscovered) == 0
+    assert (result >= 0).all()
+
+def test_addedAmountIsReported(matrix):
+    result, report = shuffleResourceMatrix(matrix, SHUFFLED, NO_INITIAL_BUILDINGS, np.random.default_rng(1))
+    assert (report['addedToTotal'] > 0).any()
+    assert (getTotals(result) == getTotals(matrix) + report['addedToTotal']).all()
+
+def test_preserveTotals(matrix):
+    result, report = shuffleResourceMatrix(matrix, SHUFFLED, NO_INITIAL_BUILDINGS, np.random.default_rng(1), preserveTotals=True)
+    assert (report['addedToTotal'] == 0).all()
+    assert (getTotals(result) == getTotals(matrix)).all()
+
+def test_maxPerState(matrix):
+    result, report = shuffleResourceMatrix(matrix, SHUFFLED, NO_INITIAL_BUILDINGS, np.random.default_rng(1), maxPerState=30)
+    protected = getProtectedLayers(matrix, SHUFFLED, NO_INITIAL_BUILDINGS)
+    assert (result[:, :, AVAILABLE:UNDISCOVERED + 1] <= np.maximum(protected, 30)).all()
+    assert (getTotals(result) == getTotals(matrix) + report['addedToTotal'] - report['droppedByCap']).all()
+
+def test_capWithoutRoomDropsTheExcess(matrix):
+    result, report = shuffleResourceMatrix(matrix, SHUFFLED, NO_INITIAL_BUILDINGS, np.random.default_rng(1), maxPerState=1)
+    assert (report['droppedByCap'] > 0).any()
+    assert (getTotals(result) == getTotals(matrix) + report['addedToTotal'] - report['droppedByCap']).all()
+
+def test_unshuffledResourcesAreKept(matrix):
+    shuffled = np.array([True, False, False])
+    result, _ = shuffleResourceMatrix(matrix, shuffled, NO_INITIAL_BUILDINGS, np.random.default_rng(1))
+    assert (result[1:] == matrix[1:]).all()
+    assert (result[0] != matrix[0]).any()
+
+def test_sameSeedSameShuffle(matrix):
+    first, _ = shuffleResourceMatrix(matrix, SHUFFLED, NO_INITIAL_BUILDINGS, np.random.default_rng(5), preserveTotals=True, maxPerState=30)
+    second, _ = shuffleResourceMatrix(matrix, SHUFFLED, NO_INITIAL_BUILDINGS, np.random.default_rng(5), preserveTotals=True, maxPerState=30)
+    assert (first == second).all()
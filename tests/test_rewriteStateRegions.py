@@ -0,0 +1,17 @@
+from gameFiles import readStateRegions, statStateRegions
+from shuffler import shuffleGame
+
+def test_unchangedFilesAreNotRewritten(game, logger):
+    before = statStateRegions(game)
+    shuffleGame(game, logger, preset="Gold", seed=7)
+    after = statStateRegions(game)
+    assert after["99_seas.txt"] == before["99_seas.txt"]
+    assert after != before
+
+def test_sameShuffleAgainWritesNothing(game, logger):
+    shuffleGame(game, logger, preset="Gold", seed=7)
+    before = statStateRegions(game)
+    shuffled = readStateRegions(game)
+    shuffleGame(game, logger, preset="Gold", seed=7)
+    assert statStateRegions(game) == before
+    assert readStateRegions(game) == shuffled
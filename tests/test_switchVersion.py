@@ -0,0 +1,25 @@
+import os
+
+from Auxiliary import getAsidePath
+from gameFiles import getStateRegionsPath, readStateRegions
+from shuffler import getPaths, shuffleGame, switchVersion
+
+def test_switchToOriginalRestoresBytes(game, logger):
+    original = readStateRegions(game)
+    shuffleGame(game, logger, preset="All", seed=7)
+    shuffleGame(game, logger, preset="Gold", seed=9)
+    assert switchVersion(game, "original", logger)
+    assert readStateRegions(game) == original
+
+def test_switchLeavesNoStagedFolder(game, logger):
+    shuffleGame(game, logger, preset="All", seed=7, name="v7")
+    assert switchVersion(game, "original", logger)
+    assert switchVersion(game, "v7", logger)
+    assert sorted(os.listdir(os.path.dirname(getStateRegionsPath(game)))) == ["state_regions"]
+
+def test_stateRegionsLeftAsideByCrashIsPutBack(game, logger):
+    original = readStateRegions(game)
+    pathStateRegions = getStateRegionsPath(game)
+    os.rename(pathStateRegions, getAsidePath(pathStateRegions, "old"))
+    assert getPaths(game, logger) is not None
+    assert readStateRegions(game) == original
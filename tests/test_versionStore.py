@@ -0,0 +1,73 @@
+import os
+
+from gameFiles import readFolder
+from services import removeVersion
+from versionStore import deleteVersion, exportVersion, getBlobPath, loadVersionIndex, saveVersionIndex, storeVersionFolder
+
+def writeFolder(folder, files):
+    os.makedirs(folder, exist_ok=True)
+    for filename, content in files.items():
+        with open(os.path.join(folder, filename), "wb") as f:
+            f.write(content)
+
+def countBlobs(pathAppdataVersions):
+    return sum(len(filenames) for _, _, filenames in os.walk(os.path.join(pathAppdataVersions, "blobs")))
+
+def test_sameFilesAreStoredOnce(tmp_path, logger):
+    pathVersions = str(tmp_path / "versions")
+    os.makedirs(pathVersions)
+    writeFolder(str(tmp_path / "a"), {"00.txt": b"same", "01.txt": b"a"})
+    writeFolder(str(tmp_path / "b"), {"00.txt": b"same", "01.txt": b"b"})
+    index = loadVersionIndex(pathVersions, logger)
+    storeVersionFolder(pathVersions, index, "a", str(tmp_path / "a"), ["gold"])
+    storeVersionFolder(pathVersions, index, "b", str(tmp_path / "b"), ["gold"])
+    shared = index['versions']["a"]['manifest']["00.txt"]
+    assert shared == index['versions']["b"]['manifest']["00.txt"]
+    assert index['blobs'][shared] == 2
+    assert countBlobs(pathVersions) == 3
+
+def test_deleteVersionFreesOnlyUnsharedBlobs(tmp_path, logger):
+    pathVersions = str(tmp_path / "versions")
+    os.makedirs(pathVersions)
+    writeFolder(str(tmp_path / "a"), {"00.txt": b"same", "01.txt": b"a"})
+    writeFolder(str(tmp_path / "b"), {"00.txt": b"same", "01.txt": b"b"})
+    index = loadVersionIndex(pathVersions, logger)
+    storeVersionFolder(pathVersions, index, "a", str(tmp_path / "a"), ["gold"])
+    storeVersionFolder(pathVersions, index, "b", str(tmp_path / "b"), ["gold"])
+    manifest = index['versions']["a"]['manifest']
+    deleteVersion(pathVersions, index, "a")
+    assert "a" not in index['versions']
+    assert index['blobs'][manifest["00.txt"]] == 1
+    assert os.path.exists(getBlobPath(pathVersions, manifest["00.txt"]))
+    assert manifest["01.txt"] not in index['blobs']
+    assert not os.path.exists(getBlobPath(pathVersions, manifest["01.txt"]))
+    deleteVersion(pathVersions, index, "b")
+    assert index['blobs'] == {}
+    assert countBlobs(pathVersions) == 0
+
+def test_removeVersionKeepsOriginal(tmp_path, logger):
+    pathVersions = str(tmp_path / "versions")
+    writeFolder(os.path.join(pathVersions, "original", "state_regions"), {"00.txt": b"original"})
+    writeFolder(str(tmp_path / "a"), {"00.txt": b"a"})
+    index = loadVersionIndex(pathVersions, logger)
+    storeVersionFolder(pathVersions, index, "a", str(tmp_path / "a"), ["gold"])
+    saveVersionIndex(pathVersions, index)
+    assert not removeVersion(pathVersions, "original", logger)
+    assert not removeVersion(pathVersions, "missing", logger)
+    assert removeVersion(pathVersions, "a", logger)
+    assert list(loadVersionIndex(pathVersions, logger)['versions']) == ["original"]
+
+def test_exportedFilesAreCopies(tmp_path, logger):
+    pathVersions = str(tmp_path / "versions")
+    os.makedirs(pathVersions)
+    writeFolder(str(tmp_path / "a"), {"00.txt": b"a0", "01.txt": b"a1"})
+    index = loadVersionIndex(pathVersions, logger)
+    storeVersionFolder(pathVersions, index, "a", str(tmp_path / "a"), ["gold"])
+    pathTarget = str(tmp_path / "target")
+    writeFolder(pathTarget, {"00.txt": b"old", "01.txt": b"a1"})
+    exportVersion(pathVersions, index, "a", pathTarget)
+    assert readFolder(pathTarget) == {"00.txt": b"a0", "01.txt": b"a1"}
+    with open(os.path.join(pathTarget, "00.txt"), "wb") as f:
+        f.write(b"edited")
+    with open(getBlobPath(pathVersions, index['versions']["a"]['manifest']["00.txt"]), "rb") as f:
+        assert f.read() == b"a0"